@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+# This file checks the CSV gaits under csv/ against the URDF of gundam_rx78_description without a simulator
+# All gaits are stacked into one array in the joint order of the fullbody_controller, and every check runs once over it:
+# the joint set of the controller, the position limits, the velocity limits between consecutive rows,
+# and the limits of the mimic joints, which follow their reference joint in the CSV
+# Violations are reported per gait, joint and time in milliseconds, and the script exits with 1 if there is any
+
+import argparse
+import glob
+import json
+import os
+import sys
+import xml.etree.ElementTree
+
+import numpy
+import yaml
+
+from trajectory import TrajectoryConst, parse_csv, strip_joint_suffix
+
+
+class ValidateConst:
+    PACKAGE_DIR     = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    CONFIG_PATH     = os.path.join(PACKAGE_DIR, 'config', 'gundam_rx78_control.yaml')
+    CSV_PATTERN     = os.path.join(PACKAGE_DIR, 'sample', 'csv', '*.csv')
+    CONTROLLER      = 'fullbody_controller'
+    MIMIC_MARGIN    = 1.25      # UrdfConst.MIMIC_MARGIN of rename_resize_joint_link.py, which writes the mimic limits for Isaac
+    TOLERANCE       = 1e-6      # The CSV values are rounded to 6 decimals [rad]
+
+
+class JointLimits(object):
+    def __init__(self, urdf_path):
+        # lower, upper and velocity limits of each moving joint, and (reference, multiplier, offset) of each mimic joint
+        self.limits = dict()
+        self.mimics = dict()
+        for joint in xml.etree.ElementTree.parse(urdf_path).getroot().findall('joint'):
+            if joint.get('type') == 'fixed':
+                continue
+            name = strip_joint_suffix(joint.get('name'))
+            limit = joint.find('limit')
+            if limit is not None and 'lower' in limit.attrib:
+                self.limits[name] = (float(limit.get('lower')), float(limit.get('upper')), float(limit.get('velocity', 'inf')))
+            mimic = joint.find('mimic')
+            if mimic is not None:
+                self.mimics[name] = (strip_joint_suffix(mimic.get('joint')), float(mimic.get('multiplier', 1.0)), float(mimic.get('offset', 0.0)))
+
+    def derived_mimic_limits(self, margin):
+        # Mimic limits from the limits of the reference joint, as get_mimic_limits() of rename_resize_joint_link.py
+        limits = dict()
+        for name, (reference, multiplier, offset) in self.mimics.items():
+            if name not in self.limits or reference not in self.limits:
+                continue
+            lower = (self.limits[reference][0] * multiplier + offset) * margin
+            upper = (self.limits[reference][1] * multiplier + offset) * margin
+            limits[name] = (min(lower, upper), max(lower, upper))
+        return limits
+
+
+class Violation(object):
+    def __init__(self, gait, joint, kind, time_ms=None, value=None, limit=None):
+        self.gait = gait
+        self.joint = joint
+        self.kind = kind            # missing_joint, unknown_joint, lower, upper, velocity, mimic_lower, mimic_upper, derived_lower or derived_upper
+        self.time_ms = time_ms
+        self.value = value
+        self.limit = limit
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def __str__(self):
+        if self.time_ms is None:
+            return '{} {}: {}'.format(self.gait, self.joint, self.kind)
+        return '{} {} at {} ms: {} {:.6f} beyond {:.6f}'.format(self.gait, self.joint, self.time_ms, self.kind, self.value, self.limit)
+
+
+def load_controller_joints(config_path=ValidateConst.CONFIG_PATH, controller=ValidateConst.CONTROLLER):
+    # Joints of the controller, and whether a goal may give only some of them
+    with open(config_path) as fin:
+        config = yaml.safe_load(fin)[controller]
+    return list(config['joints']), bool(config.get('allow_partial_joints_goal', False))
+
+
+def stack_gaits(trajectories, joint_names):
+    # Positions (T, J) of all gaits in the order of joint_names, NaN where a gait lacks a joint,
+    # with the time and the gait index of each row
+    times = numpy.concatenate([trajectory.times for trajectory in trajectories])
+    gaits = numpy.repeat(numpy.arange(len(trajectories)), [len(trajectory) for trajectory in trajectories])
+    positions = numpy.full((len(times), len(joint_names)), numpy.nan)
+    column = dict((name, i) for i, name in enumerate(joint_names))
+    row = 0
+    for trajectory in trajectories:
+        columns = [column.get(strip_joint_suffix(name), -1) for name in trajectory.joint_names]
+        known = [i for i, index in enumerate(columns) if index >= 0]
+        positions[row:row + len(trajectory), [columns[i] for i in known]] = trajectory.positions[:, known]
+        row += len(trajectory)
+    return times, gaits, positions
+
+
+def limit_violations(values, lower, upper, tolerance):
+    # (rows, columns, bounds, kinds) of the values beyond the limits, kind 0 is lower and 1 is upper
+    with numpy.errstate(invalid='ignore'):
+        below = values < lower - tolerance
+        above = values > upper + tolerance
+    rows, columns = numpy.nonzero(below | above)
+    kinds = above[rows, columns].astype(int)
+    bounds = numpy.where(kinds == 1, numpy.broadcast_to(upper, values.shape)[rows, columns], numpy.broadcast_to(lower, values.shape)[rows, columns])
+    return rows, columns, bounds, kinds
+
+
+def validate_gaits(gaits, limits, controller_joints, allow_partial=False, max_velocity=None, mimic_margin=ValidateConst.MIMIC_MARGIN,
+                   tolerance=ValidateConst.TOLERANCE):
+    # gaits maps a name to a Trajectory, returns the list of Violation
+    names = list(gaits)
+    trajectories = [gaits[name] for name in names]
+    violations = []
+    expected = set(controller_joints)
+    for name, trajectory in zip(names, trajectories):
+        joints = set(strip_joint_suffix(joint) for joint in trajectory.joint_names)
+        if not allow_partial:
+            violations += [Violation(name, joint, 'missing_joint') for joint in sorted(expected - joints)]
+        violations += [Violation(name, joint, 'unknown_joint') for joint in sorted(joints - expected)]
+    if sum(len(trajectory) for trajectory in trajectories) == 0:
+        return violations
+
+    joint_names = [joint for joint in controller_joints if joint in limits.limits]
+    times, gait_index, positions = stack_gaits(trajectories, joint_names)
+    lower, upper, velocity = numpy.array([limits.limits[joint] for joint in joint_names]).reshape(-1, 3).T
+    if max_velocity is not None:
+        velocity = numpy.minimum(velocity, max_velocity)
+
+    def report(kinds, rows, columns, values, bounds, kind_index, names_of_columns):
+        for row, col, value, bound, kind in zip(rows.tolist(), columns.tolist(), values.tolist(), bounds.tolist(), kind_index.tolist()):
+            violations.append(Violation(names[gait_index[row]], names_of_columns[col], kinds[kind],
+                                        int(round(times[row] * 1000)), value, bound))
+
+    # positions
+    rows, columns, bounds, kinds = limit_violations(positions, lower, upper, tolerance)
+    report(('lower', 'upper'), rows, columns, positions[rows, columns], bounds, kinds, joint_names)
+
+    # velocities between consecutive rows of the same gait, reported at the later row
+    same_gait = gait_index[1:] == gait_index[:-1]
+    speeds = numpy.abs(numpy.diff(positions, axis=0)) / numpy.where(same_gait, numpy.diff(times), numpy.inf)[:, None]
+    rows, columns, bounds, kinds = limit_violations(speeds, -velocity, velocity, tolerance)
+    report(('velocity', 'velocity'), rows + 1, columns, speeds[rows, columns], bounds, kinds, joint_names)
+
+    # mimic joints, from the positions of their reference joints
+    column = dict((joint, i) for i, joint in enumerate(joint_names))
+    mimic_names = [joint for joint, mimic in sorted(limits.mimics.items()) if mimic[0] in column]
+    if mimic_names:
+        references = numpy.array([column[limits.mimics[joint][0]] for joint in mimic_names])
+        multipliers = numpy.array([limits.mimics[joint][1] for joint in mimic_names])
+        offsets = numpy.array([limits.mimics[joint][2] for joint in mimic_names])
+        mimic_positions = positions[:, references] * multipliers + offsets
+        bounds_list = [('mimic_lower', 'mimic_upper', dict((joint, limits.limits[joint][:2]) for joint in mimic_names if joint in limits.limits))]
+        if mimic_margin is not None:
+            bounds_list.append(('derived_lower', 'derived_upper', limits.derived_mimic_limits(mimic_margin)))
+        for lower_kind, upper_kind, mimic_limits in bounds_list:
+            mimic_lower = numpy.array([mimic_limits.get(joint, (-numpy.inf, numpy.inf))[0] for joint in mimic_names])
+            mimic_upper = numpy.array([mimic_limits.get(joint, (-numpy.inf, numpy.inf))[1] for joint in mimic_names])
+            rows, columns, bounds, kinds = limit_violations(mimic_positions, mimic_lower, mimic_upper, tolerance)
+            report((lower_kind, upper_kind), rows, columns, mimic_positions[rows, columns], bounds, kinds, mimic_names)
+    return violations
+
+
+def summarize(violations):
+    # One line per gait, joint and kind, with the number of rows, the first and last time and the worst value
+    groups = dict()
+    for violation in violations:
+        groups.setdefault((violation.gait, violation.joint, violation.kind), []).append(violation)
+    lines = []
+    for (gait, joint, kind), group in sorted(groups.items()):
+        if group[0].time_ms is None:
+            lines.append(str(group[0]))
+            continue
+        worst = max(group, key=lambda violation: abs(violation.value - violation.limit))
+        lines.append('{} {} {}: {} rows from {} ms to {} ms, worst {:.6f} beyond {:.6f} at {} ms'.format(
+            gait, joint, kind, len(group), group[0].time_ms, group[-1].time_ms, worst.value, worst.limit, worst.time_ms))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check CSV gaits against the joint limits of the URDF and the joints of the controller')
+    parser.add_argument('filenames', nargs='*', help='CSV gait files, all of sample/csv/ by default')
+    parser.add_argument('--urdf', default=TrajectoryConst.URDF_PATH, help='URDF file name')
+    parser.add_argument('--config', default=ValidateConst.CONFIG_PATH, help='controller configuration yaml file name')
+    parser.add_argument('--controller', default=ValidateConst.CONTROLLER, help='controller whose joints the gaits must give')
+    parser.add_argument('--max_velocity', type=float, help='velocity limit [rad/s] of all joints, if lower than the one of the URDF')
+    parser.add_argument('--mimic_margin', type=float, default=ValidateConst.MIMIC_MARGIN,
+                        help='margin of the mimic limits derived from the reference joints, as rename_resize_joint_link.py')
+    parser.add_argument('--tolerance', type=float, default=ValidateConst.TOLERANCE, help='allowed excess over the limits')
+    parser.add_argument('--json', help='write all violations to this json file')
+    args = parser.parse_args()
+
+    filenames = args.filenames or sorted(glob.glob(ValidateConst.CSV_PATTERN))
+    gaits = dict((os.path.basename(filename), parse_csv(filename)) for filename in filenames)
+    controller_joints, allow_partial = load_controller_joints(args.config, args.controller)
+    violations = validate_gaits(gaits, JointLimits(args.urdf), controller_joints, allow_partial, args.max_velocity, args.mimic_margin, args.tolerance)
+    for line in summarize(violations):
+        print(line)
+    if args.json:
+        with open(args.json, 'w') as fout:
+            json.dump([violation.to_dict() for violation in violations], fout, indent=1)
+            fout.write('\n')
+    print('{} violations in {} gaits, {} rows'.format(len(violations), len(gaits), sum(len(gait) for gait in gaits.values())))
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
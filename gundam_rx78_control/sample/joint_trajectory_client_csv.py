@@ -38,7 +38,8 @@ import actionlib
 import argparse
 import sys
 import time
-import csv
+
+from trajectory import TrajectoryConst, compile_trajectory, load_trajectory, stream_csv, windows
 
 from control_msgs.msg import (
     FollowJointTrajectoryAction,
@@ -49,28 +50,23 @@ from trajectory_msgs.msg import (
 )
 
 
-def main(filename):
-    print("Initializing node... ")
-    rospy.init_node("joint_trajectory_client_csv_example")
-    rospy.sleep(1)
-    print("Running. Ctrl-c to quit")
-
-    # init goal
+def trajectory_goal(trajectory, stamp):
     goal = FollowJointTrajectoryGoal()
     goal.goal_time_tolerance = rospy.Time(1)
+    goal.trajectory.header.stamp = stamp
+    goal.trajectory.joint_names = trajectory.joint_names
+    for i, time_from_start in enumerate(trajectory.times.tolist()):
+        point = JointTrajectoryPoint()
+        point.positions = trajectory.positions[i].tolist()
+        if trajectory.velocities is not None:
+            point.velocities = trajectory.velocities[i].tolist()
+            point.accelerations = trajectory.accelerations[i].tolist()
+        point.time_from_start = rospy.Duration(time_from_start)
+        goal.trajectory.points.append(point)
+    return goal
 
-    with open(filename) as f:
-        reader = csv.reader(f, skipinitialspace=True)
-        first_row = True
-        for row in reader:
-            if first_row:
-                goal.trajectory.joint_names = row[1:]
-                first_row = False
-            else:
-                point = JointTrajectoryPoint()
-                point.positions = [float(n) for n in row[1:]]
-                point.time_from_start = rospy.Duration(float(row[0]))
-                goal.trajectory.points.append(point)
+
+def connect():
     client = actionlib.SimpleActionClient(
         '/fullbody_controller/follow_joint_trajectory',
         FollowJointTrajectoryAction,
@@ -80,19 +76,100 @@ def main(filename):
         rospy.logerr("Timed out waiting for Action Server")
         rospy.signal_shutdown("Timed out waiting for Action Server")
         sys.exit(1)
+    return client
+
+
+def main(filename, tolerance=None, rate=None):
+    print("Initializing node... ")
+    rospy.init_node("joint_trajectory_client_csv_example")
+    rospy.sleep(1)
+    print("Running. Ctrl-c to quit")
+
+    trajectory = load_trajectory(filename)
+    count = len(trajectory)
+    trajectory = compile_trajectory(trajectory, tolerance, rate)
+    if len(trajectory) != count:
+        print("Resampled {} points to {}".format(count, len(trajectory)))
+    client = connect()
 
     # send goal
-    goal.trajectory.header.stamp = rospy.Time.now()
-    client.send_goal(goal)
+    client.send_goal(trajectory_goal(trajectory, rospy.Time.now()))
     print("waiting...")
     if not client.wait_for_result(timeout=rospy.Duration(60)):
         rospy.logerr("Timed out waiting for JTA")
     rospy.loginfo("Exitting...")
 
 
+def stream(filename, loops=1, size=TrajectoryConst.WINDOW_POINTS, overlap=TrajectoryConst.WINDOW_OVERLAP, lead=TrajectoryConst.WINDOW_LEAD):
+    # Send the trajectory as goals of size points read lazily from the CSV. All goals share the header stamp of the first
+    # one, so time_from_start of every point is the time in the CSV. Each goal is sent lead seconds before the end of the
+    # previous one, i.e. inside the points both goals share, so the controller switches to the new goal where both goals
+    # are the same instead of bridging the gap to its first point with one spline segment
+    print("Initializing node... ")
+    rospy.init_node("joint_trajectory_client_csv_example")
+    rospy.sleep(1)
+    print("Running. Ctrl-c to quit")
+    client = connect()
+
+    stamp = None
+    end = 0.0
+    for count, window in enumerate(windows(stream_csv(filename, loops), size, overlap)):
+        start = float(window.times[0])
+        if count == 0 and len(window) == size and overlap > 0 and window.times[-1] - window.times[size - overlap] <= lead:
+            # checked before the robot moves, the following windows share as many points
+            rospy.logerr("--overlap of %d points is %f s, which must be longer than --lead %f s",
+                         overlap, window.times[-1] - window.times[size - overlap], lead)
+            return
+        if stamp is None:
+            stamp = rospy.Time.now()
+        else:
+            if end - lead <= start:
+                rospy.logerr("window %d shares %f s with the previous one, which must be longer than --lead %f s", count, end - start, lead)
+                break
+            wait = stamp + rospy.Duration(end - lead) - rospy.Time.now()
+            if wait > rospy.Duration(0):
+                rospy.sleep(wait)
+        if rospy.is_shutdown():
+            break
+        client.send_goal(trajectory_goal(window, stamp))
+        end = window.duration
+        rospy.logdebug("sent window %d of %d points from %f to %f", count, len(window), start, end)
+    if stamp is None:
+        rospy.logerr("No points in %s", filename)
+        return
+    print("waiting...")
+    remaining = (stamp + rospy.Duration(end) - rospy.Time.now()).to_sec()
+    if not client.wait_for_result(timeout=rospy.Duration(max(remaining, 0.0) + 60)):
+        rospy.logerr("Timed out waiting for JTA")
+    rospy.loginfo("Exitting...")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Reading CSV trajectory data and send to the robot.')
     parser.add_argument('filename', type=str, nargs=1,
                         help='CSV trajectory data file name')
+    parser.add_argument('--tolerance', type=float,
+                        help='drop points while the joint error stays within this tolerance [rad]')
+    parser.add_argument('--rate', type=float,
+                        help='resample the trajectory at this rate [Hz]')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the CSV lazily and send it as overlapping goals, so that motion starts after the first window')
+    parser.add_argument('--loops', type=int, default=1,
+                        help='repeat the trajectory this many times with --stream, 0 repeats it until Ctrl-c')
+    parser.add_argument('--window', type=int, default=TrajectoryConst.WINDOW_POINTS,
+                        help='points of each goal with --stream')
+    parser.add_argument('--overlap', type=int, default=TrajectoryConst.WINDOW_OVERLAP,
+                        help='points shared by consecutive goals with --stream')
+    parser.add_argument('--lead', type=float, default=TrajectoryConst.WINDOW_LEAD,
+                        help='seconds before the end of the previous goal at which each goal is sent with --stream, less than the overlap')
     args = parser.parse_args(rospy.myargv()[1:])
-    main(args.filename[0])
+    if args.stream:
+        if args.tolerance is not None or args.rate is not None:
+            parser.error('--tolerance and --rate need the whole trajectory, they can not be used with --stream')
+        if not 2 <= args.overlap < args.window:
+            parser.error('--overlap must be at least 2 and less than --window, so that consecutive goals share some time')
+        if args.lead <= 0:
+            parser.error('--lead must be positive, to leave time for the goal to reach the controller')
+        stream(args.filename[0], args.loops or None, args.window, args.overlap, args.lead)
+    else:
+        main(args.filename[0], args.tolerance, args.rate)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# This file sends a CSV trajectory to the fullbody_controller of many GUNDAMs at once, each spawned under its own namespace
+# The action clients run in one asyncio loop through trajectory_dispatcher.py, without a thread per robot,
+# and the status and the latency to the first feedback of each robot are printed at the end
+
+import argparse
+import asyncio
+import json
+import sys
+
+import actionlib
+import rospy
+from actionlib_msgs.msg import GoalStatus
+from control_msgs.msg import FollowJointTrajectoryAction
+
+from joint_trajectory_client_csv import trajectory_goal
+from trajectory import compile_trajectory, load_trajectory
+from trajectory_dispatcher import DispatchConst, TrajectoryDispatcher
+
+
+STATUS_NAMES = dict((getattr(GoalStatus, name), name) for name in
+                    ('PENDING', 'ACTIVE', 'PREEMPTED', 'SUCCEEDED', 'ABORTED', 'REJECTED', 'PREEMPTING', 'RECALLING', 'RECALLED', 'LOST'))
+
+
+class ActionEndpoint(object):
+    # actionlib.ActionClient whose callbacks, called from the rospy threads, are handed over to the event loop
+    def __init__(self, namespace, loop):
+        self.loop = loop
+        self.client = actionlib.ActionClient('/'.join(name.strip('/') for name in (namespace, DispatchConst.ACTION) if name.strip('/')),
+                                             FollowJointTrajectoryAction)
+
+    async def wait_for_server(self, timeout):
+        deadline = self.loop.time() + timeout
+        while not rospy.is_shutdown():
+            if self.client.wait_for_server(rospy.Duration(0.01)):
+                return True
+            if self.loop.time() > deadline:
+                return False
+            await asyncio.sleep(0.1)
+        return False
+
+    def send_goal(self, trajectory, start_time, feedback_cb, done_cb):
+        # start_time of the event loop clock to the header stamp of the goal
+        stamp = rospy.Time.now() + rospy.Duration(start_time - self.loop.time())
+
+        def transition_cb(handle):
+            if handle.get_comm_state() == actionlib.CommState.DONE:
+                result = handle.get_result()
+                self.loop.call_soon_threadsafe(done_cb, STATUS_NAMES.get(handle.get_goal_status(), 'LOST'),
+                                               None if result is None else result.error_code)
+
+        def goal_feedback_cb(handle, feedback):
+            self.loop.call_soon_threadsafe(feedback_cb, feedback)
+
+        return self.client.send_goal(trajectory_goal(trajectory, stamp), transition_cb, goal_feedback_cb)
+
+
+async def run(namespaces, trajectory, delay, timeout):
+    loop = asyncio.get_event_loop()
+    dispatcher = TrajectoryDispatcher(dict((namespace, ActionEndpoint(namespace, loop)) for namespace in namespaces))
+    missing = await dispatcher.connect(timeout)
+    for namespace in missing:
+        rospy.logerr("Timed out waiting for Action Server of %s", namespace)
+    trajectories = dict((namespace, trajectory) for namespace in namespaces if namespace not in missing)
+    return missing, await dispatcher.dispatch(trajectories, delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reading CSV trajectory data and send to many robots at once.')
+    parser.add_argument('filename', type=str, help='CSV trajectory data file name')
+    parser.add_argument('--namespaces', nargs='+', required=True, help='namespace of each robot, e.g. gundam0 gundam1')
+    parser.add_argument('--tolerance', type=float,
+                        help='drop points while the joint error stays within this tolerance [rad]')
+    parser.add_argument('--rate', type=float,
+                        help='resample the trajectory at this rate [Hz]')
+    parser.add_argument('--delay', type=float, default=DispatchConst.START_DELAY,
+                        help='seconds from sending the goals to the common start of the trajectories')
+    parser.add_argument('--timeout', type=float, default=DispatchConst.SERVER_TIMEOUT,
+                        help='seconds to wait for the action servers')
+    parser.add_argument('--report', help='write the report of each robot to this json file')
+    args = parser.parse_args(rospy.myargv()[1:])
+
+    rospy.init_node("joint_trajectory_client_fleet", disable_signals=True)
+    trajectory = compile_trajectory(load_trajectory(args.filename), args.tolerance, args.rate)
+    missing, reports = asyncio.run(run(args.namespaces, trajectory, args.delay, args.timeout))
+
+    print('{:<24} {:>10} {:>6} {:>12} {:>10}'.format('namespace', 'status', 'error', 'latency [ms]', 'feedbacks'))
+    for namespace in args.namespaces:
+        if namespace in reports:
+            report = reports[namespace]
+            print('{:<24} {:>10} {:>6} {:>12} {:>10}'.format(
+                namespace, report.status, '' if report.error_code is None else report.error_code,
+                '' if report.latency is None else '{:.1f}'.format(report.latency * 1000), report.feedbacks))
+    if args.report:
+        with open(args.report, 'w') as fout:
+            json.dump({'missing': missing, 'robots': [report.to_dict() for report in reports.values()]}, fout, indent=1)
+            fout.write('\n')
+    rospy.signal_shutdown('done')
+    if missing or not all(report.succeeded for report in reports.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+# This file loads the CSV trajectories under csv/ into a time vector and a positions matrix
+# The parsed arrays are cached as .npz next to the CSV, so that the clients load a gait in milliseconds
+# The joint names are checked against the URDF of gundam_rx78_description
+# The trajectories can also be resampled and decimated with velocities and accelerations,
+# so that the goals have fewer points and the controller builds fewer spline segments
+# Long or looping gaits can be read lazily and cut into overlapping windows, which are sent as successive goals
+
+import itertools
+import os
+import xml.etree.ElementTree
+
+import numpy
+
+
+class TrajectoryConst:
+    CACHE_EXT       = '.npz'
+    CACHE_VERSION   = 2             # Increase when the cached arrays or the stamp change
+    READ_ROWS       = 1000          # Rows parsed at once when streaming a CSV
+    WINDOW_POINTS   = 100           # Points of each streamed goal
+    WINDOW_OVERLAP  = 10            # Points shared by consecutive streamed goals
+    WINDOW_LEAD     = 0.2           # Seconds before the end of a streamed goal at which the next one is sent, within the overlap
+    JOINT_SUFFIX    = '_joint'      # Added by rename_resize_joint_link.py
+    # gundam_rx78_description is next to this package, both in the source tree and in the install space
+    URDF_PATH       = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))),
+                                   'gundam_rx78_description', 'urdf', 'GGC_TestModel_rx78_20170112.urdf')
+
+
+class Trajectory(object):
+    def __init__(self, joint_names, times, positions, velocities=None, accelerations=None):
+        # times (T,) in seconds from the start of the goal, positions (T, J) in the order of joint_names
+        # velocities and accelerations (T, J) are None when the trajectory has positions only
+        self.joint_names = list(joint_names)
+        self.times = numpy.asarray(times, dtype=numpy.float64)
+        self.positions = numpy.asarray(positions, dtype=numpy.float64)
+        self.velocities = None if velocities is None else numpy.asarray(velocities, dtype=numpy.float64)
+        self.accelerations = None if accelerations is None else numpy.asarray(accelerations, dtype=numpy.float64)
+        for values in (self.positions, self.velocities, self.accelerations):
+            if values is not None and values.shape != (len(self.times), len(self.joint_names)):
+                raise ValueError('values of shape {} do not match {} times and {} joints'.format(
+                    values.shape, len(self.times), len(self.joint_names)))
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.times) > 0 else 0.0
+
+
+def load_trajectory(csv_path, urdf_path=TrajectoryConst.URDF_PATH, use_cache=True):
+    # Load from the cache if it was written from the same CSV, otherwise parse the CSV and write the cache
+    cache_path = os.path.splitext(csv_path)[0] + TrajectoryConst.CACHE_EXT
+    # The joint names are checked on a cache hit too, since the URDF may have changed since the cache was written
+    trajectory = load_cache(cache_path, csv_path) if use_cache else None
+    if trajectory is None:
+        trajectory = parse_csv(csv_path)
+        if use_cache:
+            save_cache(cache_path, csv_path, trajectory)
+    if urdf_path is not None:
+        validate_joint_names(trajectory.joint_names, urdf_path)
+    return trajectory
+
+
+def read_header(fin, csv_path):
+    # The first row is "time, joint names...", and each following row is the time and the joint positions
+    header = [name.strip() for name in fin.readline().split(',')]
+    while header and header[-1] == '':
+        header.pop()
+    if len(header) < 2 or header[0] != 'time':
+        raise ValueError('{}: the header must be "time, joint names..."'.format(csv_path))
+    return header
+
+
+def parse_rows(rows, header, csv_path):
+    values = numpy.loadtxt(rows, delimiter=',', dtype=numpy.float64, ndmin=2)
+    if values.size == 0:
+        values = numpy.zeros((0, len(header)))
+    elif values.shape[1] != len(header):
+        raise ValueError('{}: {} columns in the header but {} in the rows'.format(csv_path, len(header), values.shape[1]))
+    if numpy.any(numpy.diff(values[:, 0]) <= 0):
+        raise ValueError('{}: time is not increasing'.format(csv_path))
+    return values
+
+
+def parse_csv(csv_path):
+    with open(csv_path, 'r') as fin:
+        header = read_header(fin, csv_path)
+        values = parse_rows(fin, header, csv_path)
+    return Trajectory(header[1:], values[:, 0], values[:, 1:])
+
+
+def stream_csv(csv_path, loops=1, urdf_path=TrajectoryConst.URDF_PATH, rows=TrajectoryConst.READ_ROWS):
+    # Yield the trajectory in chunks of rows without reading the whole file, loops times or forever if loops is None
+    # Each loop starts one sample interval after the end of the previous one
+    offset = 0.0
+    last = None
+    for loop in itertools.count() if loops is None else range(loops):
+        interval = None
+        with open(csv_path, 'r') as fin:
+            header = read_header(fin, csv_path)
+            if loop == 0 and urdf_path is not None:
+                validate_joint_names(header[1:], urdf_path)
+            while True:
+                lines = [line for line in itertools.islice(fin, rows) if line.strip()]
+                if len(lines) == 0:
+                    break
+                values = parse_rows(lines, header, csv_path)
+                if interval is None:
+                    if len(values) < 2:
+                        raise ValueError('{}: a looped trajectory needs two rows in the first chunk'.format(csv_path))
+                    interval = values[1, 0] - values[0, 0]
+                    if last is not None:
+                        offset = last + interval - values[0, 0]
+                times = values[:, 0] + offset
+                if last is not None and times[0] <= last:
+                    raise ValueError('{}: time is not increasing'.format(csv_path))
+                last = times[-1]
+                yield Trajectory(header[1:], times, values[:, 1:])
+        if interval is None:
+            return
+
+
+def windows(chunks, size=TrajectoryConst.WINDOW_POINTS, overlap=TrajectoryConst.WINDOW_OVERLAP):
+    # Cut an iterable of trajectory chunks into windows of size points, each starting with the last overlap points
+    # of the previous one, so at most one window and one chunk are in memory
+    if not 0 <= overlap < size:
+        raise ValueError('overlap {} must be less than the window size {}'.format(overlap, size))
+    buffered = None
+    emitted = False
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        buffered = chunk if buffered is None else concatenate([buffered, chunk])
+        while len(buffered) >= size:
+            yield subset(buffered, numpy.arange(size))
+            emitted = True
+            buffered = subset(buffered, numpy.arange(size - overlap, len(buffered)))
+    if buffered is not None and (not emitted or len(buffered) > overlap):
+        yield buffered
+
+
+def concatenate(trajectories):
+    def stack(name):
+        values = [getattr(trajectory, name) for trajectory in trajectories]
+        return None if any(value is None for value in values) else numpy.concatenate(values)
+    return Trajectory(trajectories[0].joint_names, stack('times'), stack('positions'), stack('velocities'), stack('accelerations'))
+
+
+def strip_joint_suffix(name):
+    if name.endswith(TrajectoryConst.JOINT_SUFFIX):
+        return name[:-len(TrajectoryConst.JOINT_SUFFIX)]
+    return name
+
+
+def validate_joint_names(joint_names, urdf_path):
+    # Accept the joint names with or without the suffix added by rename_resize_joint_link.py
+    urdf_joints = set()
+    for joint in xml.etree.ElementTree.parse(urdf_path).getroot().findall('joint'):
+        if joint.get('type') != 'fixed':
+            urdf_joints.add(strip_joint_suffix(joint.get('name')))
+    unknown = [name for name in joint_names if strip_joint_suffix(name) not in urdf_joints]
+    if unknown:
+        raise ValueError('joints not in {}: {}'.format(urdf_path, ', '.join(unknown)))
+    duplicated = set(name for name in joint_names if joint_names.count(name) > 1)
+    if duplicated:
+        raise ValueError('joints given more than once: {}'.format(', '.join(sorted(duplicated))))
+
+
+def source_stamp(csv_path):
+    # The modification time in microseconds, as Python 2 of kinetic and melodic has no st_mtime_ns
+    stat = os.stat(csv_path)
+    return numpy.array([TrajectoryConst.CACHE_VERSION, int(round(stat.st_mtime * 1e6)), stat.st_size], dtype=numpy.int64)
+
+
+def load_cache(cache_path, csv_path):
+    # A missing, stale or broken cache is ignored
+    try:
+        with numpy.load(cache_path, allow_pickle=False) as data:
+            if not numpy.array_equal(data['stamp'], source_stamp(csv_path)):
+                return None
+            return Trajectory(data['joint_names'].tolist(), data['times'], data['positions'])
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+
+def save_cache(cache_path, csv_path, trajectory):
+    # The CSV may be installed in a read-only directory, then it is parsed every time
+    temp_path = cache_path + '.tmp' + TrajectoryConst.CACHE_EXT
+    try:
+        numpy.savez(temp_path,
+                    stamp=source_stamp(csv_path),
+                    joint_names=numpy.array(trajectory.joint_names, dtype=str),
+                    times=trajectory.times,
+                    positions=trajectory.positions)
+        os.rename(temp_path, cache_path)
+    except (IOError, OSError):
+        pass
+
+
+def fit_spline(trajectory):
+    # C2 cubic spline through all points, for all joints at once
+    # scipy is only needed to resample or decimate, and CubicSpline needs scipy 0.18 or later, which xenial does not have
+    from scipy.interpolate import CubicSpline
+    return CubicSpline(trajectory.times, trajectory.positions, axis=0)
+
+
+def sample_spline(joint_names, spline, times):
+    # Trajectory with the positions, velocities and accelerations of the spline at the times
+    return Trajectory(joint_names, times, spline(times), spline(times, 1), spline(times, 2))
+
+
+def resample(trajectory, rate):
+    # Sample the spline at rate [Hz], keeping the first and last points
+    spline = fit_spline(trajectory)
+    count = max(int(round((trajectory.times[-1] - trajectory.times[0]) * rate)), 1) + 1
+    return sample_spline(trajectory.joint_names, spline, numpy.linspace(trajectory.times[0], trajectory.times[-1], count))
+
+
+def quintic_hermite(trajectory, segments, times):
+    # Positions at times (S,) in segments (S,) between the points, interpolated from the positions, velocities
+    # and accelerations at both ends of each segment, as the quintic spline segments of joint_trajectory_controller
+    t0 = trajectory.times[segments]
+    h = (trajectory.times[segments + 1] - t0)[:, None]
+    s = ((times - t0) / h[:, 0])[:, None]
+    s2 = s * s
+    s3 = s2 * s
+    s4 = s3 * s
+    s5 = s4 * s
+    p, v, a = trajectory.positions, trajectory.velocities, trajectory.accelerations
+    terms = ((1 - 10 * s3 + 15 * s4 - 6 * s5) * p[segments],
+             (s - 6 * s3 + 8 * s4 - 3 * s5) * h * v[segments],
+             (0.5 * s2 - 1.5 * s3 + 1.5 * s4 - 0.5 * s5) * h * h * a[segments],
+             (10 * s3 - 15 * s4 + 6 * s5) * p[segments + 1],
+             (-4 * s3 + 7 * s4 - 3 * s5) * h * v[segments + 1],
+             (0.5 * s3 - s4 + 0.5 * s5) * h * h * a[segments + 1])
+    return sum(terms)
+
+
+def decimate(trajectory, tolerance):
+    # Keep the fewest points such that interpolating between them stays within tolerance [rad] of every point
+    # Starting from the first and last points, the worst point of every segment out of tolerance is added
+    # until no segment is, each round evaluated for all points at once
+    if trajectory.velocities is None or trajectory.accelerations is None:
+        trajectory = sample_spline(trajectory.joint_names, fit_spline(trajectory), trajectory.times)
+    count = len(trajectory)
+    if count <= 2:
+        return trajectory
+    keep = numpy.zeros(count, dtype=bool)
+    keep[[0, -1]] = True
+    while True:
+        kept = numpy.flatnonzero(keep)
+        decimated = subset(trajectory, kept)
+        segments = numpy.clip(numpy.searchsorted(kept, numpy.arange(count), side='right') - 1, 0, len(kept) - 2)
+        errors = numpy.abs(quintic_hermite(decimated, segments, trajectory.times) - trajectory.positions).max(axis=1)
+        errors[keep] = 0.0
+        if errors.max() <= tolerance:
+            return decimated
+        # worst point of each segment
+        order = numpy.lexsort((-errors, segments))
+        first = order[numpy.r_[True, segments[order][1:] != segments[order][:-1]]]
+        keep[first[errors[first] > tolerance]] = True
+
+
+def subset(trajectory, indices):
+    return Trajectory(trajectory.joint_names, trajectory.times[indices], trajectory.positions[indices],
+                      None if trajectory.velocities is None else trajectory.velocities[indices],
+                      None if trajectory.accelerations is None else trajectory.accelerations[indices])
+
+
+def compile_trajectory(trajectory, tolerance=None, rate=None):
+    # Resample at rate [Hz] and decimate within tolerance [rad] if given, with velocities and accelerations
+    # from the spline through the original points. Without both, the trajectory is returned unchanged
+    if rate is not None:
+        trajectory = resample(trajectory, rate)
+    if tolerance is not None:
+        trajectory = decimate(trajectory, tolerance)
+    return trajectory
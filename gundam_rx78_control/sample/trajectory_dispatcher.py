@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+# This file sends trajectories to many follow_joint_trajectory endpoints at once from one asyncio loop,
+# e.g. to the fullbody_controller of each GUNDAM spawned under its own namespace
+# An endpoint only has to provide wait_for_server() and send_goal() with callbacks, so the dispatcher runs
+# with the actionlib bridge of joint_trajectory_client_fleet.py or with StandInEndpoint, which needs no ROS master
+# Each goal is reported with its final status and the latency from sending it to its first feedback
+
+import asyncio
+
+import numpy
+
+
+class DispatchConst:
+    ACTION          = 'fullbody_controller/follow_joint_trajectory'
+    SERVER_TIMEOUT  = 10.0      # Seconds to wait for the action servers
+    START_DELAY     = 1.0       # Seconds from sending the goals to the common start of the trajectories
+    RESULT_MARGIN   = 10.0      # Seconds to wait for a result after the end of its trajectory
+    FEEDBACK_PERIOD = 0.02      # Seconds between feedbacks of StandInEndpoint, as the controller state rate
+    # error_code of control_msgs/FollowJointTrajectoryResult
+    SUCCESSFUL      = 0
+    INVALID_GOAL    = -1
+    INVALID_JOINTS  = -2
+
+
+class GoalReport(object):
+    def __init__(self, namespace, points):
+        # Times are of the event loop clock, None until the event happens
+        self.namespace = namespace
+        self.points = points
+        self.sent = None
+        self.first_feedback = None
+        self.done = None
+        self.feedbacks = 0
+        self.status = None          # Name of actionlib_msgs/GoalStatus, or TIMEOUT
+        self.error_code = None
+
+    @property
+    def latency(self):
+        # Seconds from sending the goal to its first feedback
+        if self.sent is None or self.first_feedback is None:
+            return None
+        return self.first_feedback - self.sent
+
+    @property
+    def succeeded(self):
+        return self.status == 'SUCCEEDED' and self.error_code in (None, DispatchConst.SUCCESSFUL)
+
+    def to_dict(self):
+        return {'namespace': self.namespace, 'points': self.points, 'status': self.status, 'error_code': self.error_code,
+                'latency': self.latency, 'feedbacks': self.feedbacks,
+                'seconds': None if self.sent is None or self.done is None else self.done - self.sent}
+
+
+class TrajectoryDispatcher(object):
+    def __init__(self, endpoints):
+        # endpoints maps each namespace to an endpoint, all callbacks of the endpoints run in the event loop
+        self.endpoints = dict(endpoints)
+
+    async def connect(self, timeout=DispatchConst.SERVER_TIMEOUT):
+        # Namespaces whose action server did not come up within timeout
+        ready = await asyncio.gather(*[endpoint.wait_for_server(timeout) for endpoint in self.endpoints.values()])
+        return [namespace for namespace, is_ready in zip(self.endpoints, ready) if not is_ready]
+
+    async def send(self, namespace, trajectory, start_time, margin=DispatchConst.RESULT_MARGIN, on_feedback=None):
+        # Send a trajectory whose time 0 is start_time of the event loop clock, and wait for its result
+        loop = asyncio.get_event_loop()
+        report = GoalReport(namespace, len(trajectory.times))
+        done = loop.create_future()
+
+        def feedback_cb(feedback):
+            if report.first_feedback is None:
+                report.first_feedback = loop.time()
+            report.feedbacks += 1
+            if on_feedback is not None:
+                on_feedback(namespace, feedback)
+
+        def done_cb(status, error_code):
+            if not done.done():
+                done.set_result((status, error_code))
+
+        report.sent = loop.time()
+        handle = self.endpoints[namespace].send_goal(trajectory, start_time, feedback_cb, done_cb)
+        timeout = start_time - report.sent + float(trajectory.times[-1]) + margin
+        try:
+            report.status, report.error_code = await asyncio.wait_for(asyncio.shield(done), timeout)
+        except asyncio.TimeoutError:
+            handle.cancel()
+            report.status = 'TIMEOUT'
+        report.done = loop.time()
+        return report
+
+    async def dispatch(self, trajectories, delay=DispatchConst.START_DELAY, margin=DispatchConst.RESULT_MARGIN, on_feedback=None):
+        # Send trajectories, which maps namespaces to trajectories, to start together delay seconds from now
+        start_time = asyncio.get_event_loop().time() + delay
+        reports = await asyncio.gather(*[self.send(namespace, trajectory, start_time, margin, on_feedback)
+                                         for namespace, trajectory in trajectories.items()])
+        return dict((report.namespace, report) for report in reports)
+
+
+class StandInGoal(object):
+    def __init__(self, task):
+        self.task = task
+
+    def cancel(self):
+        self.task.cancel()
+
+
+class StandInFeedback(object):
+    def __init__(self, joint_names, time_from_start, positions):
+        self.joint_names = joint_names
+        self.time_from_start = time_from_start
+        self.desired_positions = positions
+
+
+class StandInEndpoint(object):
+    # In-process follow_joint_trajectory server, which accepts goals after accept_delay, sends the interpolated
+    # positions as feedback until the end of the trajectory and succeeds, or never finishes with hang
+    def __init__(self, joint_names=None, server_delay=0.0, accept_delay=0.0, feedback_period=DispatchConst.FEEDBACK_PERIOD, hang=False):
+        self.joint_names = None if joint_names is None else set(joint_names)
+        self.server_delay = server_delay
+        self.accept_delay = accept_delay
+        self.feedback_period = feedback_period
+        self.hang = hang
+        self.created = asyncio.get_event_loop().time()
+        self.active = None
+        self.goals = 0
+
+    async def wait_for_server(self, timeout):
+        wait = self.created + self.server_delay - asyncio.get_event_loop().time()
+        if wait > timeout:
+            await asyncio.sleep(timeout)
+            return False
+        await asyncio.sleep(max(wait, 0.0))
+        return True
+
+    def send_goal(self, trajectory, start_time, feedback_cb, done_cb):
+        # A new goal preempts the active one, as the goal replacement of joint_trajectory_controller
+        if self.active is not None:
+            self.active.cancel()
+        self.goals += 1
+        self.active = StandInGoal(asyncio.ensure_future(self.execute(trajectory, start_time, feedback_cb, done_cb)))
+        return self.active
+
+    async def execute(self, trajectory, start_time, feedback_cb, done_cb):
+        loop = asyncio.get_event_loop()
+        try:
+            await asyncio.sleep(self.accept_delay)
+            if self.joint_names is not None and not set(trajectory.joint_names) <= self.joint_names:
+                done_cb('ABORTED', DispatchConst.INVALID_JOINTS)
+                return
+            if len(trajectory.times) == 0:
+                done_cb('ABORTED', DispatchConst.INVALID_GOAL)
+                return
+            end_time = start_time + float(trajectory.times[-1])
+            while self.hang or loop.time() < end_time:
+                time_from_start = loop.time() - start_time
+                positions = numpy.array([numpy.interp(time_from_start, trajectory.times, trajectory.positions[:, i])
+                                         for i in range(len(trajectory.joint_names))])
+                feedback_cb(StandInFeedback(trajectory.joint_names, time_from_start, positions))
+                await asyncio.sleep(self.feedback_period)
+            done_cb('SUCCEEDED', DispatchConst.SUCCESSFUL)
+        except asyncio.CancelledError:
+            done_cb('PREEMPTED', None)
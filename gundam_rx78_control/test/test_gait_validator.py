@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# This file checks the CSV gaits of sample/csv/ with gait_validator.py, so that a broken gait fails without a simulator
+
+import glob
+import os
+import sys
+import unittest
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'sample'))
+from gait_validator import JointLimits, ValidateConst, load_controller_joints, validate_gaits  # noqa: E402
+from trajectory import Trajectory, TrajectoryConst, parse_csv  # noqa: E402
+
+
+class TestGaitValidator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.limits = JointLimits(TrajectoryConst.URDF_PATH)
+        cls.joints, cls.allow_partial = load_controller_joints()
+
+    def test_sample_gaits(self):
+        filenames = sorted(glob.glob(ValidateConst.CSV_PATTERN))
+        self.assertGreater(len(filenames), 0)
+        gaits = dict((os.path.basename(filename), parse_csv(filename)) for filename in filenames)
+        violations = validate_gaits(gaits, self.limits, self.joints, self.allow_partial)
+        self.assertEqual([str(violation) for violation in violations], [])
+
+    def test_broken_gait(self):
+        lower, upper, velocity = self.limits.limits['lleg_knee_p']
+        times = numpy.array([0.0, 0.1, 0.2, 0.3])
+        positions = numpy.zeros((4, 3))
+        positions[1, 0] = upper + 0.1       # lleg_knee_p above its limit at 100 ms
+        positions[3, 1] = 0.5               # lleg_crotch_p jumps at 300 ms
+        gait = Trajectory(['lleg_knee_p', 'lleg_crotch_p', 'unknown_leg'], times, positions)
+        violations = validate_gaits({'broken.csv': gait}, self.limits, self.joints, allow_partial=False, max_velocity=1.0)
+        found = set((violation.joint, violation.kind, violation.time_ms) for violation in violations)
+        self.assertIn(('lleg_knee_p', 'upper', 100), found)
+        self.assertIn(('lleg_knee_p', 'velocity', 100), found)
+        self.assertIn(('lleg_knee_p', 'velocity', 200), found)
+        self.assertIn(('lleg_crotch_p', 'velocity', 300), found)
+        self.assertIn(('unknown_leg', 'unknown_joint', None), found)
+        self.assertIn(('rleg_knee_p', 'missing_joint', None), found)
+
+    def test_mimic_limits(self):
+        # a mimic joint follows its reference joint, whose value is checked against the limits of the mimic joint
+        mimic, (reference, multiplier, offset) = sorted((name, mimic) for name, mimic in self.limits.mimics.items()
+                                                        if mimic[0] in self.joints and name in self.limits.limits)[0]
+        mimic_upper = self.limits.limits[mimic][1]
+        value = ((mimic_upper + 0.1) - offset) / multiplier
+        gait = Trajectory([reference], [0.0, 1.0], [[0.0], [value]])
+        violations = validate_gaits({'mimic.csv': gait}, self.limits, self.joints, allow_partial=True, mimic_margin=None)
+        kinds = set((violation.joint, violation.kind, violation.time_ms) for violation in violations)
+        self.assertIn((mimic, 'mimic_upper', 1000), kinds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+# This file tests trajectory_dispatcher.py against StandInEndpoint, so it needs neither a ROS master nor a simulator
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'sample'))
+from trajectory import Trajectory  # noqa: E402
+from trajectory_dispatcher import DispatchConst, StandInEndpoint, TrajectoryDispatcher  # noqa: E402
+
+JOINT_NAMES = ['lleg_crotch_p', 'lleg_knee_p', 'rleg_crotch_p', 'rleg_knee_p']
+
+
+def trajectory(duration, joint_names=JOINT_NAMES):
+    times = numpy.linspace(0.0, duration, 5)
+    return Trajectory(joint_names, times, numpy.outer(times, numpy.ones(len(joint_names))))
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestTrajectoryDispatcher(unittest.TestCase):
+    def test_dispatch_concurrently(self):
+        async def dispatch():
+            endpoints = dict(('gundam{}'.format(i), StandInEndpoint(JOINT_NAMES, accept_delay=0.05 * i)) for i in range(8))
+            dispatcher = TrajectoryDispatcher(endpoints)
+            self.assertEqual(await dispatcher.connect(1.0), [])
+            return await dispatcher.dispatch(dict((namespace, trajectory(0.3)) for namespace in endpoints), delay=0.1)
+
+        start = time.time()
+        reports = run(dispatch())
+        # the robots run at the same time, not one after another
+        self.assertLess(time.time() - start, 8 * 0.3)
+        self.assertEqual(sorted(reports), ['gundam{}'.format(i) for i in range(8)])
+        for i in range(8):
+            report = reports['gundam{}'.format(i)]
+            self.assertTrue(report.succeeded, report.to_dict())
+            self.assertGreater(report.feedbacks, 0)
+            self.assertGreaterEqual(report.latency, 0.05 * i)
+        # a slower server answers later, without absolute bounds which a loaded machine would break
+        latencies = [reports['gundam{}'.format(i)].latency for i in range(8)]
+        self.assertEqual(latencies, sorted(latencies))
+
+    def test_invalid_joints(self):
+        async def dispatch():
+            dispatcher = TrajectoryDispatcher({'gundam': StandInEndpoint(JOINT_NAMES)})
+            return await dispatcher.dispatch({'gundam': trajectory(0.1, JOINT_NAMES + ['unknown_joint'])}, delay=0.0)
+
+        report = run(dispatch())['gundam']
+        self.assertEqual(report.status, 'ABORTED')
+        self.assertEqual(report.error_code, DispatchConst.INVALID_JOINTS)
+        self.assertIsNone(report.latency)
+
+    def test_missing_server(self):
+        async def connect():
+            dispatcher = TrajectoryDispatcher({'gundam0': StandInEndpoint(), 'gundam1': StandInEndpoint(server_delay=10.0)})
+            return await dispatcher.connect(0.1)
+
+        self.assertEqual(run(connect()), ['gundam1'])
+
+    def test_timeout(self):
+        async def dispatch():
+            endpoint = StandInEndpoint(hang=True)
+            reports = await TrajectoryDispatcher({'gundam': endpoint}).dispatch({'gundam': trajectory(0.1)}, delay=0.0, margin=0.1)
+            await asyncio.sleep(0)
+            return reports['gundam'], endpoint.active.task
+
+        report, task = run(dispatch())
+        self.assertEqual(report.status, 'TIMEOUT')
+        self.assertGreater(report.feedbacks, 0)
+        self.assertTrue(task.done())
+
+    def test_preempt(self):
+        async def dispatch():
+            endpoint = StandInEndpoint()
+            dispatcher = TrajectoryDispatcher({'gundam': endpoint})
+            start_time = asyncio.get_event_loop().time()
+            first = asyncio.ensure_future(dispatcher.send('gundam', trajectory(1.0), start_time))
+            await asyncio.sleep(0.1)
+            second = await dispatcher.send('gundam', trajectory(0.1), start_time)
+            return await first, second
+
+        first, second = run(dispatch())
+        self.assertEqual(first.status, 'PREEMPTED')
+        self.assertTrue(second.succeeded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+# This file measures how expensive the generated URDF and its meshes are to load and simulate,
+# and compares the result with benchmark/baseline.json, so that an asset change is tracked like a code change
+# Run ./benchmark/(script_name).py inside gundam_rx78_description/ after regenerating the URDF or the meshes
+# It exits with 1 if any metric grows beyond its threshold, and --update writes the result as the new baseline
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree
+
+import numpy
+import trimesh  # Use "pip install --user trimesh".
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'scripts'))
+from collision_collada import convex_hull  # noqa: E402
+from kinematic_tree import KinematicTree  # noqa: E402
+
+
+class BenchConst:
+    PACKAGE_DIR     = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    PACKAGE_URL     = 'package://gundam_rx78_description/'
+    URDF_PATH       = 'urdf/GGC_TestModel_rx78_20170112_.urdf'     # Relative to PACKAGE_DIR
+    BASELINE_PATH   = 'benchmark/baseline.json'
+    REPEAT          = 3                 # Timings are the best of this many runs
+    # Allowed growth of each metric over the baseline, as a ratio
+    # Timings depend on the machine, so they only catch large regressions
+    THRESHOLDS      = {'parse_seconds': 1.0, 'load_seconds': 1.0, 'default': 0.01}
+    TIMING_METRICS  = ('parse_seconds', 'load_seconds')
+
+
+def package_path(filename: str) -> str:
+    if filename.startswith(BenchConst.PACKAGE_URL):
+        filename = filename[len(BenchConst.PACKAGE_URL):]
+    return os.path.join(BenchConst.PACKAGE_DIR, filename)
+
+
+def parse_urdf(urdf_path: str) -> tuple:
+    # Kinematic tree, and the visual and collision mesh files of each link
+    tree = KinematicTree.from_urdf(urdf_path)
+    meshes = dict()
+    for link in xml.etree.ElementTree.parse(urdf_path).getroot().findall('link'):
+        meshes[link.get('name')] = {kind: [mesh.get('filename') for mesh in link.findall('{}/geometry/mesh'.format(kind))]
+                                    for kind in ('visual', 'collision')}
+    return tree, meshes
+
+
+def best_time(function, repeat: int) -> tuple:
+    # Result of the last call and the shortest time of the calls
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return result, min(seconds)
+
+
+def load_meshes(filenames: list) -> dict:
+    return {filename: trimesh.load(package_path(filename), force='mesh', process=False) for filename in filenames}
+
+
+def hull_size(mesh) -> tuple:
+    # Vertices and faces of the convex hull which the physics engine cooks from a collision mesh
+    hull = convex_hull(numpy.asarray(mesh.vertices, dtype=numpy.float64))
+    if hull is None:
+        return 0, 0
+    return len(hull.vertices), len(hull.faces)
+
+
+def collision_pairs(tree: KinematicTree, link_shapes: dict) -> tuple:
+    # Link pairs and shape pairs the broadphase has to consider, without the parent-child pairs which simulators skip
+    links = [name for name, count in link_shapes.items() if count > 0]
+    counts = numpy.array([link_shapes[name] for name in links])
+    link_pairs = len(links) * (len(links) - 1) // 2
+    shape_pairs = (counts.sum() ** 2 - (counts ** 2).sum()) // 2
+    for joint in range(len(tree.joint_names)):
+        parent = tree.link_names[tree.joint_parent_link[joint]]
+        child = tree.link_names[tree.joint_child_link[joint]]
+        if link_shapes.get(parent, 0) > 0 and link_shapes.get(child, 0) > 0:
+            link_pairs -= 1
+            shape_pairs -= link_shapes[parent] * link_shapes[child]
+    return int(link_pairs), int(shape_pairs)
+
+
+def run_benchmark(urdf_path: str, repeat: int) -> dict:
+    (tree, link_meshes), parse_seconds = best_time(lambda: parse_urdf(urdf_path), repeat)
+    filenames = sorted(set(filename for kinds in link_meshes.values() for files in kinds.values() for filename in files))
+    meshes, load_seconds = best_time(lambda: load_meshes(filenames), repeat)
+    hulls = {filename: hull_size(meshes[filename]) for filename in sorted(set(filename for kinds in link_meshes.values() for filename in kinds['collision']))}
+
+    links = dict()
+    for name, kinds in link_meshes.items():
+        files = kinds['visual'] + kinds['collision']
+        links[name] = {'visual_triangles': sum(len(meshes[filename].faces) for filename in kinds['visual']),
+                       'visual_vertices': sum(len(meshes[filename].vertices) for filename in kinds['visual']),
+                       'collision_triangles': sum(len(meshes[filename].faces) for filename in kinds['collision']),
+                       'collision_shapes': len(kinds['collision']),
+                       'hull_vertices': sum(hulls[filename][0] for filename in kinds['collision']),
+                       'hull_faces': sum(hulls[filename][1] for filename in kinds['collision']),
+                       'bytes': sum(os.path.getsize(package_path(filename)) for filename in set(files))}
+
+    link_pairs, shape_pairs = collision_pairs(tree, {name: metrics['collision_shapes'] for name, metrics in links.items()})
+    totals = {'parse_seconds': parse_seconds,
+              'load_seconds': load_seconds,
+              'links': len(tree.link_names),
+              'joints': len(tree.joint_names),
+              'mesh_files': len(filenames),
+              'urdf_bytes': os.path.getsize(urdf_path),
+              'mesh_bytes': sum(os.path.getsize(package_path(filename)) for filename in filenames),
+              'collision_link_pairs': link_pairs,
+              'collision_shape_pairs': shape_pairs}
+    for metric in ('visual_triangles', 'visual_vertices', 'collision_triangles', 'collision_shapes', 'hull_vertices', 'hull_faces'):
+        totals[metric] = sum(metrics[metric] for metrics in links.values())
+    return {'urdf': os.path.relpath(urdf_path, BenchConst.PACKAGE_DIR), 'totals': totals, 'links': links}
+
+
+def threshold(thresholds: dict, metric: str) -> float:
+    return thresholds.get(metric, thresholds['default'])
+
+
+def regressions(result: dict, baseline: dict, thresholds: dict, skip_timing: bool) -> list[str]:
+    # Metrics which grew beyond their threshold, all metrics are costs so a decrease is never a regression
+    compared = [('total', result['totals'], baseline['totals'])]
+    compared += [(name, result['links'][name], baseline['links'][name]) for name in result['links'] if name in baseline['links']]
+    failures = []
+    for scope, metrics, base_metrics in compared:
+        for metric, value in metrics.items():
+            if metric not in base_metrics or (skip_timing and metric in BenchConst.TIMING_METRICS):
+                continue
+            base = base_metrics[metric]
+            if value > base * (1.0 + threshold(thresholds, metric)):
+                failures.append('{} {}: {:.6g} -> {:.6g} (+{:.1%}, threshold {:.1%})'.format(
+                    scope, metric, base, value, (value - base) / base if base else float('inf'), threshold(thresholds, metric)))
+    return failures
+
+
+def print_result(result: dict, baseline: dict | None) -> None:
+    print('{:<24} {:>14} {:>14}'.format('metric', 'result', 'baseline'))
+    for metric, value in result['totals'].items():
+        base = '' if baseline is None or metric not in baseline['totals'] else '{:.6g}'.format(baseline['totals'][metric])
+        print('{:<24} {:>14.6g} {:>14}'.format(metric, value, base))
+    if baseline is not None:
+        for name in sorted(set(result['links']) - set(baseline['links'])):
+            print('new link {}'.format(name))
+        for name in sorted(set(baseline['links']) - set(result['links'])):
+            print('removed link {}'.format(name))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the URDF and the meshes of gundam_rx78_description against a baseline')
+    parser.add_argument('--urdf', default=os.path.join(BenchConst.PACKAGE_DIR, BenchConst.URDF_PATH), help='URDF file name')
+    parser.add_argument('--baseline', default=os.path.join(BenchConst.PACKAGE_DIR, BenchConst.BASELINE_PATH), help='baseline json file name')
+    parser.add_argument('--repeat', type=int, default=BenchConst.REPEAT, help='runs of the timed steps, the best is reported')
+    parser.add_argument('--skip_timing', action='store_true', help='do not compare the timings, e.g. on a machine other than the one of the baseline')
+    parser.add_argument('--output', help='also write the result to this json file')
+    parser.add_argument('--update', action='store_true', help='write the result as the new baseline, keeping its thresholds')
+    args = parser.parse_args()
+
+    result = run_benchmark(args.urdf, args.repeat)
+    try:
+        with open(args.baseline) as fin:
+            baseline = json.load(fin)
+    except FileNotFoundError:
+        baseline = None
+    thresholds = dict(BenchConst.THRESHOLDS, **(baseline or dict()).get('thresholds', dict()))
+    print_result(result, baseline)
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(result, fout, indent=1)
+            fout.write('\n')
+
+    if args.update or baseline is None:
+        with open(args.baseline, 'w') as fout:
+            json.dump(dict(result, thresholds=thresholds), fout, indent=1)
+            fout.write('\n')
+        print('wrote baseline {}'.format(args.baseline))
+        return
+    failures = regressions(result, baseline, thresholds, args.skip_timing)
+    for failure in failures:
+        print('regression: {}'.format(failure))
+    if failures:
+        sys.exit(1)
+    print('no regression over {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
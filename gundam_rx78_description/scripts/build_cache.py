@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# This file provides the content hashes and the on-disk JSON indexes
+# that ggc_dae_to_urdf.py uses to skip regenerating data that did not change.
+
+import hashlib
+import json
+import os
+
+import numpy
+
+
+class CacheConst:
+    CACHE_DIR       = '.cache'          # Relative to gundam_rx78_description/, where ggc_dae_to_urdf.py is run
+    MANIFEST_FILE   = 'manifest.json'
+    READ_SIZE       = 1 << 20
+
+
+def geometry_digest(geometry, *params) -> str:
+    # Hash the vertex data of all primitives, plus any parameters that change the derived result
+    digest = hashlib.sha1()
+    for primitive in geometry.primitives:
+        if primitive.vertex is None:
+            continue
+        digest.update(numpy.ascontiguousarray(primitive.vertex, dtype=numpy.float64).tobytes())
+        digest.update(numpy.ascontiguousarray(primitive.vertex_index, dtype=numpy.int64).tobytes())
+    for param in params:
+        digest.update(repr(param).encode())
+    return digest.hexdigest()
+
+
+def data_digest(data) -> str:
+    # Hash any JSON-like data, e.g. the joint table or the script parameters
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def file_digest(path: str):
+    # Hash of the file contents, or None if the file does not exist
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as fin:
+            for block in iter(lambda: fin.read(CacheConst.READ_SIZE), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def cache_path(filename: str) -> str:
+    return os.path.join(CacheConst.CACHE_DIR, filename)
+
+
+def load_json(path: str) -> dict:
+    # A missing or broken cache is the same as an empty one
+    try:
+        with open(path, 'r') as fin:
+            return json.load(fin)
+    except (OSError, ValueError):
+        return dict()
+
+
+def save_json(path: str, data: dict) -> None:
+    # Write to a temporary file first so that an interrupted run never leaves a broken cache
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as fout:
+        json.dump(data, fout, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+class BuildManifest:
+    # Records the input hashes each output file was built from, and the hash of the output itself
+    def __init__(self):
+        self.path = cache_path(CacheConst.MANIFEST_FILE)
+        self.artifacts = load_json(self.path)
+        self.modified = False
+
+    def changed_inputs(self, artifact: str, inputs: dict):
+        # Names of the inputs that changed since the artifact was built,
+        # or None if the artifact is unknown, missing or modified by hand
+        entry = self.artifacts.get(artifact)
+        if entry is None or entry['output'] != file_digest(artifact):
+            return None
+        return set(key for key in set(inputs) | set(entry['inputs']) if inputs.get(key) != entry['inputs'].get(key))
+
+    def is_stale(self, artifact: str, inputs: dict) -> bool:
+        return self.changed_inputs(artifact, inputs) != set()
+
+    def artifacts_under(self, directory: str) -> list:
+        return sorted(artifact for artifact in self.artifacts if os.path.dirname(artifact) == directory)
+
+    def prune(self, directory: str, artifacts) -> list:
+        # Forget the artifacts under the directory which are not in artifacts, e.g. after a format change,
+        # so that they are not taken as stale forever
+        removed = [artifact for artifact in self.artifacts_under(directory) if artifact not in artifacts]
+        for artifact in removed:
+            del self.artifacts[artifact]
+        self.modified = self.modified or len(removed) > 0
+        return removed
+
+    def record(self, artifact: str, inputs: dict) -> None:
+        self.artifacts[artifact] = {'inputs': inputs, 'output': file_digest(artifact)}
+        self.modified = True
+
+    def save(self) -> None:
+        if self.modified:
+            save_json(self.path, self.artifacts)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+# This file measures the stages of ggc_dae_to_urdf.py, e.g. simplify_collada, retrive_node and write_urdf_file.
+# Each stage records its wall time, the peak memory traced by tracemalloc and counters such as nodes or bytes written.
+# The report is a JSON file which chrome://tracing and https://ui.perfetto.dev also open as a trace.
+
+from __future__ import annotations
+
+import contextlib
+import json
+import resource
+import time
+import tracemalloc
+
+
+class ProfileConst:
+    TRACE_PID       = 1
+    TRACE_TID       = 1
+    MEGABYTE        = 1e6
+    KILOBYTE        = 1e3       # Unit of ru_maxrss on Linux
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / ProfileConst.KILOBYTE
+
+
+class Stage:
+    def __init__(self, name: str, depth: int, start: float):
+        self.name = name
+        self.depth = depth              # Number of enclosing stages
+        self.start = start              # Seconds from the creation of the profiler
+        self.seconds = 0.0
+        self.peak = 0                   # Bytes traced by tracemalloc, 0 without trace_memory
+        self.start_peak = None          # Peak before the stage, only without tracemalloc.reset_peak
+        self.counters = dict()
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'depth': self.depth, 'start': self.start, 'seconds': self.seconds,
+                'peak_mb': self.peak / ProfileConst.MEGABYTE, 'counters': self.counters}
+
+
+class BuildProfiler:
+    def __init__(self, enabled: bool = True, trace_memory: bool = True):
+        # A disabled profiler only runs the stages, so the calls can stay in the pipeline
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages: list[Stage] = []
+        self.active: list[Stage] = []
+        self.origin = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        record = Stage(name, len(self.active), time.perf_counter() - self.origin)
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if hasattr(tracemalloc, 'reset_peak'):
+                # the enclosing stages keep the peak so far, as the peak is reset for this stage
+                for outer in self.active:
+                    outer.peak = max(outer.peak, peak)
+                tracemalloc.reset_peak()
+            else:
+                # Python 3.8 has no reset_peak, then a stage which does not raise the peak so far
+                # only gets the memory traced at its start and its end
+                record.peak = current
+                record.start_peak = peak
+        self.stages.append(record)
+        self.active.append(record)
+        try:
+            yield
+        finally:
+            self.active.pop()
+            record.seconds = time.perf_counter() - self.origin - record.start
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                if record.start_peak is not None and peak <= record.start_peak:
+                    peak = current
+                record.peak = max(record.peak, peak)
+                for outer in self.active:
+                    outer.peak = max(outer.peak, record.peak)
+
+    def count(self, counter: str, value: int = 1) -> None:
+        # Add to a counter of the innermost stage
+        if self.enabled and self.active:
+            counters = self.active[-1].counters
+            counters[counter] = counters.get(counter, 0) + value
+
+    def report(self) -> dict:
+        # Stages and trace events in one object, the Chrome trace viewer ignores the other keys
+        events = []
+        for stage in self.stages:
+            events.append({'name': stage.name, 'ph': 'X', 'pid': ProfileConst.TRACE_PID, 'tid': ProfileConst.TRACE_TID,
+                           'ts': stage.start * 1e6, 'dur': stage.seconds * 1e6,
+                           'args': dict(stage.counters, peak_mb=stage.peak / ProfileConst.MEGABYTE)})
+        return {'stages': [stage.to_dict() for stage in self.stages],
+                'max_rss_mb': max_rss_mb(),
+                'traceEvents': events,
+                'displayTimeUnit': 'ms'}
+
+    def write(self, path: str) -> None:
+        with open(path, 'w') as fout:
+            json.dump(self.report(), fout, indent=1)
+            fout.write('\n')
+
+    def summary(self) -> list[str]:
+        # One line per stage, indented by depth, and the max RSS which includes the memory of lxml not traced by tracemalloc
+        lines = ['{:<24} {:>10} {:>10}  {}'.format('stage', 'time [s]', 'peak [MB]', 'counters')]
+        for stage in self.stages:
+            counters = ', '.join('{} {}'.format(name, value) for name, value in stage.counters.items())
+            lines.append('{:<24} {:>10.3f} {:>10.1f}  {}'.format('  ' * stage.depth + stage.name, stage.seconds, stage.peak / ProfileConst.MEGABYTE, counters))
+        lines.append('max RSS of the process is {:.1f} MB'.format(max_rss_mb()))
+        return lines
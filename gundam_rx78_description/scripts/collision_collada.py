@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# This file generates low-poly convex collision shapes for the links written by ggc_dae_to_urdf.py
+# so that the physics engine does not check contacts against the dense visual meshes.
+# The shapes are written under meshes/collision/ and only regenerated when the geometry changes.
+
+import logging
+import os
+
+import numpy
+import scipy.sparse
+import scipy.sparse.csgraph
+import trimesh  # Use "pip install --user trimesh".
+from build_cache import cache_path, geometry_digest, load_json, save_json
+
+logger = logging.getLogger('ggc_dae_to_urdf')
+
+
+class CollisionConst:
+    MODES           = ('mesh', 'convex_hull', 'decomposition', 'primitive')
+    MESH_DIR        = 'meshes/collision'
+    MESH_EXT        = '.stl'
+    INDEX_FILE      = 'collision.json'
+    MAX_HULLS       = 16        # Fall back to a coarser decomposition when a geometry splits into more pieces
+    MIN_HULL_VOLUME = 1e-9      # Ignore flat or tiny pieces, which cannot be cooked into convex shapes
+
+
+def primitive_parts(primitive) -> list:
+    # Split the vertices used by the primitive into connected parts, as the model is built from separate shells
+    edges = primitive.vertex_index[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    nvertices = len(primitive.vertex)
+    graph = scipy.sparse.coo_matrix((numpy.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(nvertices, nvertices))
+    nparts, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+    used = numpy.unique(primitive.vertex_index)
+    order = numpy.argsort(labels[used], kind='stable')
+    used = used[order]
+    splits = numpy.flatnonzero(numpy.diff(labels[used])) + 1
+    return [primitive.vertex[indices].astype('float64') for indices in numpy.split(used, splits)]
+
+
+def convex_hull(vertices: numpy.ndarray):
+    # Qhull fails on coplanar or too few points
+    if len(vertices) < 4:
+        return None
+    try:
+        hull = trimesh.convex.convex_hull(vertices)
+    except Exception:
+        return None
+    if abs(hull.volume) < CollisionConst.MIN_HULL_VOLUME:
+        return None
+    return hull
+
+
+def convex_pieces(geometry, mode: str) -> list:
+    primitives = [p for p in geometry.primitives if p.vertex is not None and len(p.vertex_index) > 0]
+    if len(primitives) == 0:
+        return []
+
+    if mode == 'decomposition':
+        # One hull per connected part
+        hulls = [convex_hull(part) for p in primitives for part in primitive_parts(p)]
+        hulls = [hull for hull in hulls if hull is not None]
+        if 0 < len(hulls) <= CollisionConst.MAX_HULLS:
+            return hulls
+        # Too many parts, use one hull per primitive as in get_volume()
+        hulls = [convex_hull(p.vertex[numpy.unique(p.vertex_index)].astype('float64')) for p in primitives]
+        hulls = [hull for hull in hulls if hull is not None]
+        if 0 < len(hulls) <= CollisionConst.MAX_HULLS:
+            return hulls
+
+    hull = convex_hull(numpy.concatenate([p.vertex[numpy.unique(p.vertex_index)].astype('float64') for p in primitives]))
+    return [] if hull is None else [hull]
+
+
+class CollisionCache:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.index_path = cache_path(CollisionConst.INDEX_FILE)
+        self.index = load_json(self.index_path)
+        self.modified = False
+
+    def get_files(self, geometry) -> list:
+        # Return the collision mesh files of the geometry, generating them if the cache is stale
+        digest = geometry_digest(geometry, self.mode, CollisionConst.MAX_HULLS)
+        entry = self.index.get(geometry.id)
+        if entry is not None and entry['digest'] == digest and all(os.path.exists(f) for f in entry['files']):
+            return entry['files']
+
+        os.makedirs(CollisionConst.MESH_DIR, exist_ok=True)
+        files = []
+        for i, hull in enumerate(convex_pieces(geometry, self.mode)):
+            filename = os.path.join(CollisionConst.MESH_DIR, '{}_{}{}'.format(geometry.id, i, CollisionConst.MESH_EXT))
+            hull.export(filename)
+            files.append(filename)
+        # a geometry with fewer pieces than before leaves the files of the dropped indices behind
+        if entry is not None:
+            for filename in entry['files'][len(files):]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+        logger.info('writing %d collision meshes for %s', len(files), geometry.id)
+        self.index[geometry.id] = {'digest': digest, 'files': files}
+        self.modified = True
+        return files
+
+    def save(self) -> None:
+        if self.modified:
+            save_json(self.index_path, self.index)
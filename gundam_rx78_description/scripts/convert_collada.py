@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+# This file writes a geometry of ggc_dae_to_urdf.py as a binary or plain mesh file instead of COLLADA
+# so that simulators load the meshes without parsing XML
+# The diffuse color of each material is kept as a glTF material (glb) or as vertex colors (ply, obj)
+
+import numpy
+import trimesh  # Use "pip install --user trimesh".
+
+
+class ConvertConst:
+    FORMATS         = ('dae', 'glb', 'ply', 'obj')
+    DEFAULT_COLOR   = (0.8, 0.8, 0.8, 1.0)      # Used for textured or missing materials
+
+
+def diffuse_color(node_materials: list, symbol: str) -> numpy.ndarray:
+    # RGBA of the material bound to the symbol, in 0-255
+    for m in node_materials:
+        if m.symbol == symbol:
+            diffuse = m.target.effect.diffuse
+            if isinstance(diffuse, tuple):
+                color = list(diffuse) + [1.0] * (4 - len(diffuse))
+                return numpy.round(numpy.clip(color, 0.0, 1.0) * 255).astype(numpy.uint8)
+    return numpy.round(numpy.array(ConvertConst.DEFAULT_COLOR) * 255).astype(numpy.uint8)
+
+
+def primitive_meshes(g, node_materials: list) -> list:
+    # One mesh per primitive with only the vertices it uses, and its color
+    meshes = []
+    for p in g.primitives:
+        if p.vertex is None or len(p.vertex_index) == 0:
+            continue
+        used, faces = numpy.unique(p.vertex_index, return_inverse=True)
+        meshes.append((numpy.asarray(p.vertex, dtype=numpy.float64)[used], faces.reshape(-1, 3), diffuse_color(node_materials, p.material)))
+    return meshes
+
+
+def export_geometry(g, node_materials: list, filename: str, file_format: str) -> None:
+    meshes = primitive_meshes(g, node_materials)
+    if file_format == 'glb':
+        # glTF keeps one material per primitive
+        scene = trimesh.Scene()
+        for i, (vertices, faces, color) in enumerate(meshes):
+            mesh = trimesh.Trimesh(vertices, faces, process=False)
+            mesh.visual = trimesh.visual.TextureVisuals(material=trimesh.visual.material.PBRMaterial(
+                name='{}-material{}'.format(g.id, i), baseColorFactor=color, metallicFactor=0.0, roughnessFactor=1.0))
+            scene.add_geometry(mesh, node_name='{}-{}'.format(g.id, i), geom_name='{}-{}'.format(g.id, i))
+        scene.export(filename, file_type='glb')
+    else:
+        # The primitives do not share vertices, so the vertex colors are exact
+        offsets = numpy.cumsum([0] + [len(vertices) for vertices, faces, color in meshes])
+        mesh = trimesh.Trimesh(numpy.concatenate([vertices for vertices, faces, color in meshes]) if meshes else numpy.zeros((0, 3)),
+                               numpy.concatenate([faces + offset for (vertices, faces, color), offset in zip(meshes, offsets)]) if meshes else numpy.zeros((0, 3), dtype=int),
+                               vertex_colors=numpy.concatenate([numpy.tile(color, (len(vertices), 1)) for vertices, faces, color in meshes]) if meshes else None,
+                               process=False)
+        mesh.export(filename, file_type=file_format)
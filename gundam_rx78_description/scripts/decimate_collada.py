@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# This file writes lighter versions of the meshes, meshes/lod1/, meshes/lod2/ ..., for ggc_dae_to_urdf.py
+# Each level keeps a ratio of the triangles of every link, optionally capped by a triangle budget per link
+# Quadric edge collapse is used when trimesh has a backend for it ("pip install --user fast-simplification"),
+# otherwise vertices are clustered on a grid whose cell size is searched to meet the budget
+
+import numpy
+import trimesh  # Use "pip install --user trimesh".
+from collada import geometry, source
+
+
+class DecimateConst:
+    LOD_DIR         = 'meshes/lod{}'
+    LOD_RATIOS      = (0.25, 0.05)      # Ratio of triangles kept at lod1, lod2, ...
+    MIN_TRIANGLES   = 12                # Keep at least as many triangles as a box per primitive
+    SEARCH_STEPS    = 20                # Bisection steps of the cluster cell size
+
+
+def lod_dir(level: int) -> str:
+    return DecimateConst.LOD_DIR.format(level)
+
+
+def geometry_triangles(g) -> int:
+    return sum(len(p.vertex_index) for p in g.primitives if p.vertex is not None)
+
+
+def triangle_budgets(link_geometries: dict, ratio: float, link_budgets: dict) -> dict:
+    # Triangle budget of each geometry id, the budget of a link is shared by its geometries by their triangles
+    budgets = dict()
+    for link_name, geometries in link_geometries.items():
+        counts = [geometry_triangles(g) for g in geometries]
+        total = sum(counts)
+        if total == 0:
+            continue
+        link_budget = ratio * total
+        if link_budgets.get(link_name) is not None:
+            link_budget = min(link_budget, link_budgets[link_name])
+        for g, count in zip(geometries, counts):
+            budgets[g.id] = min(count, max(DecimateConst.MIN_TRIANGLES, int(round(link_budget * count / total))))
+    return budgets
+
+
+def compact(vertices: numpy.ndarray, faces: numpy.ndarray) -> tuple:
+    # Drop degenerate and duplicated faces, and the vertices no face refers to
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    if len(faces) == 0:
+        return vertices[:0], faces
+    _, first = numpy.unique(numpy.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[numpy.sort(first)]
+    used, faces = numpy.unique(faces, return_inverse=True)
+    return vertices[used], faces.reshape(-1, 3)
+
+
+def cluster_vertices(vertices: numpy.ndarray, faces: numpy.ndarray, cell: float) -> tuple:
+    # Merge the vertices in each grid cell into their mean
+    keys = numpy.floor((vertices - vertices.min(axis=0)) / cell).astype(numpy.int64)
+    _, inverse, counts = numpy.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    merged = numpy.zeros((len(counts), 3))
+    numpy.add.at(merged, inverse, vertices)
+    return compact(merged / counts[:, None], inverse[faces])
+
+
+def cluster_decimation(vertices: numpy.ndarray, faces: numpy.ndarray, target: int) -> tuple:
+    # The largest result within the target over the bisected cell sizes, as long as it keeps MIN_TRIANGLES,
+    # otherwise the smallest result which does, even above the target, so that no primitive collapses
+    lower, upper = 0.0, float(numpy.ptp(vertices, axis=0).max())
+    if upper == 0:
+        return compact(vertices, faces)
+    best = None
+    smallest = None
+    for _ in range(DecimateConst.SEARCH_STEPS):
+        cell = (lower + upper) / 2
+        result = cluster_vertices(vertices, faces, cell)
+        count = len(result[1])
+        if count > target:
+            lower = cell
+        else:
+            upper = cell
+            if count >= DecimateConst.MIN_TRIANGLES and (best is None or count > len(best[1])):
+                best = result
+        if count >= DecimateConst.MIN_TRIANGLES and (smallest is None or count < len(smallest[1])):
+            smallest = result
+    if best is not None:
+        return best
+    return smallest if smallest is not None else compact(vertices, faces)
+
+
+def quadric_decimation(vertices: numpy.ndarray, faces: numpy.ndarray, target: int):
+    # None if trimesh has no backend for quadric decimation
+    try:
+        mesh = trimesh.Trimesh(vertices, faces, process=False).simplify_quadric_decimation(face_count=target)
+    except (ImportError, ModuleNotFoundError):
+        return None
+    return compact(numpy.asarray(mesh.vertices, dtype=numpy.float64), numpy.asarray(mesh.faces))
+
+
+def decimate_mesh(vertices: numpy.ndarray, faces: numpy.ndarray, target: int) -> tuple:
+    vertices, faces = compact(vertices, faces)
+    if len(faces) <= target:
+        return vertices, faces
+    result = quadric_decimation(vertices, faces, target)
+    if result is None or len(result[1]) == 0:
+        result = cluster_decimation(vertices, faces, target)
+    return result
+
+
+def vertex_normals(vertices: numpy.ndarray, faces: numpy.ndarray) -> numpy.ndarray:
+    # Area weighted mean of the normals of the faces around each vertex
+    triangles = vertices[faces]
+    face_normals = numpy.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    normals = numpy.zeros_like(vertices)
+    for i in range(3):
+        numpy.add.at(normals, faces[:, i], face_normals)
+    length = numpy.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / numpy.where(length > 0, length, 1.0)
+
+
+def decimate_geometry(collada, g, budget: int):
+    # New geometry with the same id and materials as g, within budget triangles
+    primitives = [p for p in g.primitives if p.vertex is not None and len(p.vertex_index) > 0]
+    counts = [len(p.vertex_index) for p in primitives]
+    total = max(sum(counts), 1)
+    meshes = []
+    for p, count in zip(primitives, counts):
+        target = min(count, max(DecimateConst.MIN_TRIANGLES, int(round(budget * count / total))))
+        vertices, faces = decimate_mesh(numpy.asarray(p.vertex, dtype=numpy.float64), numpy.asarray(p.vertex_index), target)
+        if len(faces) > 0:
+            meshes.append((p.material, vertices, faces))
+
+    # One position and one normal source shared by all primitives, as in the original meshes
+    offsets = numpy.cumsum([0] + [len(mesh_vertices) for material, mesh_vertices, faces in meshes])
+    vertices = numpy.concatenate([mesh_vertices for material, mesh_vertices, faces in meshes]) if meshes else numpy.zeros((0, 3))
+    normals = numpy.concatenate([vertex_normals(mesh_vertices, faces) for material, mesh_vertices, faces in meshes]) if meshes else numpy.zeros((0, 3))
+    position_id = g.id + '-POSITION'
+    normal_id = g.id + '-Normal0'
+    decimated = geometry.Geometry(collada, g.id, g.name,
+                                  [source.FloatSource(position_id, vertices.astype(numpy.float32).reshape(-1), ('X', 'Y', 'Z')),
+                                   source.FloatSource(normal_id, normals.astype(numpy.float32).reshape(-1), ('X', 'Y', 'Z'))])
+    inputs = source.InputList()
+    inputs.addInput(0, 'VERTEX', '#' + position_id)
+    inputs.addInput(1, 'NORMAL', '#' + normal_id)
+    for (material, mesh_vertices, faces), offset in zip(meshes, offsets):
+        indices = numpy.repeat((faces + offset).reshape(-1), 2)
+        decimated.primitives.append(decimated.createTriangleSet(indices, inputs, material))
+    return decimated
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+# This file computes the link poses of a URDF for a batch of joint angles at once
+# e.g. to check the CSV gaits under gundam_rx78_control/sample/csv/ or to precompute reset poses for RL
+# The fixed joints are collapsed into constant transforms, so only the moving joints are evaluated
+# Run ./(script_name).py --benchmark inside gundam_rx78_description/scripts/ to measure the throughput
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+import numpy
+from kinematic_tree import JointInfo, KinematicTree
+
+
+class FkConst:
+    URDF_PATH       = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'urdf', 'GGC_TestModel_rx78_20170112.urdf')
+    JOINT_SUFFIX    = '_joint'          # Added by rename_resize_joint_link.py
+    MOVING_TYPES    = ('revolute', 'continuous', 'prismatic')
+    BENCHMARK_BATCH = 10000
+    BENCHMARK_REPEAT = 10
+
+
+def rpy_matrix(xyz, rpy) -> numpy.ndarray:
+    # Homogeneous transform of a URDF origin, rotation is Rz(yaw) Ry(pitch) Rx(roll)
+    roll, pitch, yaw = rpy
+    sr, cr = numpy.sin(roll), numpy.cos(roll)
+    sp, cp = numpy.sin(pitch), numpy.cos(pitch)
+    sy, cy = numpy.sin(yaw), numpy.cos(yaw)
+    matrix = numpy.identity(4)
+    matrix[:3, :3] = [[cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+                      [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+                      [-sp, cp * sr, cp * cr]]
+    matrix[:3, 3] = xyz
+    return matrix
+
+
+def axis_motion(axes: numpy.ndarray, values: numpy.ndarray, prismatic: numpy.ndarray) -> numpy.ndarray:
+    # Transforms (N, M, 4, 4) of M joints moved by values (N, M) about or along their unit axes (M, 3)
+    n, m = values.shape
+    motion = numpy.zeros((n, m, 4, 4))
+    motion[..., 3, 3] = 1.0
+    angles = numpy.where(prismatic, 0.0, values)
+    s = numpy.sin(angles)[..., None, None]
+    c = numpy.cos(angles)[..., None, None]
+    # Rodrigues' formula: R = c I + s [k]x + (1 - c) k k^T
+    cross = numpy.zeros((m, 3, 3))
+    cross[:, 0, 1], cross[:, 0, 2], cross[:, 1, 2] = -axes[:, 2], axes[:, 1], -axes[:, 0]
+    cross -= cross.transpose(0, 2, 1)
+    outer = numpy.einsum('mi,mj->mij', axes, axes)
+    motion[..., :3, :3] = c * numpy.identity(3) + s * cross + (1 - c) * outer
+    motion[..., :3, 3] = numpy.where(prismatic[:, None], values[..., None] * axes, 0.0)
+    return motion
+
+
+class ForwardKinematics:
+    def __init__(self, tree: KinematicTree, joint_names: list[str] | None = None):
+        # joint_names are the columns of the joint vectors, the actuated joints of the URDF by default
+        # The other actuated joints are kept at 0, and the mimic joints follow their reference joints
+        self.tree = tree
+        infos = tree.joint_payloads
+        if joint_names is None:
+            joint_names = [info.name for info in infos if info.joint_type in FkConst.MOVING_TYPES and info.mimic is None]
+        self.joint_names = list(joint_names)
+        columns = {self.find_joint(name): column for column, name in enumerate(self.joint_names)}
+
+        # A body is the root link or the child link of a moving joint, each link is fixed to one body
+        moving = [joint for joint in tree.joint_order() if infos[joint].joint_type in FkConst.MOVING_TYPES]
+        moving_set = set(moving)
+        self.link_body = numpy.zeros(len(tree.link_names), dtype=int)
+        link_offset = numpy.zeros((len(tree.link_names), 4, 4))
+        body_count = 0
+        for link in tree.topological_order():
+            joint = tree.link_parent_joint[link]
+            if joint == KinematicTree.NO_INDEX or joint in moving_set:
+                self.link_body[link] = body_count
+                link_offset[link] = numpy.identity(4)
+                body_count += 1
+            else:
+                parent = tree.joint_parent_link[joint]
+                self.link_body[link] = self.link_body[parent]
+                link_offset[link] = link_offset[parent] @ rpy_matrix(infos[joint].origin_xyz, infos[joint].origin_rpy)
+        self.link_offset = link_offset
+        self.body_count = body_count
+        self.root_bodies = numpy.array([self.link_body[tree.link_index[name]] for name in tree.roots()], dtype=int)
+
+        # Constant part of each moving joint, from its parent body to the joint frame
+        self.joint_parent_body = numpy.array([self.link_body[tree.joint_parent_link[joint]] for joint in moving], dtype=int)
+        self.joint_child_body = numpy.array([self.link_body[tree.joint_child_link[joint]] for joint in moving], dtype=int)
+        self.joint_offset = numpy.array([link_offset[tree.joint_parent_link[joint]] @ rpy_matrix(infos[joint].origin_xyz, infos[joint].origin_rpy)
+                                         for joint in moving]).reshape(-1, 4, 4)
+        axes = numpy.array([infos[joint].axis for joint in moving], dtype=float).reshape(-1, 3)
+        self.joint_axis = axes / numpy.linalg.norm(axes, axis=1, keepdims=True)
+        self.joint_prismatic = numpy.array([infos[joint].joint_type == 'prismatic' for joint in moving], dtype=bool)
+
+        # Value of each moving joint = joint vector column * multiplier + offset, the column is -1 for a joint kept at 0
+        self.joint_column = numpy.zeros(len(moving), dtype=int)
+        self.joint_multiplier = numpy.zeros(len(moving))
+        self.joint_value_offset = numpy.zeros(len(moving))
+        for i, joint in enumerate(moving):
+            source, multiplier, offset = self.resolve_mimic(joint)
+            self.joint_column[i] = columns.get(source, -1)
+            self.joint_multiplier[i] = multiplier if source in columns else 0.0
+            self.joint_value_offset[i] = offset
+
+        # Joints grouped by depth, so that each group is evaluated with one batched product
+        depth = numpy.zeros(body_count, dtype=int)
+        for i in range(len(moving)):
+            depth[self.joint_child_body[i]] = depth[self.joint_parent_body[i]] + 1
+        self.levels = [numpy.flatnonzero(depth[self.joint_child_body] == level) for level in range(1, depth.max(initial=0) + 1)]
+
+    @classmethod
+    def from_urdf(cls, urdf_path: str = FkConst.URDF_PATH, joint_names: list[str] | None = None) -> 'ForwardKinematics':
+        return cls(KinematicTree.from_urdf(urdf_path), joint_names)
+
+    def find_joint(self, name: str) -> int:
+        # Accept joint names with or without the suffix added by rename_resize_joint_link.py
+        joint_index = self.tree.joint_index
+        for candidate in (name, name + FkConst.JOINT_SUFFIX, name[:-len(FkConst.JOINT_SUFFIX)] if name.endswith(FkConst.JOINT_SUFFIX) else name):
+            if candidate in joint_index:
+                return joint_index[candidate]
+        raise KeyError('joint {} is not in the URDF'.format(name))
+
+    def resolve_mimic(self, joint: int) -> tuple[int, float, float]:
+        # Follow mimic joints to the joint which drives them, composing the multipliers and offsets
+        multiplier, offset = 1.0, 0.0
+        visited: set[int] = set()
+        info: JointInfo = self.tree.joint_payloads[joint]
+        while info.mimic is not None:
+            if joint in visited:
+                raise ValueError('mimic joint {} refers to itself'.format(info.name))
+            visited.add(joint)
+            reference, mimic_multiplier, mimic_offset = info.mimic
+            multiplier, offset = multiplier * mimic_multiplier, offset + multiplier * mimic_offset
+            joint = self.find_joint(reference)
+            info = self.tree.joint_payloads[joint]
+        return joint, multiplier, offset
+
+    def joint_values(self, positions: numpy.ndarray) -> numpy.ndarray:
+        # Values (N, M) of all moving joints from the joint vectors (N, len(joint_names))
+        padded = numpy.concatenate([positions, numpy.zeros((len(positions), 1))], axis=1)
+        return padded[:, self.joint_column] * self.joint_multiplier + self.joint_value_offset
+
+    def body_poses(self, positions: numpy.ndarray, base: numpy.ndarray | None = None) -> numpy.ndarray:
+        positions = numpy.asarray(positions, dtype=float).reshape(-1, len(self.joint_names))
+        n = len(positions)
+        local = numpy.matmul(self.joint_offset, axis_motion(self.joint_axis, self.joint_values(positions), self.joint_prismatic))
+        poses = numpy.empty((n, self.body_count, 4, 4))
+        poses[:, self.root_bodies] = (numpy.identity(4) if base is None else numpy.asarray(base).reshape(-1, 1, 4, 4))
+        for level in self.levels:
+            poses[:, self.joint_child_body[level]] = numpy.matmul(poses[:, self.joint_parent_body[level]], local[:, level])
+        return poses
+
+    def link_poses(self, positions: numpy.ndarray, base: numpy.ndarray | None = None) -> numpy.ndarray:
+        # Poses (N, L, 4, 4) of all links in the order of tree.link_names, relative to the root link or base (N, 4, 4)
+        return numpy.matmul(self.body_poses(positions, base)[:, self.link_body], self.link_offset)
+
+    def link_pose(self, positions: numpy.ndarray, link_names: list[str], base: numpy.ndarray | None = None) -> numpy.ndarray:
+        # Poses (N, len(link_names), 4, 4) of the given links only
+        links = numpy.array([self.tree.link_index[name] for name in link_names], dtype=int)
+        return numpy.matmul(self.body_poses(positions, base)[:, self.link_body[links]], self.link_offset[links])
+
+
+def benchmark(fk: ForwardKinematics, batch: int, repeat: int) -> float:
+    # Configurations per second, with random joint vectors in [-pi, pi]
+    positions = numpy.random.default_rng(0).uniform(-numpy.pi, numpy.pi, (batch, len(fk.joint_names)))
+    fk.link_poses(positions[:1])
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fk.link_poses(positions)
+    return batch * repeat / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Batched forward kinematics of a URDF')
+    parser.add_argument('urdf', nargs='?', default=FkConst.URDF_PATH, help='URDF file name')
+    parser.add_argument('--benchmark', action='store_true', help='measure the throughput in configurations per second')
+    parser.add_argument('--batch', type=int, default=FkConst.BENCHMARK_BATCH, help='joint vectors per call')
+    parser.add_argument('--repeat', type=int, default=FkConst.BENCHMARK_REPEAT, help='calls to measure')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fk = ForwardKinematics.from_urdf(args.urdf)
+    print('loaded {} links, {} moving joints and {} actuated joints in {:.3f} s'.format(
+        len(fk.tree.link_names), len(fk.joint_column), len(fk.joint_names), time.perf_counter() - start))
+    print('collapsed fixed joints into {} bodies in {} levels'.format(fk.body_count, len(fk.levels)))
+    if args.benchmark:
+        print('{:.0f} configurations per second with batch {}'.format(benchmark(fk, args.batch, args.repeat), args.batch))
+
+
+if __name__ == '__main__':
+    main()
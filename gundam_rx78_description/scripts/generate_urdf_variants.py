@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# This file generates a family of URDF variants for domain randomization,
+# e.g. different scales, mimic margins and mimic joints fixed or not,
+# from one parsed URDF with the same rewriting as rename_resize_joint_link.py
+# Run ./(script_name).py --help inside gundam_rx78_description/scripts/ for the options
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+
+import yaml
+from rename_resize_joint_link import UrdfConst, UrdfModel, load_urdf, write_urdf
+
+
+class VariantConst:
+    PACKAGE_DIR     = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    SOURCE_URDF     = os.path.join(PACKAGE_DIR, 'urdf', 'GGC_TestModel_rx78_20170112.urdf')
+    OUTPUT_DIR      = os.path.join(PACKAGE_DIR, 'urdf', 'variants')
+    INDEX_FILE      = 'variants.json'
+
+    # Parameters of write_urdf() and their defaults
+    PARAMS          = {'resize_scale':          UrdfConst.RESIZE_SCALE,
+                       'use_importer_scaling':  UrdfConst.USE_URDF_IMPORTER_SCALING,
+                       'mimic_margin':          UrdfConst.MIMIC_MARGIN,
+                       'fix_mimic_joints':      UrdfConst.FIX_MIMIC_JOINTS}
+
+
+model_ = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate URDF variants from a grid of rename_resize_joint_link.py parameters')
+    parser.add_argument('--source', default=VariantConst.SOURCE_URDF, help='original URDF written by ggc_dae_to_urdf.py')
+    parser.add_argument('--output_dir', default=VariantConst.OUTPUT_DIR, help='directory of the variants and the index file')
+    parser.add_argument('--grid', help='YAML file mapping each parameter to a value or a list of values')
+    parser.add_argument('--resize_scale', type=float, nargs='+')
+    parser.add_argument('--use_importer_scaling', type=parse_bool, nargs='+')
+    parser.add_argument('--mimic_margin', type=float, nargs='+')
+    parser.add_argument('--fix_mimic_joints', type=parse_bool, nargs='+')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of processes to write variants')
+    args = parser.parse_args()
+
+    grid = dict[str, list]()
+    if args.grid is not None:
+        grid.update(load_grid(args.grid))
+    for key in VariantConst.PARAMS:
+        if getattr(args, key) is not None:
+            grid[key] = getattr(args, key)
+
+    variants = get_variants(grid, os.path.splitext(os.path.basename(args.source))[0])
+    generate_variants(load_urdf(args.source), variants, args.output_dir, args.jobs)
+    write_index(os.path.join(args.output_dir, VariantConst.INDEX_FILE), args.source, variants)
+    print('wrote {} variants to {}'.format(len(variants), args.output_dir))
+
+
+def parse_bool(value: str) -> bool:
+    if value.lower() in ('true', '1', 'yes'):
+        return True
+    if value.lower() in ('false', '0', 'no'):
+        return False
+    raise argparse.ArgumentTypeError('expected true or false, got {}'.format(value))
+
+
+def load_grid(grid_path: str) -> dict[str, list]:
+    with open(grid_path, 'r') as fin:
+        grid = yaml.safe_load(fin) or dict()
+    unknown = set(grid) - set(VariantConst.PARAMS)
+    if unknown:
+        raise ValueError('unknown parameters in {}: {}'.format(grid_path, ', '.join(sorted(unknown))))
+    return {key: values if isinstance(values, list) else [values] for key, values in grid.items()}
+
+
+def get_variants(grid: dict[str, list], base_name: str) -> list[dict]:
+    # Cartesian product of the grid, with the parameters not in the grid at their defaults
+    keys = list(VariantConst.PARAMS)
+    values = [grid.get(key, [VariantConst.PARAMS[key]]) for key in keys]
+    variants = dict[str, dict]()
+    for combination in itertools.product(*values):
+        params = dict(zip(keys, combination))
+        name = get_variant_name(base_name, params)
+        # Repeated grid values give the same file, which the workers must not write at the same time
+        if name in variants:
+            if variants[name]['params'] != params:
+                raise ValueError('variants {} and {} would both be written to {}'.format(variants[name]['params'], params, name))
+            continue
+        variants[name] = {'name': name, 'params': params}
+    return list(variants.values())
+
+
+def get_variant_name(base_name: str, params: dict) -> str:
+    # Ends with '_' like the output of rename_resize_joint_link.py, so that it does not rename and resize the variants again
+    return '{}_s{}_m{}_{}_{}_'.format(base_name,
+                                      params['resize_scale'],
+                                      params['mimic_margin'],
+                                      'importer' if params['use_importer_scaling'] else 'mesh',
+                                      'fixed' if params['fix_mimic_joints'] else 'mimic')
+
+
+def generate_variants(model: UrdfModel, variants: list[dict], output_dir: str, jobs: int) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(os.path.join(output_dir, variant['name'] + UrdfConst.URDF_EXT), variant['params']) for variant in variants]
+    if jobs > 1 and len(tasks) > 1:
+        # The model is sent once to each worker instead of with every task
+        with multiprocessing.Pool(min(jobs, len(tasks)), initializer=init_worker, initargs=(model,)) as pool:
+            for write_path in pool.imap_unordered(write_variant, tasks):
+                print('writing urdf file to {}'.format(write_path))
+    else:
+        init_worker(model)
+        for task in tasks:
+            print('writing urdf file to {}'.format(write_variant(task)))
+
+
+def init_worker(model: UrdfModel) -> None:
+    global model_
+    model_ = model
+
+
+def write_variant(task: tuple[str, dict]) -> str:
+    write_path, params = task
+    with open(write_path, 'w+') as fout:
+        write_urdf(model_, fout, **params)
+    return write_path
+
+
+def write_index(index_path: str, source_path: str, variants: list[dict]) -> None:
+    index = {'source': os.path.relpath(source_path, os.path.dirname(index_path)),
+             'variants': [dict(variant, file=variant['name'] + UrdfConst.URDF_EXT) for variant in variants]}
+    with open(index_path, 'w+') as fout:
+        json.dump(index, fout, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -36,17 +36,34 @@ import sys
 import math
 import numpy
 import argparse
+import datetime
+import logging
+import multiprocessing
 import trimesh  # Use "pip install --user trimesh".
+import yaml
 from simplify_collada import simplify_collada
-from mergenode_collada import mergenode_collada
+from mergenode_collada import mergenode_collada, addition_null_joints
 from scale_collada import scale_collada
+from collision_collada import CollisionCache, CollisionConst
+from convert_collada import ConvertConst, export_geometry
+from decimate_collada import DecimateConst, decimate_geometry, geometry_triangles, lod_dir, triangle_budgets
+from weld_collada import WeldConst, weld_geometry
+from inertia_collada import InertiaCache
+from kinematic_tree import KinematicTree
+from merge_fixed_links import degrees_of_freedom, merge_fixed_links
+from build_cache import BuildManifest, data_digest, file_digest
+from build_profiler import BuildProfiler
 from scipy.spatial.transform import Rotation  # Do not use "apt install python-scipy". Use "pip install --user scipy==1.2.2".
 # xmlutil.COLLADA_NS = 'http://www.collada.org/2008/03/COLLADASchema'
 
 depth_ = 0
+logger = logging.getLogger('ggc_dae_to_urdf')
 scale_ = 0.1  # original file uses cm unit
 density = 1.22e2
 all_weight_ = 0.0
+virtual_mass_ = 1.0  # mass [kg] and size [m] of the inertia of virtual addition_null links
+virtual_size_ = 0.1
+control_file_ = '../gundam_rx78_control/config/gundam_rx78_control.yaml'
 root_offset = numpy.array([[0, 0, 1, 0], [1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=numpy.float32)  # original file is Y_UP
 
 zero_pid = {'p': 0.0, 'i': 0.0, 'd': 0.0}
@@ -68,6 +85,9 @@ ankle_p_mimic_pid = {'p': 500000.0, 'i': 500.0, 'd': 50000.0}
 cover_pid = {'p': 50000.0, 'i': 500.0, 'd': 5000.0}
 thrust_pid = {'p': 10000000.0, 'i': 500.0, 'd': 20000.0}
 
+# a node with several joints gets one addition_null link per extra joint, the first joints of the node get the
+# 'addition_null' key, which is 'box' (0.8m box collision with mass), 'virtual' (small inertia without collision)
+# or 'massless' (no inertial, only for simulators which accept it), and defaults to --addition_null
 joints_ = [
     # axis [pitch, roll, yaw]
     # backpack
@@ -199,6 +219,17 @@ joints_ = [
 
 ]
 
+# joint table keys that only change values in the urdf file, see patch_urdf_file()
+patch_keys_ = ('axis', 'limit_lower', 'limit_upper', 'mimic_multiplier', 'mimic_offset', 'origin_xyz', 'origin_rpy')
+
+
+# split joint table into the part that changes the link structure and the part that patch_urdf_file() can apply
+def split_joint_table(joints):
+    structure = [[i, sorted(k for k in j.keys() if k != 'addition_null'), dict((k, v) for k, v in j.items() if k not in patch_keys_ and k not in ('pid', 'addition_null'))]
+                 for i, j in joints]
+    values = [[i, dict((k, v) for k, v in j.items() if k in patch_keys_)] for i, j in joints]
+    return structure, values
+
 
 def get_bouding_box(geometries):
     bbox_min = []
@@ -240,22 +271,9 @@ def calc_inertia(collision, density=100.0):
 def get_volume(geometries, density):
     global all_weight_
     if len(geometries) > 0:
-        m = 0.0
-        c = numpy.array([0.0, 0.0, 0.0])
-        I = numpy.array([[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]])
-        for g in geometries:
-            for p in g.primitives:
-                _mesh = trimesh.Trimesh(vertices=p.vertex.astype("float64"), faces=p.vertex_index, face_normals=p.normal[p.normal_index].astype("float64"), validate=True).convex_hull
-                _m = _mesh.volume * density
-                _c = _mesh.center_mass
-                _I = _mesh.moment_inertia * density
-                m += _m
-                c += _m * _c
-                I += _I + _m * (numpy.inner(_c, _c) * numpy.identity(3) - numpy.outer(_c, _c))
+        m, c, I = inertia_cache_.mass_properties(geometries, density)
         if m > 0:
             all_weight_ += m
-            c = c / m
-            I = I - m * (numpy.inner(c, c) * numpy.identity(3) - numpy.outer(c, c))
             if m < 50:  # GGC hack, small mass reduce stability of simulation
                 I *= 50 / m
                 m = 50
@@ -275,16 +293,17 @@ def get_volume(geometries, density):
 
 
 def retrive_node(nodes, joints_dict, links_dict, parent=None):
-    global robot_, depth_
+    global robot_, tree_, depth_
     # if len(robot_.joints) > 8: return True ############################# FOR
     # DEBUG
     depth_ += 1
     for node in nodes:
-        print(' ' * depth_),  # write indent
-        try:
-            print('id .. {} {}'.format(node.id, type(node)))
-        except:
-            print('node .. {}'.format(node))
+        profiler_.count('nodes')
+        if logger.isEnabledFor(logging.DEBUG):
+            try:
+                logger.debug('%sid .. %s %s', ' ' * depth_, node.id, type(node))
+            except:
+                logger.debug('%snode .. %s', ' ' * depth_, node)
         if isinstance(node, scene.Node):
             if node.id:
                 if node.id[-5:] == '_link':
@@ -298,6 +317,7 @@ def retrive_node(nodes, joints_dict, links_dict, parent=None):
                          origin=None)
                 # add link
                 robot_.add_link(l)
+                tree_.add_link(l.name, l)
                 if parent:
                     if parent.id[-5:] == '_link':
                         parentname = parent.id
@@ -311,8 +331,8 @@ def retrive_node(nodes, joints_dict, links_dict, parent=None):
                                   xyz=translation_from_matrix(node.matrix),
                                   rpy=euler_from_matrix(node.matrix))
                               )
-                    print(
-                        '{}  - {}'.format(' ' * depth_, [type(n) for n in node.children]))
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug('%s  - %s', ' ' * depth_, [type(n) for n in node.children])
                     # if not any(isinstance(n, scene.GeometryNode) for n in node.children):
                     #     j.joint_type = 'revolute'
                     #     # j.axis = numpy.array(parent.matrix)[:3, :3].dot([0,
@@ -329,7 +349,7 @@ def retrive_node(nodes, joints_dict, links_dict, parent=None):
                         j.joint_type = 'revolute'
                         j.axis = [0, 0, 1]
                         if len(node.transforms) > 1:
-                            print(node.transforms[1:])
+                            logger.debug('%s', node.transforms[1:])
                         if any(isinstance(n, scene.RotateTransform) for n in node.transforms):
                             j.axis = [1, 0, 0]
                         j.limit = JointLimit(
@@ -374,45 +394,39 @@ def retrive_node(nodes, joints_dict, links_dict, parent=None):
                     #
                     # add joint
                     robot_.add_joint(j)
+                    tree_.add_joint(j.name, j.parent, j.child, j)
 
             retrive_node(node.children, joints_dict, links_dict, node)
             depth_ -= 1
         elif isinstance(node, scene.GeometryNode):
-            # print('writing mesh file to meshes/{}.dae'.format(node.geometry.id))
-            # write mesh
-            c = Collada()
             g = node.geometry
-            n = scene.Node(g.name + '-node', [node])
-            s = scene.Scene(g.name + '-scene', [])
-            # s.nodes.extend(parent.transforms) # ?? need this?
-            s.nodes.append(n)
-            cont = asset.Contributor(
-                author="Association GUNDAM GLOBAL CHALLENGE",
-                comments="This file is automatically generated by " +
-                (' '.join(sys.argv)).replace('--', '\-\-') + ' '
-                "and distributed under the TERMS OF USE FOR GUNDAM RESEARCH OPEN SIMULATOR Attribution-NonCommercial-ShareAlike",
-                copyright="SOTSU, SUNRISE / GUNDAM GLOBAL CHALLENGE",
-            )
-            c.assetInfo.contributors.append(cont)
-            c.geometries.append(g)
-            c.materials = [m.target for m in node.materials]
-            c.effects = [m.target.effect for m in node.materials]
-            c.scenes.append(s)
-            c.scene = s
+            geometry_nodes_[g.id] = node
+            profiler_.count('geometries')
+            profiler_.count('triangles', geometry_triangles(g))
             if args.write_mesh:
-                c.write('meshes/{}.dae'.format(g.id))
+                # mesh files are written after the traversal, see write_mesh_files()
+                mesh_jobs_[mesh_filename(g.id, 0)] = node
             #
             # update urdf
-            l = [l for l in robot_.links if l.name == parent.id + '_link'][0]
+            l = tree_.link(parent.id + '_link')
             l.visuals.append(Visual(
                 geometry=Mesh(
-                    filename='package://gundam_rx78_description/meshes/{}.dae'.format(
-                        g.id))))
-            # get bounding box of scene
-            l.collisions.append(Collision(
-                geometry=Mesh(
-                    filename='package://gundam_rx78_description/meshes/{}.dae'.format(
-                        g.id))))
+                    filename='package://gundam_rx78_description/{}'.format(
+                        mesh_filename(g.id, args.visual_lod)))))
+            if args.collision == 'mesh':
+                l.collisions.append(Collision(
+                    geometry=Mesh(
+                        filename='package://gundam_rx78_description/{}'.format(
+                            mesh_filename(g.id, args.collision_lod)))))
+            elif args.collision == 'primitive':
+                # get bounding box of geometry
+                l.collisions.append(get_bouding_box([g]))
+            else:
+                for filename in collision_cache_.get_files(g):
+                    l.collisions.append(Collision(
+                        geometry=Mesh(
+                            filename='package://gundam_rx78_description/{}'.format(
+                                filename))))
             if l.name in link_dict:
                 link_dict[l.name].append(g)
             else:
@@ -421,10 +435,138 @@ def retrive_node(nodes, joints_dict, links_dict, parent=None):
         elif isinstance(node, scene.ExtraNode):
             pass
         else:
-            print('skipping {}'.format(node))
+            logger.debug('skipping %s', node)
+
+
+# command line written into the generated files, without the options that do not change them
+def command_line():
+    argv = []
+    skip = False
+    for arg in sys.argv:
+        if skip:
+            skip = False
+        elif arg in ('--jobs', '--log_level', '--profile_report'):
+            skip = True
+        elif arg != '--profile' and not arg.startswith(('--jobs=', '--log_level=', '--profile_report=')):
+            argv.append(arg)
+    return (' '.join(argv)).replace('--', '\-\-')
+
+
+# mesh file of the geometry at the level of detail, 0 is the original mesh
+def mesh_filename(geometry_id, level):
+    if level == 0:
+        return 'meshes/{}.{}'.format(geometry_id, args.mesh_format)
+    return '{}/{}.{}'.format(lod_dir(level), geometry_id, args.mesh_format)
+
+
+# levels of detail to write, the ones used by the urdf file and all of them with --write_lod
+def lod_levels():
+    levels = set(range(1, len(args.lod_ratio) + 1)) if args.write_lod else set()
+    levels.add(args.visual_lod)
+    if args.collision == 'mesh':
+        levels.add(args.collision_lod)
+    return sorted(levels - set([0]))
+
+
+# triangle budget of each link at the level of detail, from the --lod_budget file
+def link_lod_budgets(level):
+    budgets = dict()
+    for link_name, budget in lod_budget_table_.items():
+        if isinstance(budget, list):
+            budgets[link_name] = budget[level - 1] if level <= len(budget) else None
+        else:
+            budgets[link_name] = budget
+    return budgets
+
+
+# add decimated mesh files of the geometries collected by retrive_node to mesh_jobs_
+def add_lod_jobs(link_dict):
+    for level in lod_levels():
+        budgets = triangle_budgets(link_dict, args.lod_ratio[level - 1], link_lod_budgets(level))
+        for geometry_id, budget in budgets.items():
+            filename = mesh_filename(geometry_id, level)
+            mesh_jobs_[filename] = geometry_nodes_[geometry_id]
+            mesh_budgets_[filename] = budget
+
+
+# write one mesh file, called in worker processes
+def write_mesh_file(filename):
+    node = mesh_jobs_[filename]
+    c = Collada()
+    g = node.geometry
+    report = None
+    if filename in mesh_budgets_:
+        # decimated geometry with the same id, so that the node refers to it
+        g = decimate_geometry(c, g, mesh_budgets_[filename])
+    elif args.weld:
+        g, report = weld_geometry(c, g, args.weld_tolerance)
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    if args.mesh_format != 'dae':
+        export_geometry(g, node.materials, filename, args.mesh_format)
+        return filename, report
+    n = scene.Node(g.name + '-node', [node])
+    s = scene.Scene(g.name + '-scene', [])
+    # s.nodes.extend(parent.transforms) # ?? need this?
+    s.nodes.append(n)
+    cont = asset.Contributor(
+        author="Association GUNDAM GLOBAL CHALLENGE",
+        comments="This file is automatically generated by " + command_line() + ' '
+        "and distributed under the TERMS OF USE FOR GUNDAM RESEARCH OPEN SIMULATOR Attribution-NonCommercial-ShareAlike",
+        copyright="SOTSU, SUNRISE / GUNDAM GLOBAL CHALLENGE",
+    )
+    c.assetInfo.contributors.append(cont)
+    # use the time stamp of the input file, so that the same input always gives the same output bytes
+    c.assetInfo.created = c.assetInfo.modified = datetime.datetime.fromtimestamp(os.path.getmtime(args.input_file))
+    c.geometries.append(g)
+    c.materials = [m.target for m in node.materials]
+    c.effects = [m.target.effect for m in node.materials]
+    c.scenes.append(s)
+    c.scene = s
+    c.write(filename)
+    return filename, report
+
+
+# write mesh files collected by retrive_node, in parallel if jobs > 1
+def write_mesh_files(jobs):
+    filenames = sorted(mesh_jobs_.keys())
+    if jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # worker processes inherit mesh_jobs_ by fork, as pycollada objects can not be pickled
+        pool = multiprocessing.get_context('fork').Pool(jobs)
+        try:
+            for filename, report in pool.imap_unordered(write_mesh_file, filenames):
+                print_mesh_file(filename, report)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for filename in filenames:
+            print_mesh_file(*write_mesh_file(filename))
+
+
+def print_mesh_file(filename, report):
+    logger.info('writing mesh file to %s', filename)
+    if report is not None:
+        logger.info('  %s', report)
+    profiler_.count('files')
+    profiler_.count('bytes', os.path.getsize(filename))
 
 
-def add_gazebo_nodes(robot, link_dict):
+# inertial of a link which only connects two joints, it has no geometry and only has to keep the simulator stable
+def virtual_inertia(mass, size):
+    global all_weight_
+    all_weight_ += mass
+    return Inertial(mass=mass,
+                    origin=Pose(xyz=[0, 0, 0]),
+                    inertia=Inertia(ixx=mass * size * size / 6.0, iyy=mass * size * size / 6.0, izz=mass * size * size / 6.0))
+
+
+# addition_null option of the joint whose child is the link
+def addition_null_type(link_name, joints_dict):
+    return joints_dict.get(link_name[:-len('_link')], dict()).get('addition_null', args.addition_null)
+
+
+def add_gazebo_nodes(robot, link_dict, joints_dict):
     for j in robot.joints:
         if j.joint_type != "revolute":
             continue
@@ -457,6 +599,7 @@ def add_gazebo_nodes(robot, link_dict):
             robot.add_aggregate('transmission', trans)
 
     for l in robot.links:
+        profiler_.count('links')
         g = etree.Element('gazebo', reference=l.name)
         etree.SubElement(g, 'selfCollide').text = 'false'
         # etree.SubElement(g, 'mu1').text = '0.2'
@@ -473,8 +616,12 @@ def add_gazebo_nodes(robot, link_dict):
         # calculate mass property
         if l.name != "base_link":
             if "addition_null" in l.name:  # avoid null link ** GGC HACK
-                l.collision = Collision(origin=Pose(xyz=[0, 0, 0]), geometry=Box(size=[0.8, 0.8, 0.8]))
-                l.inertial = calc_inertia(l.collision, 400)
+                null_type = addition_null_type(l.name, joints_dict)
+                if null_type == 'box':
+                    l.collision = Collision(origin=Pose(xyz=[0, 0, 0]), geometry=Box(size=[0.8, 0.8, 0.8]))
+                    l.inertial = calc_inertia(l.collision, 400)
+                elif null_type == 'virtual':
+                    l.inertial = virtual_inertia(virtual_mass_, virtual_size_)
             else:
                 if l.inertial is None:
                     if l.name in link_dict:
@@ -508,23 +655,68 @@ def add_gazebo_nodes(robot, link_dict):
 # write urdf file
 def write_urdf_file(name, robot):
     f = open('urdf/{}.urdf'.format(name), 'w')
-    print("writing urdf file to %s" % f.name)
+    logger.info("writing urdf file to %s", f.name)
     f.write(
         '<?xml version="1.0" ?>\n'
         '<!--\n'
-        '  This file is automatically generated by ' + (' '.join(sys.argv)).replace('--', '\-\-') + '\n'
+        '  This file is automatically generated by ' + command_line() + '\n'
         '  and distributed under the TERMS OF USE FOR GUNDAM RESEARCH OPEN SIMULATOR Attribution-NonCommercial-ShareAlike\n'
         '  Copyright: SOTSU, SUNRISE / GUNDAM GLOBAL CHALLENGE\n'
         '-->\n')
     f.write(robot.to_xml_string().split("\n", 1)[1])  # skip <?xml version="1.0" ?>
     f.close()
+    profiler_.count('bytes', os.path.getsize(f.name))
+
+
+# update joint values of existing urdf file, instead of rebuilding it from the collada file
+def patch_urdf_file(name, joints_dict):
+    filename = 'urdf/{}.urdf'.format(name)
+    logger.info("patching urdf file %s", filename)
+    with open(filename) as f:
+        declaration = f.readline()
+    tree = etree.parse(filename)
+    child_dict = dict((j.get('child', i) + '_link', j) for i, j in joints_dict.items())
+    for joint in tree.getroot().findall('joint'):
+        child = joint.find('child')
+        if child is None or child.get('link') not in child_dict:
+            continue
+        j = child_dict[child.get('link')]
+        origin = joint.find('origin')
+        if origin is not None:
+            if 'origin_xyz' in j:
+                origin.set('xyz', ' '.join(map(str, j['origin_xyz'])))
+            if 'origin_rpy' in j:
+                origin.set('rpy', ' '.join(map(str, j['origin_rpy'])))
+        axis = joint.find('axis')
+        if axis is not None and 'axis' in j:
+            axis.set('xyz', ' '.join(map(str, j['axis'])))
+        limit = joint.find('limit')
+        if limit is not None:
+            if 'limit_lower' in j:
+                limit.set('lower', str(j['limit_lower']))
+            if 'limit_upper' in j:
+                limit.set('upper', str(j['limit_upper']))
+        mimic = joint.find('mimic')
+        if mimic is not None:
+            if 'mimic_multiplier' in j:
+                mimic.set('multiplier', str(j['mimic_multiplier']))
+            if 'mimic_offset' in j:
+                mimic.set('offset', str(j['mimic_offset']))
+    with open(filename, 'w') as f:
+        f.write(declaration)
+        # keep the comment header above the robot element
+        for node in reversed(list(tree.getroot().itersiblings(preceding=True))):
+            f.write(etree.tostring(node, encoding='unicode').strip() + '\n')
+        f.write(etree.tostring(tree.getroot(), encoding='unicode'))
+        f.write('\n')
+    profiler_.count('bytes', os.path.getsize(filename))
 
 
 # write ros_control configuration file
 def write_control_file(joints_dict):
     # write control file
-    f = open('../gundam_rx78_control/config/gundam_rx78_control.yaml', 'w')
-    print("Writing ros_control config file to %s" % f.name)
+    f = open(control_file_, 'w')
+    logger.info("Writing ros_control config file to %s", f.name)
     f.write('# Publish all joint states -----------------------------------\n'
             'joint_state_controller:\n'
             '  type: joint_state_controller/JointStateController\n'
@@ -602,6 +794,8 @@ def write_control_file(joints_dict):
     f.write('  state_publish_rate:  125\n')
     f.write('  action_monitor_rate: 10\n')
     f.write('  allow_partial_joints_goal: true\n')
+    f.close()
+    profiler_.count('bytes', os.path.getsize(f.name))
 
 
 global robot, args
@@ -616,52 +810,191 @@ if __name__ == '__main__':
         '--pin', action='store_true', help='pin the robot to the world')
     parser.add_argument(
         '--write_mesh', action='store_true', help='write mech files')
+    parser.add_argument(
+        '--jobs', type=int, default=1, help='number of processes to write mesh files')
+    parser.add_argument('--collision', choices=CollisionConst.MODES, default='mesh', help='set collision geometry type')
+    parser.add_argument(
+        '--force', action='store_true', help='rebuild all files even if they are up to date')
+    parser.add_argument('--mesh_format', choices=ConvertConst.FORMATS, default='dae',
+                        help='format of mesh files, glb, ply and obj are faster to load than dae')
+    parser.add_argument(
+        '--weld', action='store_true', help='weld coincident vertices and drop unused ones before writing mesh files')
+    parser.add_argument('--weld_tolerance', type=float, default=WeldConst.TOLERANCE,
+                        help='vertices closer than this in every component are welded with --weld')
+    parser.add_argument('--lod_ratio', type=float, nargs='+', default=list(DecimateConst.LOD_RATIOS),
+                        help='ratio of triangles kept at each level of detail, lod1, lod2, ...')
+    parser.add_argument(
+        '--lod_budget', help='yaml file of the triangle budget of each link, a number or a list of numbers for each level')
+    parser.add_argument(
+        '--write_lod', action='store_true', help='write decimated mesh files of all levels of detail with --write_mesh')
+    parser.add_argument(
+        '--visual_lod', type=int, default=0, help='level of detail of visual meshes, 0 is the original mesh')
+    parser.add_argument(
+        '--collision_lod', type=int, default=0, help='level of detail of collision meshes with --collision mesh')
+    parser.add_argument('--addition_null', choices=['box', 'virtual', 'massless'], default='box',
+                        help='links inserted for nodes with several joints, unless the joint table sets addition_null')
+    parser.add_argument(
+        '--merge_fixed', action='store_true', help='fold the links of fixed joints into their parent links, so that the simulator has fewer bodies')
+    parser.add_argument(
+        '--profile', action='store_true', help='print the time, peak memory and counters of each stage, without the worker processes of --jobs')
+    parser.add_argument(
+        '--profile_report', help='write the profile of each stage to a json file, which chrome://tracing also opens')
+    parser.add_argument('--log_level', choices=['debug', 'info', 'warning', 'error'], default='info',
+                        help='debug also prints every node of the collada file')
     args = parser.parse_args()
-
-    # load collada file
-    mesh_ = Collada(args.input_file)
-    if mesh_.xmlnode.getroot().attrib['version'] != '1.4.1':
-        print('This program only support COLLADA 1.4.1, but the input file is %s' %
-              mesh_.xmlnode.getroot().attrib['version'])
-        sys.exit(1)
-
-    # remove unused geometries / materials / effects / animations
-    simplify_collada(mesh_)
-
-    # merge nodes into one node if no joints exist between them.
-    # add additional nodes if multiple joints exist for one childnode
-    # add root link
-    mergenode_collada(mesh_, joints_, root_offset)
-    joints_dict = dict(joints_)
-
-    # apply scale
-    scale_collada(mesh_, scale_)
+    logging.basicConfig(format='%(message)s', level=getattr(logging, args.log_level.upper()))
+    for lod in (args.visual_lod, args.collision_lod):
+        if lod < 0 or lod > len(args.lod_ratio):
+            parser.error('level of detail must be between 0 and {}'.format(len(args.lod_ratio)))
+    lod_budget_table_ = dict()
+    if args.lod_budget:
+        with open(args.lod_budget) as f:
+            lod_budget_table_ = yaml.safe_load(f) or dict()
+    profiler_ = BuildProfiler(enabled=args.profile or args.profile_report is not None)
 
     # extract robot name
-    name_ = os.path.splitext(os.path.basename(mesh_.filename))[0]
-
-    # create robot instance
-    robot_ = Robot(name=name_)
-    # DEBUG: create pinned model
-    if args.pin:
-        robot_.add_link(Link(name='world'))
-        robot_.add_joint(
-            Joint(name='world_to_base', parent='world', child='base_link', joint_type='fixed'))
-    # robot_.add_link(Link(name='base_link'))
-    print("loaded collada file {}".format(name_))
-    link_dict = dict()
-    retrive_node(mesh_.scene.nodes[0].children, joints_dict, link_dict)  # hack for base_link
-
-    # update transmission joints to human readable ones
-    # update_joint_name(robot_, joints_dict)
-
-    # add gazebo information
-    add_gazebo_nodes(robot_, link_dict)
-
-    print('all weight is %f' % all_weight_)
-
-    # write urdf file
-    write_urdf_file(name_, robot_)
+    name_ = os.path.splitext(os.path.basename(args.input_file))[0]
+    urdf_file = 'urdf/{}.urdf'.format(name_)
+
+    # input hashes of each output file, to rebuild only the stale ones
+    manifest_ = BuildManifest()
+    joint_structure, joint_values = split_joint_table(joints_)
+    mesh_inputs = {'source': file_digest(args.input_file),
+                   'joint_structure': data_digest(joint_structure),
+                   'params': data_digest([scale_, root_offset.tolist()]),
+                   'weld': data_digest([args.weld, args.weld_tolerance]),
+                   'format': args.mesh_format}
+    urdf_inputs = dict(mesh_inputs,
+                       joint_values=data_digest(joint_values),
+                       params=data_digest([scale_, root_offset.tolist(), density, args.controller_type, args.no_mimic, args.pin, args.collision,
+                                           args.visual_lod, args.collision_lod, args.merge_fixed, args.addition_null,
+                                           [[i, j['addition_null']] for i, j in joints_ if 'addition_null' in j]]))
+    # decimated mesh files also depend on the ratio and budgets of their level
+    mesh_dir_inputs = dict([('meshes', mesh_inputs)] +
+                           [(lod_dir(level), dict(mesh_inputs, lod=data_digest([args.lod_ratio[level - 1], link_lod_budgets(level)])))
+                            for level in lod_levels()])
+    control_inputs = {'joints': data_digest(joints_),
+                      'params': data_digest([default_pid, args.controller_type, args.no_mimic])}
+    mesh_files = [f for d in mesh_dir_inputs for f in manifest_.artifacts_under(d)]
+    missing_mesh_dirs = [d for d in mesh_dir_inputs if len(manifest_.artifacts_under(d)) == 0]
+    stale_mesh_files = [f for f in mesh_files if args.force or manifest_.is_stale(f, mesh_dir_inputs[os.path.dirname(f)])]
+    urdf_changes = None if args.force else manifest_.changed_inputs(urdf_file, urdf_inputs)
+    # joint origins can not be patched when fixed joints are folded into them
+    patchable = set() if args.merge_fixed else set(['joint_values'])
+    rebuild = urdf_changes is None or len(urdf_changes - patchable) > 0 or (args.write_mesh and (len(missing_mesh_dirs) > 0 or len(stale_mesh_files) > 0))
+
+    if rebuild:
+        # load collada file
+        # all stages work on this object, only the mesh files are serialized
+        with profiler_.stage('load'):
+            mesh_ = Collada(args.input_file)
+        if mesh_.xmlnode.getroot().attrib['version'] != '1.4.1':
+            logger.error('This program only support COLLADA 1.4.1, but the input file is %s',
+                         mesh_.xmlnode.getroot().attrib['version'])
+            sys.exit(1)
+
+        # remove unused geometries / materials / effects / animations
+        with profiler_.stage('simplify_collada'):
+            simplify_collada(mesh_)
+            profiler_.count('geometries', len(mesh_.geometries))
+
+        # merge nodes into one node if no joints exist between them.
+        # add additional nodes if multiple joints exist for one childnode
+        # add root link
+        with profiler_.stage('mergenode_collada'):
+            node_offsets = mergenode_collada(mesh_, joints_, root_offset)
+            profiler_.count('merged_geometry_nodes', len(node_offsets))
+        joints_dict = dict(joints_)
+
+        # apply scale, and the transforms of the merged nodes to their geometries at once
+        with profiler_.stage('scale_collada'):
+            scale_collada(mesh_, scale_, node_offsets)
+
+        # create robot instance
+        robot_ = Robot(name=name_)
+        tree_ = KinematicTree()
+        # DEBUG: create pinned model
+        if args.pin:
+            robot_.add_link(Link(name='world'))
+            robot_.add_joint(
+                Joint(name='world_to_base', parent='world', child='base_link', joint_type='fixed'))
+            tree_.add_joint('world_to_base', 'world', 'base_link')
+        # robot_.add_link(Link(name='base_link'))
+        logger.info("loaded collada file %s", name_)
+        link_dict = dict()
+        mesh_jobs_ = dict()
+        mesh_budgets_ = dict()
+        geometry_nodes_ = dict()
+        collision_cache_ = CollisionCache(args.collision)
+        with profiler_.stage('retrive_node'):
+            retrive_node(mesh_.scene.nodes[0].children, joints_dict, link_dict)  # hack for base_link
+            collision_cache_.save()
+        if args.write_mesh:
+            add_lod_jobs(link_dict)
+
+        # write mesh files, only the ones which are not up to date
+        if args.write_mesh:
+            written_files = set(mesh_jobs_.keys())
+            for d in mesh_dir_inputs:
+                for filename in manifest_.prune(d, written_files):
+                    logger.info('mesh file %s is no longer written', filename)
+        if len(mesh_files) > 0 and not args.force:
+            for filename in list(mesh_jobs_.keys()):
+                if filename in mesh_files and filename not in stale_mesh_files:
+                    del mesh_jobs_[filename]
+        with profiler_.stage('write_mesh_files'):
+            write_mesh_files(args.jobs)
+        for filename in mesh_jobs_.keys():
+            manifest_.record(filename, mesh_dir_inputs[os.path.dirname(filename)])
+
+        # update transmission joints to human readable ones
+        # update_joint_name(robot_, joints_dict)
+
+        # compute mass properties of changed geometries at once
+        inertia_cache_ = InertiaCache()
+        with profiler_.stage('inertia'):
+            inertia_cache_.update([g for geometries in link_dict.values() for g in geometries])
+
+        # add gazebo information
+        with profiler_.stage('add_gazebo_nodes'):
+            add_gazebo_nodes(robot_, link_dict, joints_dict)
+        inertia_cache_.save()
+
+        logger.info('all weight is %f', all_weight_)
+
+        # fold fixed joints, after the mass properties of each link are known
+        if args.merge_fixed:
+            with profiler_.stage('merge_fixed_links'):
+                merged_links = merge_fixed_links(robot_)
+                profiler_.count('links', len(merged_links))
+            logger.info('merged %d links of fixed joints', len(merged_links))
+        moving_joints, actuated_joints = degrees_of_freedom(robot_)
+        logger.info('%d links, %d moving joints, %d degrees of freedom without mimic joints', len(robot_.links), moving_joints, actuated_joints)
+
+        # write urdf file
+        with profiler_.stage('write_urdf_file'):
+            write_urdf_file(name_, robot_)
+        manifest_.record(urdf_file, urdf_inputs)
+    else:
+        joints_dict = dict(addition_null_joints(joints_))
+        if len(urdf_changes) > 0:
+            # only joint values are changed
+            with profiler_.stage('patch_urdf_file'):
+                patch_urdf_file(name_, joints_dict)
+            manifest_.record(urdf_file, urdf_inputs)
+        else:
+            logger.info("urdf file %s is up to date", urdf_file)
 
     # write control file
-    write_control_file(joints_dict)
+    if args.force or manifest_.is_stale(control_file_, control_inputs):
+        with profiler_.stage('write_control_file'):
+            write_control_file(joints_dict)
+        manifest_.record(control_file_, control_inputs)
+    else:
+        logger.info("ros_control config file %s is up to date", control_file_)
+    manifest_.save()
+    if args.profile:
+        for line in profiler_.summary():
+            logger.info(line)
+    if args.profile_report:
+        profiler_.write(args.profile_report)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+# This file computes the mass properties of the links written by ggc_dae_to_urdf.py.
+# Each primitive is approximated by its convex hull as before, and the mass properties
+# of all hulls are integrated at once with NumPy instead of one trimesh call per hull.
+# The results are cached per geometry, so only geometries whose vertex data changed are recomputed.
+
+import numpy
+from build_cache import cache_path, geometry_digest, load_json, save_json
+from collision_collada import convex_hull
+
+
+class InertiaConst:
+    INDEX_FILE      = 'inertia.json'
+
+
+def hull_mass_properties(hulls: list) -> tuple:
+    # Volume, first moment and inertia about the origin of each closed mesh, at unit density.
+    # Each triangle forms a tetrahedron with the origin, and the integrals are summed per mesh.
+    nhulls = len(hulls)
+    if nhulls == 0:
+        return numpy.zeros(0), numpy.zeros((0, 3)), numpy.zeros((0, 3, 3))
+    triangles = numpy.concatenate([hull.vertices[hull.faces] for hull in hulls])  # (F, 3, 3), rows are vertices
+    starts = numpy.cumsum([0] + [len(hull.faces) for hull in hulls])[:-1]
+
+    det = numpy.linalg.det(triangles)
+    total = triangles.sum(axis=1)
+    volume = det / 6.0
+    first = volume[:, None] * total / 4.0
+    # Covariance of a tetrahedron with one vertex at the origin
+    covariance = det[:, None, None] / 120.0 * (numpy.einsum('fki,fkj->fij', triangles, triangles) + numpy.einsum('fi,fj->fij', total, total))
+
+    volume = numpy.add.reduceat(volume, starts)
+    first = numpy.add.reduceat(first, starts)
+    covariance = numpy.add.reduceat(covariance, starts)
+    inertia = numpy.trace(covariance, axis1=1, axis2=2)[:, None, None] * numpy.identity(3) - covariance
+    return volume, first, inertia
+
+
+class InertiaCache:
+    def __init__(self):
+        self.index_path = cache_path(InertiaConst.INDEX_FILE)
+        self.index = load_json(self.index_path)
+        self.modified = False
+
+    def update(self, geometries: list) -> None:
+        # Recompute the geometries whose vertex data changed, all stale hulls in one batch
+        stale = dict()
+        for g in geometries:
+            digest = geometry_digest(g)
+            entry = self.index.get(g.id)
+            if entry is None or entry['digest'] != digest:
+                stale[g.id] = (g, digest)
+        if len(stale) == 0:
+            return
+
+        hulls = []
+        owners = dict()
+        for geometry_id, (g, digest) in stale.items():
+            owners[geometry_id] = []
+            for p in g.primitives:
+                if p.vertex is None or len(p.vertex_index) == 0:
+                    continue
+                hull = convex_hull(p.vertex[numpy.unique(p.vertex_index)].astype('float64'))
+                if hull is not None:
+                    owners[geometry_id].append(len(hulls))
+                    hulls.append(hull)
+        volume, first, inertia = hull_mass_properties(hulls)
+
+        for geometry_id, (g, digest) in stale.items():
+            indices = owners[geometry_id]
+            self.index[geometry_id] = {'digest': digest,
+                                       'volume': float(volume[indices].sum()),
+                                       'first_moment': first[indices].sum(axis=0).tolist(),
+                                       'inertia': inertia[indices].sum(axis=0).tolist()}
+        self.modified = True
+
+    def mass_properties(self, geometries: list, density: float) -> tuple:
+        # Mass, center of mass and inertia about the center of mass of the geometries
+        self.update(geometries)
+        entries = [self.index[g.id] for g in geometries]
+        m = density * sum(entry['volume'] for entry in entries)
+        if m <= 0:
+            return 0.0, numpy.zeros(3), numpy.zeros((3, 3))
+        c = density * numpy.sum([entry['first_moment'] for entry in entries], axis=0) / m
+        I = density * numpy.sum([entry['inertia'] for entry in entries], axis=0)
+        I = I - m * (numpy.inner(c, c) * numpy.identity(3) - numpy.outer(c, c))
+        return m, c, I
+
+    def save(self) -> None:
+        if self.modified:
+            save_json(self.index_path, self.index)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+# This file replays a CSV gait of gundam_rx78_control/sample/csv/ through the batched forward kinematics of the URDF
+# and moves the base so that the stance foot stays where it touched the ground, i.e. walking without physics
+# It reports the base pose, whether it reaches the pose that check_walk_pose.py expects, and how far the feet slip,
+# so that a broken gait is caught in a fraction of a second before the Gazebo walk tests run
+# Just run ./(script_name).py --pos 4.5 0 -2 ../../gundam_rx78_control/sample/csv/walk-forward.csv inside gundam_rx78_description/scripts/
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy
+from forward_kinematics import FkConst, ForwardKinematics
+
+# The gaits are loaded as the trajectory clients and check_walk_pose.py do
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'gundam_rx78_control', 'sample'))
+from trajectory import load_trajectory  # noqa: E402
+
+
+class ReplayConst:
+    LEFT_SOLE_LINKS = tuple('rx78_Null_{:03d}_link'.format(i) for i in range(42, 46))
+    RIGHT_SOLE_LINKS = tuple('rx78_Null_{:03d}_link'.format(i) for i in range(92, 96))
+    SPAWN_XYZ       = (0.0, 0.0, -2.0)  # -z of urdf_spawner in gundam_rx78_gazebo/launch/gundam_rx78_walk.launch
+    CONTACT_HEIGHT  = 0.02              # A swing foot this close to the ground is in contact [m]
+    POS_TOLERANCE   = 0.5               # As check_walk_pose.py [m]
+    ROT_TOLERANCE   = 0.1               # As check_walk_pose.py [rad]
+
+
+class ReplayResult:
+    def __init__(self, times: numpy.ndarray, base: numpy.ndarray, stance: numpy.ndarray, slip: numpy.ndarray):
+        self.times = times              # (N,) seconds
+        self.base = base                # (N, 4, 4) poses of base_link in the world
+        self.stance = stance            # (N,) 0 for the left foot and 1 for the right foot
+        self.slip = slip                # (N, 2) horizontal motion of each foot while in contact, since the previous sample [m]
+
+    @property
+    def switches(self) -> int:
+        return int(numpy.count_nonzero(numpy.diff(self.stance)))
+
+    def pose(self, index: int = -1) -> tuple[list[float], list[float]]:
+        return self.base[index, :3, 3].tolist(), matrix_rpy(self.base[index])
+
+    def to_dict(self) -> dict:
+        xyz, rpy = self.pose()
+        return {'duration': float(self.times[-1] - self.times[0]), 'final_pos': xyz, 'final_rot': rpy, 'stance_switches': self.switches,
+                'slip_total': self.slip.sum(axis=0).tolist(), 'slip_max': self.slip.max(axis=0).tolist()}
+
+
+def matrix_rpy(matrix: numpy.ndarray) -> list[float]:
+    # Roll, pitch and yaw as euler_from_quaternion of tf, i.e. R = Rz(yaw) Ry(pitch) Rx(roll)
+    return [float(numpy.arctan2(matrix[2, 1], matrix[2, 2])),
+            float(numpy.arctan2(-matrix[2, 0], numpy.hypot(matrix[2, 1], matrix[2, 2]))),
+            float(numpy.arctan2(matrix[1, 0], matrix[0, 0]))]
+
+
+def replay(fk: ForwardKinematics, times: numpy.ndarray, positions: numpy.ndarray,
+           spawn_xyz=ReplayConst.SPAWN_XYZ, contact_height: float = ReplayConst.CONTACT_HEIGHT) -> ReplayResult:
+    # The sole links of all samples in one batched call, then the base follows the lowest foot sample by sample
+    sole_links = list(ReplayConst.LEFT_SOLE_LINKS + ReplayConst.RIGHT_SOLE_LINKS)
+    feet = fk.link_pose(positions, sole_links).reshape(len(times), 2, len(ReplayConst.LEFT_SOLE_LINKS), 4, 4)
+    base = numpy.identity(4)
+    base[:3, 3] = spawn_xyz
+    bases = numpy.empty((len(times), 4, 4))
+    stance = numpy.zeros(len(times), dtype=int)
+    slip = numpy.zeros((len(times), 2))
+    anchor = None
+    previous = None
+    for i in range(len(times)):
+        world = base @ feet[i]                              # (2, S, 4, 4) with the base of the previous sample
+        heights = world[:, :, 2, 3].min(axis=1)
+        foot = int(numpy.argmin(heights))
+        if anchor is None or foot != stance[i - 1]:
+            anchor = world[foot, 0]
+        base = anchor @ numpy.linalg.inv(feet[i, foot, 0])
+        bases[i] = base
+        stance[i] = foot
+
+        # a foot on the ground should not move, the stance foot never does by construction
+        world = base @ feet[i, :, 0]
+        if previous is not None:
+            ground = world[foot, 2, 3]
+            for other in range(2):
+                if world[other, 2, 3] - ground < contact_height and previous[other, 2, 3] - ground < contact_height:
+                    slip[i, other] = numpy.linalg.norm(world[other, :2, 3] - previous[other, :2, 3])
+        previous = world
+    return ReplayResult(times, bases, stance, slip)
+
+
+def pose_errors(result: ReplayResult, goal_pos, goal_rot) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # Absolute errors (N, 3) of the position and of roll, pitch and yaw of every sample, as check_walk_pose.py
+    rpy = numpy.stack([numpy.arctan2(result.base[:, 2, 1], result.base[:, 2, 2]),
+                       numpy.arctan2(-result.base[:, 2, 0], numpy.hypot(result.base[:, 2, 1], result.base[:, 2, 2])),
+                       numpy.arctan2(result.base[:, 1, 0], result.base[:, 0, 0])], axis=1)
+    return numpy.abs(result.base[:, :3, 3] - goal_pos), numpy.abs(rpy - goal_rot)
+
+
+def reached(result: ReplayResult, goal_pos, goal_rot,
+            pos_tolerance: float = ReplayConst.POS_TOLERANCE, rot_tolerance: float = ReplayConst.ROT_TOLERANCE) -> int | None:
+    # First sample within the tolerances, check_walk_pose.py also succeeds as soon as the robot passes the goal
+    pos_error, rot_error = pose_errors(result, numpy.asarray(goal_pos, dtype=float), numpy.asarray(goal_rot, dtype=float))
+    within = numpy.flatnonzero((pos_error < pos_tolerance).all(axis=1) & (rot_error < rot_tolerance).all(axis=1))
+    return int(within[0]) if len(within) > 0 else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay a CSV gait kinematically and check the pose of the base')
+    parser.add_argument('filename', help='CSV trajectory data file name')
+    parser.add_argument('--urdf', default=FkConst.URDF_PATH, help='URDF file name')
+    parser.add_argument('--pos', type=float, nargs=3, help='expected position of the base, as check_walk_pose.py')
+    parser.add_argument('--rot', type=float, nargs=3, default=[0.0, 0.0, 0.0], help='expected orientation of the base with --pos')
+    parser.add_argument('--contact_height', type=float, default=ReplayConst.CONTACT_HEIGHT, help='height below which a foot slips [m]')
+    parser.add_argument('--json', help='write the result to this json file')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    trajectory = load_trajectory(args.filename, args.urdf)
+    times = trajectory.times
+    result = replay(ForwardKinematics.from_urdf(args.urdf, trajectory.joint_names), times, trajectory.positions, contact_height=args.contact_height)
+    report = result.to_dict()
+    if args.pos is not None:
+        index = reached(result, args.pos, args.rot)
+        report['reached_at'] = None if index is None else float(times[index])
+    report['seconds'] = time.perf_counter() - start
+
+    xyz, rpy = result.pose()
+    print('pos: {:6.3f} {:6.3f} {:6.3f} - rot: {:6.3f} {:6.3f} {:6.3f}'.format(*xyz, *rpy))
+    print('{} stance switches, slip of the left and right feet {:.3f} m and {:.3f} m, at most {:.3f} m per sample'.format(
+        result.switches, *report['slip_total'], max(report['slip_max'])))
+    if args.json:
+        with open(args.json, 'w') as fout:
+            json.dump(report, fout, indent=1)
+            fout.write('\n')
+    if args.pos is not None:
+        if report['reached_at'] is None:
+            print('did not reach pos {} rot {} in {:.3f} s'.format(args.pos, args.rot, report['seconds']))
+            sys.exit(1)
+        print('reached pos {} rot {} at {:.2f} s of the gait, in {:.3f} s'.format(args.pos, args.rot, report['reached_at'], report['seconds']))
+
+
+if __name__ == '__main__':
+    main()
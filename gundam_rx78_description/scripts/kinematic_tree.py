@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# This file provides the kinematic tree of a URDF, indexed by link and joint names,
+# so that the scripts can look up parents, children and the topological order in constant time
+# It is also the base of the forward kinematics and the analysis tools
+# It stays Python 3.8 compatible, since ggc_dae_to_urdf.py and check_walk_pose.py --kinematic run it under ROS noetic
+
+from __future__ import annotations
+
+import xml.etree.ElementTree
+from typing import NamedTuple
+
+
+class JointInfo(NamedTuple):
+    name: str
+    joint_type: str
+    parent: str
+    child: str
+    origin_xyz: tuple[float, float, float] = (0.0, 0.0, 0.0)
+    origin_rpy: tuple[float, float, float] = (0.0, 0.0, 0.0)
+    axis: tuple[float, float, float] = (1.0, 0.0, 0.0)
+    limit: tuple[float, float] | None = None                # (lower, upper)
+    mimic: tuple[str, float, float] | None = None           # (joint, multiplier, offset)
+
+    @classmethod
+    def from_attrs(cls, name: str, joint_type: str, elements: dict[str, dict[str, str]]) -> 'JointInfo':
+        # Build from the attributes of the elements inside <joint>, keyed by tag
+        origin = elements.get('origin', dict())
+        limit = elements.get('limit')
+        mimic = elements.get('mimic')
+        return cls(name=name,
+                   joint_type=joint_type,
+                   parent=elements['parent']['link'],
+                   child=elements['child']['link'],
+                   origin_xyz=parse_vector(origin.get('xyz', '0 0 0')),
+                   origin_rpy=parse_vector(origin.get('rpy', '0 0 0')),
+                   axis=parse_vector(elements.get('axis', dict()).get('xyz', '1 0 0')),
+                   limit=None if limit is None or 'lower' not in limit else (float(limit['lower']), float(limit['upper'])),
+                   mimic=None if mimic is None else (mimic['joint'], float(mimic.get('multiplier', 1.0)), float(mimic.get('offset', 0.0))))
+
+    @property
+    def is_actuated(self) -> bool:
+        return self.joint_type != 'fixed' and self.mimic is None
+
+
+def parse_vector(values: str) -> tuple[float, ...]:
+    return tuple(float(val) for val in values.split())
+
+
+class KinematicTree:
+    # Links and joints are numbered in the order they are added
+    # Each link has at most one parent joint, and each joint connects a parent link to a child link
+    NO_INDEX = -1
+
+    def __init__(self):
+        self.link_names: list[str] = list()
+        self.link_index: dict[str, int] = dict()
+        self.link_payloads = list()
+        self.link_parent_joint: list[int] = list()
+        self.link_child_joints: list[list[int]] = list()
+
+        self.joint_names: list[str] = list()
+        self.joint_index: dict[str, int] = dict()
+        self.joint_payloads = list()
+        self.joint_parent_link: list[int] = list()
+        self.joint_child_link: list[int] = list()
+
+        self.order = None
+
+    @classmethod
+    def from_urdf(cls, urdf_path: str) -> 'KinematicTree':
+        # Links carry None and joints carry JointInfo
+        tree = cls()
+        for element in xml.etree.ElementTree.parse(urdf_path).getroot():
+            if element.tag == 'link':
+                tree.add_link(element.get('name'))
+            elif element.tag == 'joint':
+                info = JointInfo.from_attrs(element.get('name'), element.get('type'), {child.tag: child.attrib for child in element})
+                tree.add_joint(info.name, info.parent, info.child, info)
+        return tree
+
+    def add_link(self, name: str, payload=None) -> int:
+        # Adding a link again only replaces its payload, so that joints can refer to links defined later
+        if name in self.link_index:
+            index = self.link_index[name]
+            if payload is not None:
+                self.link_payloads[index] = payload
+            return index
+        index = len(self.link_names)
+        self.link_names.append(name)
+        self.link_index[name] = index
+        self.link_payloads.append(payload)
+        self.link_parent_joint.append(self.NO_INDEX)
+        self.link_child_joints.append(list())
+        self.order = None
+        return index
+
+    def add_joint(self, name: str, parent: str, child: str, payload=None) -> int:
+        if name in self.joint_index:
+            raise ValueError('joint {} is already defined'.format(name))
+        parent_index = self.add_link(parent)
+        child_index = self.add_link(child)
+        if self.link_parent_joint[child_index] != self.NO_INDEX:
+            raise ValueError('link {} already has parent joint {}'.format(child, self.joint_names[self.link_parent_joint[child_index]]))
+        index = len(self.joint_names)
+        self.joint_names.append(name)
+        self.joint_index[name] = index
+        self.joint_payloads.append(payload)
+        self.joint_parent_link.append(parent_index)
+        self.joint_child_link.append(child_index)
+        self.link_parent_joint[child_index] = index
+        self.link_child_joints[parent_index].append(index)
+        self.order = None
+        return index
+
+    def link(self, name: str):
+        return self.link_payloads[self.link_index[name]]
+
+    def joint(self, name: str):
+        return self.joint_payloads[self.joint_index[name]]
+
+    def parent_joint(self, link_name: str) -> str | None:
+        index = self.link_parent_joint[self.link_index[link_name]]
+        return None if index == self.NO_INDEX else self.joint_names[index]
+
+    def parent_link(self, link_name: str) -> str | None:
+        index = self.link_parent_joint[self.link_index[link_name]]
+        return None if index == self.NO_INDEX else self.link_names[self.joint_parent_link[index]]
+
+    def child_joints(self, link_name: str) -> list[str]:
+        return [self.joint_names[index] for index in self.link_child_joints[self.link_index[link_name]]]
+
+    def roots(self) -> list[str]:
+        return [name for name, index in zip(self.link_names, self.link_parent_joint) if index == self.NO_INDEX]
+
+    def topological_order(self) -> list[int]:
+        # Link indices with every parent before its children, children in the order they are added
+        if self.order is None:
+            order = [index for index, parent in enumerate(self.link_parent_joint) if parent == self.NO_INDEX]
+            position = 0
+            while position < len(order):
+                order.extend(self.joint_child_link[joint] for joint in self.link_child_joints[order[position]])
+                position += 1
+            if len(order) != len(self.link_names):
+                raise ValueError('kinematic tree has a loop')
+            self.order = order
+        return self.order
+
+    def joint_order(self) -> list[int]:
+        # Joint indices with every joint after the joints above it
+        return [self.link_parent_joint[link] for link in self.topological_order() if self.link_parent_joint[link] != self.NO_INDEX]
+
+    def depth_first(self, link_name: str):
+        # Yield (joint index, depth) of the joints below the link, in depth-first order
+        stack = [(joint, 0) for joint in reversed(self.link_child_joints[self.link_index[link_name]])]
+        while stack:
+            joint, depth = stack.pop()
+            yield joint, depth
+            stack.extend((child, depth + 1) for child in reversed(self.link_child_joints[self.joint_child_link[joint]]))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+# This file folds the links hanging off fixed joints into their parent links, for ggc_dae_to_urdf.py --merge_fixed
+# so that the physics engine simulates fewer rigid bodies, e.g. the backpack, the sword and the sole plates
+# The inertia is combined with the parallel axis theorem, and the visuals, collisions and child joints
+# of a merged link are expressed in the frame of its parent
+
+from __future__ import annotations
+
+import numpy
+from urdf_parser_py.urdf import Inertia, Inertial, Pose
+from forward_kinematics import rpy_matrix
+
+
+class MergeConst:
+    KEEP_LINKS      = ('world', 'base_link')    # Referred to by --pin and the gazebo plugins
+    ELEMENT_TAGS    = ('visual', 'collision')
+
+
+def pose_matrix(pose) -> numpy.ndarray:
+    if pose is None:
+        return numpy.identity(4)
+    return rpy_matrix(pose.xyz if pose.xyz is not None else [0.0] * 3, pose.rpy if pose.rpy is not None else [0.0] * 3)
+
+
+def matrix_pose(matrix: numpy.ndarray) -> Pose:
+    # rpy of R = Rz(yaw) Ry(pitch) Rx(roll), as rpy_matrix
+    rotation = matrix[:3, :3]
+    roll = numpy.arctan2(rotation[2, 1], rotation[2, 2])
+    pitch = numpy.arctan2(-rotation[2, 0], numpy.hypot(rotation[2, 1], rotation[2, 2]))
+    yaw = numpy.arctan2(rotation[1, 0], rotation[0, 0])
+    return Pose(xyz=[float(val) for val in matrix[:3, 3]], rpy=[float(roll), float(pitch), float(yaw)])
+
+
+def inertial_in_frame(inertial: Inertial, transform: numpy.ndarray) -> tuple:
+    # Mass, center of mass and inertia about the center of mass of an inertial, in the frame given by transform
+    origin = transform @ pose_matrix(inertial.origin)
+    rotation = origin[:3, :3]
+    inertia = numpy.array(inertial.inertia.to_matrix(), dtype=float) if inertial.inertia is not None else numpy.zeros((3, 3))
+    return float(inertial.mass), origin[:3, 3], rotation @ inertia @ rotation.T
+
+
+def combine_inertials(inertials: list) -> Inertial:
+    # Inertial of rigidly connected bodies given as (mass, center of mass, inertia about the center of mass)
+    mass = sum(body[0] for body in inertials)
+    if mass <= 0:
+        return None
+    center = sum(body[0] * body[1] for body in inertials) / mass
+    inertia = numpy.zeros((3, 3))
+    for body_mass, body_center, body_inertia in inertials:
+        offset = body_center - center
+        inertia += body_inertia + body_mass * (offset @ offset * numpy.identity(3) - numpy.outer(offset, offset))
+    return Inertial(mass=mass,
+                    inertia=Inertia(ixx=inertia[0, 0], ixy=inertia[0, 1], ixz=inertia[0, 2], iyy=inertia[1, 1], iyz=inertia[1, 2], izz=inertia[2, 2]),
+                    origin=Pose(xyz=[float(val) for val in center], rpy=[0.0, 0.0, 0.0]))
+
+
+def move_elements(child, parent, tag: str, transform: numpy.ndarray) -> None:
+    # Visuals or collisions of child to parent, aggregates stay aggregates so that urdf_parser_py writes them
+    elements = []
+    for element in getattr(child, tag + 's'):
+        if not any(element is other for other in elements):
+            elements.append(element)
+    for element in elements:
+        element.origin = matrix_pose(transform @ pose_matrix(element.origin))
+        if element in child.aggregate_order:
+            parent.add_aggregate(tag, element)
+        else:
+            getattr(parent, tag + 's').append(element)
+
+
+def merge_link(robot, joint) -> None:
+    # Fold the child link of a fixed joint into its parent link
+    parent = robot.link_map[joint.parent]
+    child = robot.link_map[joint.child]
+    transform = pose_matrix(joint.origin)
+
+    inertials = [inertial_in_frame(link.inertial, matrix) for link, matrix in ((parent, numpy.identity(4)), (child, transform))
+                 if link.inertial is not None]
+    if inertials:
+        parent.inertial = combine_inertials(inertials)
+    for tag in MergeConst.ELEMENT_TAGS:
+        move_elements(child, parent, tag, transform)
+    for other in robot.joints:
+        if other.parent == child.name:
+            other.parent = parent.name
+            other.origin = matrix_pose(transform @ pose_matrix(other.origin))
+
+    robot.remove_aggregate(joint)
+    robot.remove_aggregate(child)
+    for gazebo in list(robot.gazebos):
+        if gazebo.get('reference') in (child.name, joint.name):
+            robot.remove_aggregate(gazebo)
+
+
+def rebuild_maps(robot) -> None:
+    robot.joint_map = dict((joint.name, joint) for joint in robot.joints)
+    robot.link_map = dict((link.name, link) for link in robot.links)
+    robot.parent_map = dict()
+    robot.child_map = dict()
+    for joint in robot.joints:
+        robot.parent_map[joint.child] = (joint.name, joint.parent)
+        robot.child_map.setdefault(joint.parent, []).append((joint.name, joint.child))
+
+
+def merge_fixed_links(robot, keep_links=MergeConst.KEEP_LINKS) -> list[str]:
+    # Names of the merged links, each merge is exact so the joints can be folded in any order
+    merged = []
+    for joint in list(robot.joints):
+        if joint.joint_type == 'fixed' and joint.child not in keep_links:
+            merged.append(joint.child)
+            merge_link(robot, joint)
+    rebuild_maps(robot)
+    return merged
+
+
+def degrees_of_freedom(robot) -> tuple[int, int]:
+    # Moving joints, and the ones which are not mimic joints
+    moving = [joint for joint in robot.joints if joint.joint_type != 'fixed']
+    return len(moving), len([joint for joint in moving if joint.mimic is None])
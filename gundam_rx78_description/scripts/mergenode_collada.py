@@ -38,45 +38,32 @@ import numpy
 import argparse
 
 
-def mergenode(parentnode, childnode):
+# node_offsets maps each geometry node to the transform from its new parent to its original parent,
+# the sources are transformed once by scale_collada instead of once per merged node
+def mergenode(parentnode, childnode, node_offsets):
     if isinstance(parentnode, scene.Node) and isinstance(childnode, scene.Node):
         # merge childnode into parentnode
         parentnode.children.remove(childnode)
-        child_mat = childnode.matrix
+        child_mat = numpy.asarray(childnode.matrix, dtype=numpy.float64)
         for child in childnode.children:
             if isinstance(child, scene.Node):
-                child.transforms = copy.deepcopy(childnode.transforms) + child.transforms
-                for t in reversed(childnode.transforms):
-                    child.matrix = numpy.dot(t.matrix, child.matrix)
+                # child.matrix is recomputed from the transforms by scale_collada
+                child.transforms = childnode.transforms + child.transforms
                 parentnode.children.append(child)
             elif isinstance(child, scene.GeometryNode):
-                position_ids = set()
-                normal_ids = set()
-                for primitive in child.geometry.primitives:
-                    for _input in primitive.getInputList().getList():
-                        if _input[1] == "VERTEX":
-                            position_ids.add(_input[2][1:])  # remove '#'
-                        elif _input[1] == "NORMAL":
-                            normal_ids.add(_input[2][1:])  # remove '#'
-                for position_id in position_ids:
-                    child.geometry.sourceById[position_id].data = ((child_mat[:3, :3].astype("float64").dot(child.geometry.sourceById[position_id].data.transpose())).transpose() + child_mat[:3, 3]).copy()
-                for normal_id in normal_ids:
-                    child.geometry.sourceById[normal_id].data = (child_mat[:3, :3].astype("float64").dot(child.geometry.sourceById[normal_id].data.transpose())).transpose().copy()
-                for primitive in child.geometry.primitives:
-                    primitive._vertex = primitive.sources['VERTEX'][0][4].data
-                    primitive._normal = primitive.sources['NORMAL'][0][4].data
+                node_offsets[child] = numpy.dot(child_mat, node_offsets[child]) if child in node_offsets else child_mat
                 parentnode.children.append(child)
 
 
-def get_merged(node, joints_dict):
+def get_merged(node, joints_dict, node_offsets):
     if isinstance(node, scene.Node):
         # merge nodes below this node unless joint exists
         for child in node.children[:]:
             if isinstance(child, scene.Node):
                 if child.id in joints_dict:
-                    get_merged(child, joints_dict)
+                    get_merged(child, joints_dict, node_offsets)
                 else:
-                    mergenode(node, get_merged(child, joints_dict))
+                    mergenode(node, get_merged(child, joints_dict, node_offsets), node_offsets)
     return node
 
 
@@ -92,6 +79,26 @@ def find_parent_node(node, name):
     return False
 
 
+def count_childlinks(joints_):
+    childlink_count = dict()
+    for joint in joints_:
+        if joint[0] in childlink_count.keys():
+            childlink_count[joint[0]] += 1
+        else:
+            childlink_count[joint[0]] = 1
+    return childlink_count
+
+
+# rename joints to the additional nodes inserted by mergenode_collada, this does not need the collada file
+def addition_null_joints(joints_):
+    joints_new = copy.deepcopy(joints_)
+    for childlinkid, count in count_childlinks(joints_).items():
+        for i in range(count - 1):
+            j = [s for s in joints_new if s[0] == childlinkid][0]
+            j[0] += "_addition_null" + str(i)
+    return joints_new
+
+
 def mergenode_collada(mesh_, joints_, root_offset):
     # apply root_offset
     node = mesh_.scene.nodes[0]
@@ -104,19 +111,11 @@ def mergenode_collada(mesh_, joints_, root_offset):
 
     # merge nodes into one node if no joints exist between them.
     joints_dict = dict(joints_)
-    get_merged(mesh_.scene.nodes[0], joints_dict)
-    mesh_.save()
+    node_offsets = dict()
+    get_merged(mesh_.scene.nodes[0], joints_dict, node_offsets)
 
     # add additional nodes if multiple joints exist for one childnode
-    joints_new = copy.deepcopy(joints_)
-    childlink_count = dict()
-    for joint in joints_:
-        if joint[0] in childlink_count.keys():
-            childlink_count[joint[0]] += 1
-        else:
-            childlink_count[joint[0]] = 1
-
-    for childlinkid, count in childlink_count.items():
+    for childlinkid, count in count_childlinks(joints_).items():
         if count > 1:
             parentnode, childnode = find_parent_node(mesh_.scenes[0].nodes[0], childlinkid)
             for i in range(count - 1):
@@ -129,8 +128,7 @@ def mergenode_collada(mesh_, joints_, root_offset):
                 childnode.matrix = numpy.identity(4, dtype=numpy.float32)
                 parentnode.children.append(newnode)
                 parentnode = newnode
-                j = [s for s in joints_new if s[0] == childlinkid][0]
-                j[0] += "_addition_null" + str(i)
+    joints_new = addition_null_joints(joints_)
 
     # add root link
     if len(mesh_.scene.nodes[0].children) == 1:
@@ -146,5 +144,6 @@ def mergenode_collada(mesh_, joints_, root_offset):
     mesh_.scene.nodes[0].children[0].transforms = [scene.MatrixTransform(numpy.identity(4, dtype=numpy.float32).reshape(16, 1))]
     mesh_.scene.nodes[0].children[0].matrix = numpy.identity(4, dtype=numpy.float32)
 
-    mesh_.save()
+    # mesh_ is not saved, pass the returned node_offsets to scale_collada to transform the sources and node.matrix
     joints_[:] = joints_new
+    return node_offsets
@@ -6,17 +6,12 @@
 
 import os
 
+from kinematic_tree import KinematicTree
+
 
 class UrdfConst:
     URDF_EXT        = '.urdf'
-    LINK_TAG_START  = '  <link name='
-    LINK_TAG_END    = '  </link>\n'
-    JOINT_TAG_START = '  <joint name='
-    JOINT_TAG_FIXED = ' type="fixed">\n'
-    JOINT_TAG_END   = '  </joint>\n'
-    PARENT_TAG_START= '    <parent link='
-    CHILD_TAG_START = '    <child link='
-    MIMIC_TAG_START = '    <mimic joint='
+    ROOT_LINK       = 'base_link'
 
 
 def main() -> None:
@@ -29,72 +24,19 @@ def main() -> None:
 
 def print_urdf(urdf_path: str) -> None:
     print(urdf_path)
-    with open(urdf_path, 'r') as fin:
-        print_relationships(fin.readlines())
-
-def print_relationships(urdf_lines: list[str]) -> None:
-    link_list = list[str]()
-    joint_list = list[tuple[str, int, int]]()
-    ignore_list = list[int]()
-
-    # Read sequentially
-    # Assumes links are defined before being used in joints
-    line_num = 0
-    line_num_max = len(urdf_lines)
-    while line_num < line_num_max:
-        line_entry = urdf_lines[line_num]
-        line_split = line_entry.split('"')
-
-        match line_split[0]:
-            case UrdfConst.LINK_TAG_START:
-                link_name = line_split[1]
-                link_list.append(link_name)
-
-                if line_split[2] == '>\n':
-                    # Skip up to the end of link tag
-                    line_num += 1
-                    while line_num < line_num_max and urdf_lines[line_num] != UrdfConst.LINK_TAG_END:
-                        line_num += 1
-            case UrdfConst.JOINT_TAG_START:
-                joint_name = line_split[1]
-                parent_index = None
-                child_index = None
-
-                # Ignore fixed joints
-                is_ignore = line_entry.endswith(UrdfConst.JOINT_TAG_FIXED)
-
-                line_num += 1
-                while line_num < line_num_max:
-                    line_entry = urdf_lines[line_num]
-                    if line_entry == UrdfConst.JOINT_TAG_END:
-                        break
-                    line_split = line_entry.split('"')
-
-                    match line_split[0]:
-                        case UrdfConst.PARENT_TAG_START:
-                            parent_index = link_list.index(line_split[1])
-                        case UrdfConst.CHILD_TAG_START:
-                            child_index = link_list.index(line_split[1])
-                        case UrdfConst.MIMIC_TAG_START:
-                            # Ignore mimic joints
-                            is_ignore = True
-                    line_num += 1
-
-                joint_list.append((joint_name, parent_index, child_index))
-                if is_ignore:
-                    ignore_list.append(child_index)
-        line_num += 1
+    print_relationships(KinematicTree.from_urdf(urdf_path))
 
+def print_relationships(tree: KinematicTree) -> None:
     # Print the relationships recursively
-    print_relationship(joint_list, ignore_list, link_list.index('base_link'), 0)
-
-def print_relationship(joint_list: list[tuple[int, int]], ignore_list: list[int], link_index: int, level: int) -> None:
-    for joint_name, parent_index, child_index in joint_list:
-        if parent_index == link_index:
-            is_print = not child_index in ignore_list
-            if is_print:
-                print('-' * level + joint_name)
-            print_relationship(joint_list, ignore_list, child_index, level + is_print)
+    print_relationship(tree, tree.link_index[UrdfConst.ROOT_LINK], 0)
+
+def print_relationship(tree: KinematicTree, link_index: int, level: int) -> None:
+    for joint_index in tree.link_child_joints[link_index]:
+        # Ignore fixed joints and mimic joints
+        is_print = tree.joint_payloads[joint_index].is_actuated
+        if is_print:
+            print('-' * level + tree.joint_names[joint_index])
+        print_relationship(tree, tree.joint_child_link[joint_index], level + is_print)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -6,6 +6,11 @@
 # Just run ./(script_name).py inside gundam_rx78_description/scripts/
 
 import os
+import xml.sax
+import xml.sax.handler
+from xml.sax.saxutils import escape, quoteattr
+
+from kinematic_tree import JointInfo, KinematicTree
 
 
 class UrdfConst:
@@ -15,17 +20,64 @@ class UrdfConst:
     FIX_MIMIC_JOINTS= False             # Set mimic joints to fixed to hopefully solve crash bug during RL training
 
     URDF_EXT        = '.urdf'
-    JOINT_TAG       = ('<joint name="', '" type="revolute">')
-    CHILD_TAG       = ('<child link="', '"/>')
-    ORIGIN_TAG      = ('<origin xyz="', '" rpy="')
-    MASS_TAG        = ('<mass value="', '"/>')
-    INERTIA_TAG     = ('<inertia ixx="', '" ixy="', '" ixz="', '" iyy="', '" iyz="', '" izz="', '"/>')
-    EFFORT_TAG      = ('<limit effort="', '" lower="')
-    DYNAMICS_TAG    = ('<dynamics damping="', '" friction="', '"/>')
-    MESH_TAG        = ('<mesh filename="', '"/>')
-    MIMIC_TAG       = ('<mimic joint="', '" multiplier="', '" offset="', '"/>')
-    LIMIT_TAG       = ('<limit effort="', '" lower="', '" upper="', '" velocity="', '"/>')
-    JOINT_END_TAG   = ('</joint>',)
+    XML_DECLARATION = '<?xml version="1.0" ?>\n'
+    JOINT_TYPE      = 'revolute'        # Only revolute joints are renamed and have their mimic limits adjusted
+
+    # Event types of the parsed URDF
+    START           = 0
+    END             = 1
+    TEXT            = 2
+    COMMENT         = 3
+
+
+class UrdfModel:
+    # A parsed URDF: the XML events in document order, and the kinematic tree with JointInfo of each joint
+    def __init__(self):
+        self.events = list[tuple]()
+        self.tree = KinematicTree()
+
+
+class UrdfReader(xml.sax.handler.ContentHandler, xml.sax.handler.LexicalHandler):
+    # Records the events and builds the kinematic tree in the same pass
+    def __init__(self, model: UrdfModel):
+        super().__init__()
+        self.model = model
+        self.path = list[str]()
+        self.joint_attrs = None
+        self.joint_elements = None
+
+    def startElement(self, name, attrs):
+        attrs = list(attrs.items())
+        self.model.events.append((UrdfConst.START, name, attrs))
+        if self.path == ['robot']:
+            if name == 'link':
+                self.model.tree.add_link(dict(attrs)['name'])
+            elif name == 'joint':
+                self.joint_attrs = dict(attrs)
+                self.joint_elements = dict[str, dict[str, str]]()
+        elif self.joint_attrs is not None and len(self.path) == 2:
+            self.joint_elements[name] = dict(attrs)
+        self.path.append(name)
+
+    def endElement(self, name):
+        self.model.events.append((UrdfConst.END, name))
+        self.path.pop()
+        if len(self.path) == 1 and self.joint_attrs is not None:
+            info = JointInfo.from_attrs(self.joint_attrs['name'], self.joint_attrs['type'], self.joint_elements)
+            self.model.tree.add_joint(info.name, info.parent, info.child, info)
+            self.joint_attrs = None
+            self.joint_elements = None
+
+    def characters(self, content):
+        # Merge the text split by the parser
+        events = self.model.events
+        if events and events[-1][0] == UrdfConst.TEXT:
+            events[-1] = (UrdfConst.TEXT, events[-1][1] + content)
+        else:
+            events.append((UrdfConst.TEXT, content))
+
+    def comment(self, content):
+        self.model.events.append((UrdfConst.COMMENT, content))
 
 
 def main() -> None:
@@ -39,200 +91,122 @@ def main() -> None:
 def modify_urdf(urdf_path: str) -> None:
     # Read the original URDF and write to another file with '_' appended to the name
     write_path = urdf_path[:-len(UrdfConst.URDF_EXT)] + '_' + UrdfConst.URDF_EXT
-    with open(urdf_path, 'r') as fin:
-        with open(write_path, 'w+') as fout:
-            fout.writelines(fix_mimic_joints(adjust_mimic_limit(do_resize(do_rename(fin.readlines())))))
-
-def do_rename(urdf_lines: list[str]) -> list[str]:
-    joint_link_relationship = dict[str, str]()
-
-    for line_num, urdf_line in enumerate(urdf_lines):
-        # Search joint names
-        line_entry = urdf_line.strip()
-        if not line_entry.startswith(UrdfConst.JOINT_TAG[0]) or not line_entry.endswith(UrdfConst.JOINT_TAG[-1]):
-            continue
-        joint_name = line_entry[len(UrdfConst.JOINT_TAG[0]):-len(UrdfConst.JOINT_TAG[-1])]
-
-        # Search child link
-        for joint_line in urdf_lines[line_num + 1:]:
-            line_entry = joint_line.strip()
-            if not line_entry.startswith(UrdfConst.CHILD_TAG[0]) or not line_entry.endswith(UrdfConst.CHILD_TAG[-1]):
-                continue
-            link_name = line_entry[len(UrdfConst.CHILD_TAG[0]):-len(UrdfConst.CHILD_TAG[-1])]
-            # Build the relationship dict
-            joint_link_relationship[joint_name] = link_name
-            break
-
-    # Do the rename process
-    for line_num, urdf_line in enumerate(urdf_lines):
-        for joint_name, link_name in joint_link_relationship.items():
-            # Replace joint name so that it can be easier for searching
-            urdf_line = urdf_line.replace('"' + joint_name + '"', '"' + joint_name + '_joint"')
-            # Replace link name with meaningful name
-            urdf_line = urdf_line.replace('"' + link_name + '"', '"' + joint_name + '_link"')
-        urdf_lines[line_num] = urdf_line
-
-    return urdf_lines
-
-def do_resize(urdf_lines: list[str]) -> list[str]:
-    for line_num, urdf_line in enumerate(urdf_lines):
-        # m
-        if not UrdfConst.USE_URDF_IMPORTER_SCALING:
-            urdf_line = resize_values(urdf_line, UrdfConst.RESIZE_SCALE, UrdfConst.ORIGIN_TAG)
-        # kg
-        urdf_line = resize_values(urdf_line, pow(UrdfConst.RESIZE_SCALE, 3), UrdfConst.MASS_TAG)
-        # kg m^2
-        if not UrdfConst.USE_URDF_IMPORTER_SCALING:
-            urdf_line = resize_values(urdf_line, pow(UrdfConst.RESIZE_SCALE, 5), UrdfConst.INERTIA_TAG)
-        else:
-            urdf_line = resize_values(urdf_line, pow(UrdfConst.RESIZE_SCALE, 3), UrdfConst.INERTIA_TAG)
-        # kg m^2 s^-2
-        # Further scale down by 10
-        if not UrdfConst.USE_URDF_IMPORTER_SCALING:
-            urdf_line = resize_values(urdf_line, pow(UrdfConst.RESIZE_SCALE, 6), UrdfConst.EFFORT_TAG)
-        else:
-            urdf_line = resize_values(urdf_line, pow(UrdfConst.RESIZE_SCALE, 4), UrdfConst.EFFORT_TAG)
-        # kg m s^-2
-        if not UrdfConst.USE_URDF_IMPORTER_SCALING:
-            urdf_line = resize_values(urdf_line, pow(UrdfConst.RESIZE_SCALE, 4), UrdfConst.DYNAMICS_TAG)
-        else:
-            urdf_line = resize_values(urdf_line, pow(UrdfConst.RESIZE_SCALE, 3), UrdfConst.DYNAMICS_TAG)
-        # m
-        if not UrdfConst.USE_URDF_IMPORTER_SCALING:
-            urdf_line = resize_mesh(urdf_line, UrdfConst.RESIZE_SCALE, UrdfConst.MESH_TAG)
-
-        urdf_lines[line_num] = urdf_line
-
-    return urdf_lines
-
-def resize_values(urdf_line: str, resize_scale: float, find_substrings: list[str]) -> str:
-    # Resize all values in between substrings
-    for index in range(len(find_substrings) - 1):
-        urdf_line = resize_value(urdf_line, resize_scale, find_substrings[index:])
-    return urdf_line
-
-def resize_value(urdf_line: str, resize_scale: float, find_substrings: list[str]) -> str:
-    index_start = urdf_line.find(find_substrings[0])
-    index_end = urdf_line.find(find_substrings[1])
-    if index_start < 0 or index_end < 0:
-        return urdf_line
-
-    values = urdf_line[index_start + len(find_substrings[0]):index_end]
-    values = [float(val) * resize_scale for val in values.split(' ')]
-    values = ' '.join([str(val) for val in values])
-    urdf_line = urdf_line[:index_start + len(find_substrings[0])] + values + urdf_line[index_end:]
-    return urdf_line
-
-def resize_mesh(urdf_line: str, resize_scale: float, find_substrings: list[str]) -> str:
-    # Add "scale=" after all mesh tags
-    index_start = urdf_line.find(find_substrings[0])
-    index_end = urdf_line.find(find_substrings[1])
-    if index_start < 0 or index_end < 0:
-        return urdf_line
-
-    urdf_line = urdf_line[:index_end] + '" scale="' + str(resize_scale) + ' ' + str(resize_scale) + ' ' + str(resize_scale) + urdf_line[index_end:]
-    return urdf_line
-
-def adjust_mimic_limit(urdf_lines: list[str]) -> list[str]:
-    joint_limits = dict[str, tuple[float, float]]()
-
-    # Get joint limits
-    for line_num, urdf_line in enumerate(urdf_lines):
-        # Look for joints
-        line_entry = urdf_line.strip()
-        if not line_entry.startswith(UrdfConst.JOINT_TAG[0]) or not line_entry.endswith(UrdfConst.JOINT_TAG[-1]):
+    model = load_urdf(urdf_path)
+    with open(write_path, 'w+') as fout:
+        write_urdf(model, fout)
+
+def load_urdf(urdf_path: str) -> UrdfModel:
+    model = UrdfModel()
+    reader = UrdfReader(model)
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(reader)
+    parser.setProperty(xml.sax.handler.property_lexical_handler, reader)
+    parser.parse(urdf_path)
+    return model
+
+def write_urdf(model: UrdfModel, fout,
+               resize_scale: float = UrdfConst.RESIZE_SCALE,
+               use_importer_scaling: bool = UrdfConst.USE_URDF_IMPORTER_SCALING,
+               mimic_margin: float = UrdfConst.MIMIC_MARGIN,
+               fix_mimic_joints: bool = UrdfConst.FIX_MIMIC_JOINTS) -> None:
+    # Rename, resize and adjust mimic joints in one pass over the events
+    renames = get_renames(model)
+    mimic_limits = get_mimic_limits(model, mimic_margin)
+    mimic_joints = set(info.name for info in get_revolute_joints(model) if info.mimic is not None)
+    scales = get_scales(resize_scale, use_importer_scaling)
+
+    output = [UrdfConst.XML_DECLARATION]
+    depth = 0
+    joint_name = None
+    events = model.events
+    for index, event in enumerate(events):
+        if event[0] == UrdfConst.START:
+            name, attrs = event[1], event[2]
+            if name == 'joint' and depth == 1:
+                joint_name = dict(attrs).get('name')
+            attrs = [(key, renames.get(value, value)) for key, value in attrs]
+            if name in scales:
+                attrs = [(key, resize_value(value, scales[name][key]) if key in scales[name] else value) for key, value in attrs]
+            if name == 'mesh' and not use_importer_scaling:
+                # Add "scale=" after all mesh tags
+                attrs.append(('scale', ' '.join([str(resize_scale)] * 3)))
+            if name == 'limit' and depth == 2 and joint_name in mimic_limits:
+                lower_value, upper_value = mimic_limits[joint_name]
+                attrs = [(key, str(lower_value) if key == 'lower' else str(upper_value) if key == 'upper' else value) for key, value in attrs]
+            if name == 'joint' and depth == 1 and fix_mimic_joints and joint_name in mimic_joints:
+                attrs = [(key, 'fixed' if key == 'type' else value) for key, value in attrs]
+
+            output.append('<' + name + ''.join([' ' + key + '=' + quoteattr(value) for key, value in attrs]))
+            if index + 1 < len(events) and events[index + 1][0] == UrdfConst.END:
+                output.append('/>')
+            else:
+                output.append('>')
+            depth += 1
+        elif event[0] == UrdfConst.END:
+            depth -= 1
+            if events[index - 1][0] != UrdfConst.START:
+                output.append('</' + event[1] + '>')
+            if depth == 0:
+                output.append('\n')
+        elif event[0] == UrdfConst.TEXT:
+            output.append(escape(event[1]))
+        elif event[0] == UrdfConst.COMMENT:
+            output.append('<!--' + event[1] + '-->')
+            if depth == 0:
+                output.append('\n')
+    fout.write(''.join(output))
+
+def get_revolute_joints(model: UrdfModel) -> list[JointInfo]:
+    return [info for info in model.tree.joint_payloads if info.joint_type == UrdfConst.JOINT_TYPE]
+
+def get_renames(model: UrdfModel) -> dict[str, str]:
+    renames = dict[str, str]()
+    for info in get_revolute_joints(model):
+        # Replace joint name so that it can be easier for searching
+        renames[info.name] = info.name + '_joint'
+    for info in get_revolute_joints(model):
+        # Replace link name with meaningful name
+        renames[info.child] = info.name + '_link'
+    return renames
+
+def get_mimic_limits(model: UrdfModel, mimic_margin: float) -> dict[str, tuple[float, float]]:
+    joint_limits = {info.name: info.limit for info in get_revolute_joints(model) if info.limit is not None}
+    mimic_limits = dict[str, tuple[float, float]]()
+    for info in get_revolute_joints(model):
+        if info.mimic is None or info.name not in joint_limits or info.mimic[0] not in joint_limits:
             continue
-        joint_name = line_entry[len(UrdfConst.JOINT_TAG[0]):-len(UrdfConst.JOINT_TAG[-1])]
-
-        # Look for limit tag
-        for joint_line in urdf_lines[line_num + 1:]:
-            line_entry = joint_line.strip()
-            if not line_entry.startswith(UrdfConst.LIMIT_TAG[0]) or not line_entry.endswith(UrdfConst.LIMIT_TAG[-1]):
-                continue
-            lower_start_pos = line_entry.find(UrdfConst.LIMIT_TAG[1]) + len(UrdfConst.LIMIT_TAG[1])
-            lower_end_pos = line_entry.find(UrdfConst.LIMIT_TAG[2])
-            upper_start_pos = lower_end_pos + len(UrdfConst.LIMIT_TAG[2])
-            upper_end_pos = line_entry.find(UrdfConst.LIMIT_TAG[3])
-            lower_value = float(line_entry[lower_start_pos:lower_end_pos])
-            upper_value = float(line_entry[upper_start_pos:upper_end_pos])
-            joint_limits[joint_name] = (lower_value, upper_value)
-            break
-
-    # Calculate and modify mimic joint limits
-    for line_num, urdf_line in enumerate(urdf_lines):
-        # Look for joints
-        line_entry = urdf_line.strip()
-        if not line_entry.startswith(UrdfConst.JOINT_TAG[0]) or not line_entry.endswith(UrdfConst.JOINT_TAG[-1]):
-            continue
-
-        # Look for mimic tag
-        limit_line_num = None
-        for joint_num, joint_line in enumerate(urdf_lines[line_num + 1:]):
-            line_entry = joint_line.strip()
-            if line_entry == UrdfConst.JOINT_END_TAG[0]:
-                break
-            if line_entry.startswith(UrdfConst.LIMIT_TAG[0]) and line_entry.endswith(UrdfConst.LIMIT_TAG[-1]):
-                limit_line_num = joint_num + line_num + 1
-            elif line_entry.startswith(UrdfConst.MIMIC_TAG[0]) and line_entry.endswith(UrdfConst.MIMIC_TAG[-1]):
-                if limit_line_num is None:
-                    break
-
-                # Parse reference joint, multiplier and offset
-                joint_start_pos = len(UrdfConst.MIMIC_TAG[0])
-                joint_end_pos = line_entry.find(UrdfConst.MIMIC_TAG[1])
-                multiplier_start_pos = joint_end_pos + len(UrdfConst.MIMIC_TAG[1])
-                multiplier_end_pos = line_entry.find(UrdfConst.MIMIC_TAG[2])
-                if multiplier_end_pos >= 0:
-                    offset_start_pos = multiplier_end_pos + len(UrdfConst.MIMIC_TAG[2])
-                    offset_end_pos = line_entry.find(UrdfConst.MIMIC_TAG[3])
-                    offset_value = float(line_entry[offset_start_pos:offset_end_pos])
-                else:
-                    # No offset
-                    offset_value = 0.0
-                    multiplier_end_pos = line_entry.find(UrdfConst.MIMIC_TAG[3])
-                reference_joint_limits = joint_limits[line_entry[joint_start_pos:joint_end_pos]]
-                multiplier_value = float(line_entry[multiplier_start_pos:multiplier_end_pos])
-
-                # Calculate mimic joint limits
-                lower_value = (reference_joint_limits[0] * multiplier_value + offset_value) * UrdfConst.MIMIC_MARGIN
-                upper_value = (reference_joint_limits[1] * multiplier_value + offset_value) * UrdfConst.MIMIC_MARGIN
-                if lower_value > upper_value:
-                    temp = lower_value
-                    lower_value = upper_value
-                    upper_value = temp
-
-                # Update mimic joint limits
-                limit_line = urdf_lines[limit_line_num]
-                lower_start_pos = limit_line.find(UrdfConst.LIMIT_TAG[1]) + len(UrdfConst.LIMIT_TAG[1])
-                lower_end_pos = limit_line.find(UrdfConst.LIMIT_TAG[2])
-                upper_start_pos = lower_end_pos + len(UrdfConst.LIMIT_TAG[2])
-                upper_end_pos = limit_line.find(UrdfConst.LIMIT_TAG[3])
-                urdf_lines[limit_line_num] = limit_line[:lower_start_pos] + str(lower_value) + limit_line[lower_end_pos:upper_start_pos] + str(upper_value) + limit_line[upper_end_pos:]
-                break
-
-    return urdf_lines
-
-def fix_mimic_joints(urdf_lines: list[str]) -> list[str]:
-    if not UrdfConst.FIX_MIMIC_JOINTS:
-        return urdf_lines
-
-    for line_num, urdf_line in enumerate(urdf_lines):
-        # Look for joints
-        line_entry = urdf_line.strip()
-        if not line_entry.startswith(UrdfConst.JOINT_TAG[0]) or not line_entry.endswith(UrdfConst.JOINT_TAG[-1]):
-            continue
-
-        # Look for mimic tag
-        for joint_line in urdf_lines[line_num + 1:]:
-            line_entry = joint_line.strip()
-            if line_entry == UrdfConst.JOINT_END_TAG[0]:
-                break
-            if line_entry.startswith(UrdfConst.MIMIC_TAG[0]) and line_entry.endswith(UrdfConst.MIMIC_TAG[-1]):
-                joint_end_pos = urdf_line.find(UrdfConst.JOINT_TAG[-1])
-                urdf_lines[line_num] = urdf_line[:joint_end_pos] + '" type="fixed">\n'
-                break
-
-    return urdf_lines
+        reference_joint, multiplier_value, offset_value = info.mimic
+        reference_joint_limits = joint_limits[reference_joint]
+
+        # Calculate mimic joint limits
+        lower_value = (reference_joint_limits[0] * multiplier_value + offset_value) * mimic_margin
+        upper_value = (reference_joint_limits[1] * multiplier_value + offset_value) * mimic_margin
+        if lower_value > upper_value:
+            lower_value, upper_value = upper_value, lower_value
+        mimic_limits[info.name] = (lower_value, upper_value)
+    return mimic_limits
+
+def get_scales(resize_scale: float, use_importer_scaling: bool) -> dict[str, dict[str, float]]:
+    # Scale of each attribute to resize, by element name
+    scales = dict[str, dict[str, float]]()
+    # m
+    if not use_importer_scaling:
+        scales['origin'] = {'xyz': resize_scale}
+    # kg
+    scales['mass'] = {'value': pow(resize_scale, 3)}
+    # kg m^2
+    inertia_scale = pow(resize_scale, 3 if use_importer_scaling else 5)
+    scales['inertia'] = {key: inertia_scale for key in ('ixx', 'ixy', 'ixz', 'iyy', 'iyz', 'izz')}
+    # kg m^2 s^-2
+    # Further scale down by 10
+    scales['limit'] = {'effort': pow(resize_scale, 4 if use_importer_scaling else 6)}
+    # kg m s^-2
+    dynamics_scale = pow(resize_scale, 3 if use_importer_scaling else 4)
+    scales['dynamics'] = {'damping': dynamics_scale, 'friction': dynamics_scale}
+    return scales
+
+def resize_value(values: str, resize_scale: float) -> str:
+    return ' '.join([str(float(val) * resize_scale) for val in values.split(' ')])
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
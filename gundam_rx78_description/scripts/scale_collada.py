@@ -38,36 +38,87 @@ import numpy
 import argparse
 
 
-def scale_node(node, scale):
-    transforms = node.transforms
-    node.transforms = []
-    for transform in transforms:
-        transform.matrix[:3, 3] *= scale
-        node.transforms.append(scene.MatrixTransform(transform.matrix.reshape(16, 1)))
-    node.matrix = numpy.identity(4, dtype=numpy.float32)
-    for t in node.transforms:
-        node.matrix = numpy.dot(node.matrix, t.matrix)
+def collect_nodes(root):
+    # nodes below root in depth first order, parents before children
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(child for child in reversed(node.children) if isinstance(child, scene.Node))
+    return nodes
 
-    for child in node.children:
-        if isinstance(child, scene.Node):
-            scale_node(child, scale)
 
+def scale_nodes(root, scale):
+    # scale the translation of all transforms and recompute node.matrix in one sweep
+    nodes = collect_nodes(root)
+    counts = numpy.array([len(node.transforms) for node in nodes], dtype=int)
+    transforms = [t for node in nodes for t in node.transforms]
+    matrices = numpy.array([t.matrix for t in transforms], dtype=numpy.float64).reshape(-1, 4, 4)
+    matrices[:, :3, 3] *= scale
 
-def scale_geometry(geometry, scale):
-    position_ids = set()
-    for primitive in geometry.primitives:
-        for _input in primitive.getInputList().getList():
-            if _input[1] == "VERTEX":
-                position_ids.add(_input[2][1:])  # remove '#'
-    for position_id in position_ids:
-        geometry.sourceById[position_id].data *= scale
+    # the transforms of each node padded with identities, so that node.matrix is the product of the columns
+    starts = numpy.cumsum(counts) - counts
+    padded = numpy.tile(numpy.identity(4), (len(nodes), max(counts.max(initial=0), 1), 1, 1))
+    padded[numpy.repeat(numpy.arange(len(nodes)), counts), numpy.arange(len(transforms)) - numpy.repeat(starts, counts)] = matrices
+    products = padded[:, 0]
+    for column in range(1, padded.shape[1]):
+        products = numpy.matmul(products, padded[:, column])
 
+    # keep the precision of the loaded transforms, a node without transforms has the float32 identity as pycollada
+    for node, start, count, product in zip(nodes, starts, counts, products):
+        dtypes = [t.matrix.dtype for t in node.transforms]
+        node.transforms = [scene.MatrixTransform(matrices[start + i].astype(dtypes[i]).reshape(16, 1)) for i in range(count)]
+        node.matrix = product.astype(numpy.result_type(numpy.float32, *dtypes))
 
-def scale_collada(mesh_, scale):
-    scale_node(mesh_.scene.nodes[0], scale)
-    for geometry in mesh_.geometries:
-        scale_geometry(geometry, scale)
+
+def source_offsets(node_offsets):
+    # transforms of the position and normal sources of the geometry nodes merged by mergenode_collada
+    # a source shared by several geometry nodes gets all their transforms
+    positions = dict()
+    normals = dict()
+    for geometry_node, offset in node_offsets.items():
+        position_sources = set()
+        normal_sources = set()
+        for primitive in geometry_node.geometry.primitives:
+            position_sources.update(_input[4] for _input in primitive.sources.get('VERTEX', []))
+            normal_sources.update(_input[4] for _input in primitive.sources.get('NORMAL', []))
+        for position_source in position_sources:
+            positions[position_source] = numpy.dot(offset, positions.get(position_source, numpy.identity(4)))
+        for normal_source in normal_sources:
+            normals[normal_source] = numpy.dot(offset[:3, :3], normals.get(normal_source, numpy.identity(3)))
+    return positions, normals
+
+
+def scale_geometries(geometries, scale, node_offsets):
+    # transform each position source by its merged transform and the scale, and each normal source by the rotation,
+    # with one product per source
+    positions, normals = source_offsets(node_offsets)
+    for geometry in geometries:
+        position_sources = set()
+        normal_sources = set()
+        for primitive in geometry.primitives:
+            position_sources.update(_input[4] for _input in primitive.sources.get('VERTEX', []))
+            normal_sources.update(_input[4] for _input in primitive.sources.get('NORMAL', []))
+        for position_source in position_sources:
+            if position_source in positions:
+                offset = positions[position_source]
+                position_source.data = numpy.dot(position_source.data, scale * offset[:3, :3].T) + scale * offset[:3, 3]
+            else:
+                position_source.data *= scale
+        for normal_source in normal_sources & normals.keys():
+            normal_source.data = numpy.dot(normal_source.data, normals[normal_source].T)
+        for primitive in geometry.primitives:
+            if primitive.sources.get('VERTEX'):
+                primitive._vertex = primitive.sources['VERTEX'][0][4].data
+            if primitive.sources.get('NORMAL'):
+                primitive._normal = primitive.sources['NORMAL'][0][4].data
+
+
+# node_offsets maps the geometry nodes merged by mergenode_collada to the transforms not applied to their sources yet
+def scale_collada(mesh_, scale, node_offsets=None):
+    scale_nodes(mesh_.scene.nodes[0], scale)
+    scale_geometries(mesh_.geometries, scale, node_offsets or dict())
 
     mesh_.assetInfo.unitname = 'meter'
     mesh_.assetInfo.unitmeter = 1.0
-    mesh_.save()
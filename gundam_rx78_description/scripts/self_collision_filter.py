@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+# This file finds the link pairs of a URDF which never come close to each other over the joint space,
+# so that the simulator only checks self-collision between the pairs which can touch, e.g. arms vs. torso or leg vs. leg
+# The joint space is sampled within the limits of the URDF, the oriented bounding boxes of the collision meshes are
+# tested first, and only the overlapping pairs are tested with points sampled on the meshes
+# The disabled pairs are written as SRDF <disable_collisions> entries and as a JSON matrix
+# Run ./(script_name).py inside gundam_rx78_description/scripts/
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+import xml.etree.ElementTree
+
+import numpy
+import trimesh  # Use "pip install --user trimesh".
+from scipy.spatial import cKDTree
+from forward_kinematics import FkConst, ForwardKinematics, rpy_matrix
+from kinematic_tree import KinematicTree
+
+
+class SelfCollisionConst:
+    PACKAGE_DIR     = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    PACKAGE_URL     = 'package://gundam_rx78_description/'
+    SAMPLES         = 1000              # Joint configurations, the first one is the default pose with all joints at 0
+    MARGIN          = 0.05              # [m] Pairs closer than this in any configuration can collide
+    RESOLUTION      = 0.1               # [m] Mean spacing of the points sampled on the meshes
+    MAX_POINTS      = 5000              # Points per link
+    BATCH           = 200               # Configurations per batched step
+    SEED            = 0
+    CONTINUOUS_LIMIT = (-numpy.pi, numpy.pi)
+    # Reasons of the disabled pairs, as written by the MoveIt setup assistant
+    ADJACENT        = 'Adjacent'        # Connected by a joint, simulators skip these pairs anyway
+    DEFAULT         = 'Default'         # In collision in the default pose, e.g. overlapping covers
+    ALWAYS          = 'Always'          # In collision in every sampled configuration
+    NEVER           = 'Never'           # Never within the margin in the sampled configurations
+
+
+def package_path(filename: str) -> str:
+    if filename.startswith(SelfCollisionConst.PACKAGE_URL):
+        filename = filename[len(SelfCollisionConst.PACKAGE_URL):]
+    return os.path.join(SelfCollisionConst.PACKAGE_DIR, filename)
+
+
+def collision_geometry(geometry):
+    # The mesh of a <geometry>, or None if it has no mesh, box, cylinder or sphere
+    mesh = geometry.find('mesh')
+    if mesh is not None:
+        part = trimesh.load(package_path(mesh.get('filename')), force='mesh', process=False)
+        part.apply_scale([float(val) for val in mesh.get('scale', '1 1 1').split()])
+        return part
+    box = geometry.find('box')
+    if box is not None:
+        return trimesh.creation.box(extents=[float(val) for val in box.get('size').split()])
+    cylinder = geometry.find('cylinder')
+    if cylinder is not None:
+        return trimesh.creation.cylinder(radius=float(cylinder.get('radius')), height=float(cylinder.get('length')))
+    sphere = geometry.find('sphere')
+    if sphere is not None:
+        return trimesh.creation.icosphere(radius=float(sphere.get('radius')))
+    return None
+
+
+def load_collision_meshes(urdf_path: str) -> tuple[dict, list]:
+    # One mesh of all <collision> shapes of each link, in the link frame,
+    # and the links with a <collision> which could not be loaded, whose pairs stay enabled
+    meshes = dict()
+    skipped = []
+    for link in xml.etree.ElementTree.parse(urdf_path).getroot().findall('link'):
+        parts = []
+        for collision in link.findall('collision'):
+            geometry = collision.find('geometry')
+            part = collision_geometry(geometry) if geometry is not None else None
+            if part is None:
+                skipped.append(link.get('name'))
+                continue
+            origin = collision.find('origin')
+            xyz = [float(val) for val in origin.get('xyz', '0 0 0').split()] if origin is not None else [0.0] * 3
+            rpy = [float(val) for val in origin.get('rpy', '0 0 0').split()] if origin is not None else [0.0] * 3
+            part.apply_transform(rpy_matrix(xyz, rpy))
+            parts.append(part)
+        if parts:
+            meshes[link.get('name')] = trimesh.util.concatenate(parts)
+    return meshes, sorted(set(skipped))
+
+
+def surface_points(mesh, resolution: float, max_points: int, rng: numpy.random.Generator) -> numpy.ndarray:
+    # Points sampled uniformly by area, about one per resolution squared, and the vertices of the convex hull
+    triangles = numpy.asarray(mesh.triangles, dtype=numpy.float64)
+    areas = numpy.linalg.norm(numpy.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=1) / 2
+    count = int(min(max_points, numpy.ceil(areas.sum() / resolution ** 2)))
+    points = numpy.zeros((0, 3))
+    if count > 0 and areas.sum() > 0:
+        faces = rng.choice(len(triangles), count, p=areas / areas.sum())
+        u, v = rng.random(count), rng.random(count)
+        flip = u + v > 1
+        u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+        t = triangles[faces]
+        points = t[:, 0] + u[:, None] * (t[:, 1] - t[:, 0]) + v[:, None] * (t[:, 2] - t[:, 0])
+    try:
+        hull = numpy.asarray(mesh.convex_hull.vertices, dtype=numpy.float64)
+    except Exception:
+        hull = numpy.asarray(mesh.vertices, dtype=numpy.float64)
+    return numpy.concatenate([points, hull])
+
+
+def box_corners(mesh) -> numpy.ndarray:
+    # Corners (8, 4) of the oriented bounding box in the link frame, in homogeneous coordinates
+    try:
+        box = mesh.bounding_box_oriented
+    except Exception:
+        box = mesh.bounding_box
+    signs = numpy.array([[x, y, z] for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (-0.5, 0.5)])
+    corners = numpy.ones((8, 4))
+    corners[:, :3] = signs * box.primitive.extents
+    return corners @ numpy.asarray(box.primitive.transform).T
+
+
+def sample_positions(fk: ForwardKinematics, count: int, rng: numpy.random.Generator) -> numpy.ndarray:
+    # Uniform joint vectors within the limits, the first one is the default pose
+    lower = numpy.zeros(len(fk.joint_names))
+    upper = numpy.zeros(len(fk.joint_names))
+    for column, name in enumerate(fk.joint_names):
+        info = fk.tree.joint_payloads[fk.find_joint(name)]
+        lower[column], upper[column] = info.limit if info.limit is not None else SelfCollisionConst.CONTINUOUS_LIMIT
+    positions = rng.uniform(lower, upper, (count, len(fk.joint_names)))
+    positions[0] = numpy.clip(0.0, lower, upper)
+    return positions
+
+
+def adjacent_pairs(tree: KinematicTree) -> set:
+    return set(tuple(sorted((tree.link_names[tree.joint_parent_link[joint]], tree.link_names[tree.joint_child_link[joint]])))
+               for joint in range(len(tree.joint_names)))
+
+
+def overlapping_boxes(poses: numpy.ndarray, corners: numpy.ndarray, first: numpy.ndarray, second: numpy.ndarray, margin: float) -> numpy.ndarray:
+    # (N, P) whether the world aligned boxes of the oriented boxes of each pair overlap within the margin
+    world = numpy.einsum('nlij,lkj->nlki', poses[..., :3, :], corners)
+    lower = world.min(axis=2) - margin / 2
+    upper = world.max(axis=2) + margin / 2
+    return numpy.all((lower[:, first] <= upper[:, second]) & (lower[:, second] <= upper[:, first]), axis=2)
+
+
+def pair_contacts(poses_a: numpy.ndarray, poses_b: numpy.ndarray, tree_a: cKDTree, points_b: numpy.ndarray, distance: float) -> numpy.ndarray:
+    # (S,) whether any point of link b comes within distance of a point of link a in each configuration
+    relative = numpy.matmul(numpy.linalg.inv(poses_a), poses_b)
+    points = numpy.einsum('sij,mj->smi', relative[:, :3, :3], points_b) + relative[:, None, :3, 3]
+    nearest, _ = tree_a.query(points.reshape(-1, 3), k=1, distance_upper_bound=distance)
+    return numpy.isfinite(nearest).reshape(len(poses_a), -1).any(axis=1)
+
+
+def find_disabled_pairs(urdf_path: str, samples: int, margin: float, resolution: float, seed: int, verbose: bool = True) -> dict:
+    rng = numpy.random.default_rng(seed)
+    fk = ForwardKinematics.from_urdf(urdf_path)
+    tree = fk.tree
+    meshes, skipped = load_collision_meshes(urdf_path)
+    if skipped:
+        print('warning: the collision of {} links is not a mesh, box, cylinder or sphere, their pairs stay enabled: {}'.format(
+            len(skipped), ', '.join(skipped)))
+    links = [name for name in tree.link_names if name in meshes]
+    link_rows = numpy.array([tree.link_index[name] for name in links], dtype=int)
+    corners = numpy.array([box_corners(meshes[name]) for name in links])
+    points = [surface_points(meshes[name], resolution, SelfCollisionConst.MAX_POINTS, rng) for name in links]
+    first, second = numpy.triu_indices(len(links), k=1)
+    positions = sample_positions(fk, samples, rng)
+
+    # broadphase, the pairs whose boxes overlap in some configurations
+    overlaps = numpy.zeros((samples, len(first)), dtype=bool)
+    for start in range(0, samples, SelfCollisionConst.BATCH):
+        poses = fk.link_poses(positions[start:start + SelfCollisionConst.BATCH])[:, link_rows]
+        overlaps[start:start + SelfCollisionConst.BATCH] = overlapping_boxes(poses, corners, first, second, margin)
+
+    # narrowphase on the overlapping configurations of the pairs which are not adjacent
+    # points within margin plus resolution, as the points are about resolution apart on each mesh
+    adjacent = adjacent_pairs(tree)
+    kdtrees = [cKDTree(link_points) for link_points in points]
+    reasons = dict()
+    for pair, (a, b) in enumerate(zip(first, second)):
+        key = (links[a], links[b])
+        if tuple(sorted(key)) in adjacent:
+            reasons[key] = SelfCollisionConst.ADJACENT
+            continue
+        configurations = numpy.flatnonzero(overlaps[:, pair])
+        if len(configurations) == 0:
+            reasons[key] = SelfCollisionConst.NEVER
+            continue
+        contacts = numpy.zeros(samples, dtype=bool)
+        checked = numpy.zeros(samples, dtype=bool)
+        for start in range(0, len(configurations), SelfCollisionConst.BATCH):
+            batch = configurations[start:start + SelfCollisionConst.BATCH]
+            # the points of the smaller link are moved into the frame of the larger one
+            fixed, moving = (a, b) if len(points[a]) >= len(points[b]) else (b, a)
+            poses = fk.link_poses(positions[batch])[:, link_rows[[fixed, moving]]]
+            contacts[batch] = pair_contacts(poses[:, 0], poses[:, 1], kdtrees[fixed], points[moving], margin + resolution)
+            checked[batch] = True
+            # stop once the reason is known, only a pair overlapping in all configurations can be always in collision
+            if contacts[0] or (contacts.any() and (len(configurations) < samples or not contacts[checked].all())):
+                break
+        if contacts[0]:
+            reasons[key] = SelfCollisionConst.DEFAULT
+        elif not contacts.any():
+            reasons[key] = SelfCollisionConst.NEVER
+        elif contacts.all():
+            reasons[key] = SelfCollisionConst.ALWAYS
+    if verbose:
+        counts = dict()
+        for reason in reasons.values():
+            counts[reason] = counts.get(reason, 0) + 1
+        print('{} links with collision meshes, {} pairs, {} disabled ({}), {} enabled'.format(
+            len(links), len(first), len(reasons), ', '.join('{} {}'.format(reason, count) for reason, count in sorted(counts.items())),
+            len(first) - len(reasons)))
+    return {'robot': xml.etree.ElementTree.parse(urdf_path).getroot().get('name'), 'links': links, 'reasons': reasons,
+            'samples': samples, 'margin': margin, 'resolution': resolution, 'seed': seed}
+
+
+def write_srdf(result: dict, path: str) -> None:
+    with open(path, 'w') as fout:
+        fout.write('<?xml version="1.0" ?>\n')
+        fout.write('<!-- This file is automatically generated by self_collision_filter.py with {} samples and margin {} -->\n'.format(
+            result['samples'], result['margin']))
+        fout.write('<robot name="{}">\n'.format(result['robot']))
+        for (link1, link2), reason in result['reasons'].items():
+            fout.write('  <disable_collisions link1="{}" link2="{}" reason="{}"/>\n'.format(link1, link2, reason))
+        fout.write('</robot>\n')
+
+
+def write_matrix(result: dict, path: str) -> None:
+    # enabled[i][j] is 1 if links[i] and links[j] have to be checked for self-collision
+    index = dict((name, i) for i, name in enumerate(result['links']))
+    enabled = numpy.ones((len(index), len(index)), dtype=int) - numpy.identity(len(index), dtype=int)
+    for link1, link2 in result['reasons']:
+        enabled[index[link1], index[link2]] = enabled[index[link2], index[link1]] = 0
+    # one row of the matrix and one disabled pair per line, so that a change of the result is readable in a diff
+    with open(path, 'w') as fout:
+        fout.write('{\n')
+        for key in ('samples', 'margin', 'resolution', 'seed'):
+            fout.write(' {}: {},\n'.format(json.dumps(key), json.dumps(result[key])))
+        fout.write(' "links": {},\n'.format(json.dumps(result['links'])))
+        fout.write(' "enabled": [\n  {}\n ],\n'.format(',\n  '.join(json.dumps(row) for row in enabled.tolist())))
+        fout.write(' "disabled": [\n  {}\n ]\n'.format(',\n  '.join(json.dumps([link1, link2, reason]) for (link1, link2), reason in result['reasons'].items())))
+        fout.write('}\n')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Find the link pairs which never collide, and write them as SRDF and JSON')
+    parser.add_argument('urdf', nargs='?', default=FkConst.URDF_PATH, help='URDF file name')
+    parser.add_argument('--samples', type=int, default=SelfCollisionConst.SAMPLES, help='joint configurations to sample')
+    parser.add_argument('--margin', type=float, default=SelfCollisionConst.MARGIN, help='pairs closer than this [m] can collide')
+    parser.add_argument('--resolution', type=float, default=SelfCollisionConst.RESOLUTION, help='spacing [m] of the points sampled on the meshes')
+    parser.add_argument('--seed', type=int, default=SelfCollisionConst.SEED, help='seed of the samples')
+    parser.add_argument('--srdf', help='SRDF file name, the URDF name with .srdf by default')
+    parser.add_argument('--json', help='JSON file name, the URDF name with _self_collision.json by default')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = find_disabled_pairs(args.urdf, args.samples, args.margin, args.resolution, args.seed)
+    base = os.path.splitext(args.urdf)[0]
+    srdf_path = args.srdf or base + '.srdf'
+    json_path = args.json or base + '_self_collision.json'
+    write_srdf(result, srdf_path)
+    write_matrix(result, json_path)
+    print('wrote {} and {} in {:.1f} s'.format(srdf_path, json_path, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -105,5 +105,4 @@ def simplify_collada(mesh_):
     node = mesh_.xmlnode.find(tag("library_animations"))
     if node is not None:
         mesh_.xmlnode.getroot().remove(node)
-
-    mesh_.save()
+    # mesh_ is not saved here, the following stages work on the objects and only the mesh files are serialized
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# This file welds the coincident entries of each source of a geometry, e.g. the duplicated positions and normals,
+# drops the entries no triangle refers to, and rewrites the triangle indices, before ggc_dae_to_urdf.py writes a mesh
+# Each source is welded on its own, so the welded mesh looks the same, only smaller
+
+import numpy
+from collada import geometry, source, triangleset, xmlutil
+
+
+class WeldConst:
+    TOLERANCE       = 1e-6      # Entries closer than this in every component are welded, 0 welds equal entries only
+
+
+def weld_values(data: numpy.ndarray, used: numpy.ndarray, tolerance: float) -> tuple:
+    # Welded entries in the order they are first used, and the new index of every old entry (-1 if unused)
+    values = data[used]
+    keys = numpy.round(values / tolerance).astype(numpy.int64) if tolerance > 0 else values
+    _, first, inverse = numpy.unique(keys, axis=0, return_index=True, return_inverse=True)
+    order = numpy.argsort(first)
+    rank = numpy.empty(len(order), dtype=numpy.int64)
+    rank[order] = numpy.arange(len(order))
+    remap = numpy.full(len(data), -1, dtype=numpy.int64)
+    remap[used] = rank[inverse.reshape(-1)]
+    return values[first[order]], remap
+
+
+def geometry_bytes(g) -> int:
+    g.save()
+    return len(xmlutil.etree.tostring(g.xmlnode))
+
+
+def weld_geometry(collada, g, tolerance: float = WeldConst.TOLERANCE) -> tuple:
+    # New geometry with the same id and materials as g, and a report of the savings
+    if not all(isinstance(p, triangleset.TriangleSet) for p in g.primitives):
+        return g, 'skipped {}, only triangles are welded'.format(g.id)
+
+    # Entries of each source used by any primitive
+    inputs = [p.getInputList().getList() for p in g.primitives]
+    used = dict()
+    for p, input_list in zip(g.primitives, inputs):
+        for offset, semantic, source_url, input_set in input_list:
+            used.setdefault(source_url[1:], []).append(p.index[:, :, offset].reshape(-1))
+
+    sources = []
+    remaps = dict()
+    counts = []
+    for source_id, indices in used.items():
+        old_source = g.sourceById[source_id]
+        data = numpy.asarray(old_source.data).reshape(len(old_source), -1)
+        values, remaps[source_id] = weld_values(data, numpy.unique(numpy.concatenate(indices)), tolerance)
+        sources.append(source.FloatSource(source_id, values.astype(numpy.float32).reshape(-1), old_source.components))
+        counts.append('{} {} -> {}'.format(source_id.rsplit('-', 1)[-1], len(data), len(values)))
+
+    welded = geometry.Geometry(collada, g.id, g.name, sources, double_sided=g.double_sided)
+    for p, input_list in zip(g.primitives, inputs):
+        index = numpy.array(p.index)
+        new_inputs = source.InputList()
+        for offset, semantic, source_url, input_set in input_list:
+            index[:, :, offset] = remaps[source_url[1:]][p.index[:, :, offset]]
+            new_inputs.addInput(offset, semantic, source_url, input_set)
+        welded.primitives.append(welded.createTriangleSet(index.reshape(-1), new_inputs, p.material))
+
+    report = 'welded {}: {}, {} -> {} bytes'.format(g.id, ', '.join(counts), geometry_bytes(g), geometry_bytes(welded))
+    return welded, report
@@ -28,15 +28,19 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import argparse
-import csv
+import os
+import sys
 import unittest
 import rospy
 import actionlib
+from rospkg import RosPack
 from nav_msgs.msg import Odometry
 from std_srvs.srv import Empty
 from tf.transformations import euler_from_quaternion
 from control_msgs.msg import FollowJointTrajectoryAction, FollowJointTrajectoryGoal
 from trajectory_msgs.msg import JointTrajectoryPoint
+sys.path.append(os.path.join(RosPack().get_path('gundam_rx78_control'), 'sample'))
+from trajectory import compile_trajectory, load_trajectory  # noqa: E402
 
 
 class TestWalkPose(unittest.TestCase):
@@ -50,10 +54,32 @@ class TestWalkPose(unittest.TestCase):
                             help='target orientation')
         parser.add_argument('filename', type=str, nargs='?',
                             help='filename for trajectory pattern csv')
+        parser.add_argument('--tolerance', type=float,
+                            help='drop points while the joint error stays within this tolerance [rad]')
+        parser.add_argument('--rate', type=float,
+                            help='resample the trajectory at this rate [Hz]')
+        parser.add_argument('--kinematic', action='store_true',
+                            help='replay the trajectory with the forward kinematics of the URDF instead of gazebo')
         args, unknown = parser.parse_known_args()
+        if args.kinematic and sys.version_info < (3, 8):
+            parser.error('--kinematic needs Python 3.8 or later, i.e. noetic')
         self.goal_pos = args.pos
         self.goal_rot = args.rot
         self.filename = args.filename
+        self.tolerance = args.tolerance
+        self.rate = args.rate
+        self.kinematic = args.kinematic
+        if self.kinematic:
+            # no ROS master is needed, see gundam_rx78_description/scripts/kinematic_replay.py
+            sys.path.append(os.path.join(RosPack().get_path('gundam_rx78_description'), 'scripts'))
+            from forward_kinematics import ForwardKinematics
+            from kinematic_replay import reached, replay
+            trajectory = compile_trajectory(load_trajectory(self.filename), self.tolerance, self.rate)
+            result = replay(ForwardKinematics.from_urdf(joint_names=trajectory.joint_names), trajectory.times, trajectory.positions)
+            xyz, rpy = result.pose()
+            print("pos: {:6.3f} {:6.3f} {:6.3f} - rot: {:6.3f} {:6.3f} {:6.3f}".format(*(xyz + rpy)))
+            self.base_success = reached(result, self.goal_pos, self.goal_rot) is not None
+            return
 
         print("Initializing node... ")
         rospy.init_node('test_walk_pose', anonymous=True)
@@ -67,18 +93,16 @@ class TestWalkPose(unittest.TestCase):
         goal.goal_time_tolerance = rospy.Time(1)
 
         rospy.loginfo("Opening {}".format(self.filename))
-        with open(self.filename) as f:
-            reader = csv.reader(f, skipinitialspace=True)
-            first_row = True
-            for row in reader:
-                if first_row:
-                    goal.trajectory.joint_names = row[1:]
-                    first_row = False
-                else:
-                    point = JointTrajectoryPoint()
-                    point.positions = [float(n) for n in row[1:]]
-                    point.time_from_start = rospy.Duration(float(row[0]))
-                    goal.trajectory.points.append(point)
+        trajectory = compile_trajectory(load_trajectory(self.filename), self.tolerance, self.rate)
+        goal.trajectory.joint_names = trajectory.joint_names
+        for i, time_from_start in enumerate(trajectory.times.tolist()):
+            point = JointTrajectoryPoint()
+            point.positions = trajectory.positions[i].tolist()
+            if trajectory.velocities is not None:
+                point.velocities = trajectory.velocities[i].tolist()
+                point.accelerations = trajectory.accelerations[i].tolist()
+            point.time_from_start = rospy.Duration(time_from_start)
+            goal.trajectory.points.append(point)
         self.client = actionlib.SimpleActionClient(
             '/fullbody_controller/follow_joint_trajectory',
             FollowJointTrajectoryAction,
@@ -113,6 +137,9 @@ class TestWalkPose(unittest.TestCase):
             self.base_success = True
 
     def test_walk_pose(self):
+        if self.kinematic:
+            self.assertTrue(self.base_success)
+            return
         rospy.Subscriber("/base_link_ground_truth", Odometry, self.base_link_cb)
         timeout_t = rospy.Time.now() + rospy.Duration(40)
         while not rospy.is_shutdown() and not self.base_success and rospy.Time.now() < timeout_t:
@@ -121,5 +148,8 @@ class TestWalkPose(unittest.TestCase):
 
 
 if __name__ == '__main__':
-    import rostest
-    rostest.rosrun('gundam_rx78_gazebo', 'test_walk_pose', TestWalkPose)
+    if '--kinematic' in sys.argv:
+        unittest.main(argv=sys.argv[:1])
+    else:
+        import rostest
+        rostest.rosrun('gundam_rx78_gazebo', 'test_walk_pose', TestWalkPose)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# This file runs the tests of test_gundam_walk.launch in parallel, sharded across several headless gazebo instances
+# Each shard has its own ROS master and gazebo master port, and runs its tests one after another with rostest,
+# so the whole suite takes about as long as its slowest shard instead of the sum of the tests
+# With --kinematic, each test runs check_walk_pose.py --kinematic in a local process instead of a simulator
+# The results of all shards are collected into one report, and the script exits with 1 if any test did not pass
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree
+
+import rosgraph
+from rospkg import RosPack
+
+
+class RunnerConst:
+    TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+    LAUNCH_PATH = os.path.join(TEST_DIR, 'test_gundam_walk.launch')
+    ROS_PORT = 11411  # ROS master port of the first shard, the others follow
+    GAZEBO_PORT = 11445  # Gazebo master port of the first shard, the others follow
+    MASTER_TIMEOUT = 30.0  # Seconds to wait for the ROS master of a shard
+    POLL_PERIOD = 0.1
+    TIME_LIMIT = 60.0  # Seconds of a test without time-limit, as rostest
+
+
+def parse_tests(launch_path):
+    # The launch file without its tests, and the attributes of each test
+    root = xml.etree.ElementTree.parse(launch_path).getroot()
+    tests = []
+    for test in root.findall('test'):
+        tests.append(dict(test.attrib))
+        root.remove(test)
+    return root, tests
+
+
+def shard_tests(tests, shards):
+    # Longest time limit first, each test to the shard with the least total time limit so far
+    buckets = [[] for _ in range(min(shards, len(tests)))]
+    loads = [0.0] * len(buckets)
+    for test in sorted(tests, key=lambda test: -float(test.get('time-limit', RunnerConst.TIME_LIMIT))):
+        index = loads.index(min(loads))
+        buckets[index].append(test)
+        loads[index] += float(test.get('time-limit', RunnerConst.TIME_LIMIT))
+    return buckets
+
+
+def write_shard_launch(root, tests, path):
+    shard = xml.etree.ElementTree.fromstring(xml.etree.ElementTree.tostring(root))
+    for test in tests:
+        xml.etree.ElementTree.SubElement(shard, 'test', test)
+    xml.etree.ElementTree.ElementTree(shard).write(path)
+
+
+def resolve_find(text):
+    # $(find pkg) of the test arguments, for the tests run without roslaunch
+    rospack = RosPack()
+    return re.sub(r'\$\(find ([^)]+)\)', lambda match: rospack.get_path(match.group(1)), text)
+
+
+def wait_for_master(master_uri, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if rosgraph.is_master_online(master_uri=master_uri):
+            return True
+        time.sleep(RunnerConst.POLL_PERIOD)
+    return False
+
+
+def junit_results(results_dir, test_name):
+    # Status and seconds of a test from the junit file rosunit-(test name).xml which rostest writes for it
+    paths = glob.glob(os.path.join(results_dir, '**', 'rosunit-{}.xml'.format(test_name)), recursive=True)
+    if not paths:
+        return {'status': 'missing', 'seconds': 0.0}
+    try:
+        root = xml.etree.ElementTree.parse(paths[0]).getroot()
+    except xml.etree.ElementTree.ParseError:
+        return {'status': 'error', 'seconds': 0.0}
+    cases = list(root.iter('testcase'))
+    if any(case.find('failure') is not None for case in cases):
+        status = 'failed'
+    elif not cases or any(case.find('error') is not None for case in cases):
+        status = 'error'
+    else:
+        status = 'passed'
+    return {'status': status, 'seconds': sum(float(case.get('time', 0.0)) for case in cases)}
+
+
+def run_physics_shard(index, root, tests, work_dir):
+    # roscore and rostest --reuse-master on the ports of the shard, with gazebo on its own master port
+    shard_dir = os.path.join(work_dir, 'shard{}'.format(index))
+    os.makedirs(shard_dir)
+    launch_path = os.path.join(shard_dir, 'test_gundam_walk_shard{}.launch'.format(index))
+    write_shard_launch(root, tests, launch_path)
+    ros_port = RunnerConst.ROS_PORT + index
+    env = dict(os.environ,
+               ROS_MASTER_URI='http://localhost:{}'.format(ros_port),
+               GAZEBO_MASTER_URI='http://localhost:{}'.format(RunnerConst.GAZEBO_PORT + index),
+               ROS_LOG_DIR=os.path.join(shard_dir, 'log'))
+    with open(os.path.join(shard_dir, 'roscore.log'), 'w') as core_log, open(os.path.join(shard_dir, 'rostest.log'), 'w') as test_log:
+        core = subprocess.Popen(['roscore', '-p', str(ros_port)], env=env, stdout=core_log, stderr=subprocess.STDOUT)
+        try:
+            if not wait_for_master(env['ROS_MASTER_URI'], RunnerConst.MASTER_TIMEOUT):
+                return dict((test['test-name'], {'status': 'error', 'seconds': 0.0, 'message': 'no ROS master'}) for test in tests)
+            subprocess.call(['rostest', '--reuse-master', '--results-base-dir', os.path.join(shard_dir, 'results'), launch_path],
+                            env=env, stdout=test_log, stderr=subprocess.STDOUT)
+        finally:
+            core.terminate()
+            core.wait()
+    return dict((test['test-name'], junit_results(os.path.join(shard_dir, 'results'), test['test-name'])) for test in tests)
+
+
+def run_kinematic_shard(index, root, tests, work_dir):
+    # check_walk_pose.py --kinematic of each test, which needs neither a ROS master nor gazebo
+    results = dict()
+    for test in tests:
+        command = [sys.executable, os.path.join(RunnerConst.TEST_DIR, test['type']), '--kinematic'] + shlex.split(resolve_find(test.get('args', '')))
+        start = time.time()
+        try:
+            returncode = subprocess.call(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                         timeout=float(test.get('time-limit', RunnerConst.TIME_LIMIT)))
+            status = 'passed' if returncode == 0 else 'failed'
+        except subprocess.TimeoutExpired:
+            status = 'error'
+        results[test['test-name']] = {'status': status, 'seconds': time.time() - start}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the walk tests in parallel on several headless simulators')
+    parser.add_argument('--launch', default=RunnerConst.LAUNCH_PATH, help='rostest launch file whose tests are sharded')
+    parser.add_argument('--shards', type=int, help='number of simulators, one per test by default')
+    parser.add_argument('--kinematic', action='store_true', help='replay the gaits kinematically instead of running gazebo')
+    parser.add_argument('--report', help='write the results to this json file')
+    args = parser.parse_args()
+    if args.shards is not None and args.shards < 1:
+        parser.error('--shards must be at least 1')
+
+    root, tests = parse_tests(args.launch)
+    if not tests:
+        parser.error('no test in {}'.format(args.launch))
+    shards = shard_tests(tests, len(tests) if args.shards is None else args.shards)
+    run_shard = run_kinematic_shard if args.kinematic else run_physics_shard
+    work_dir = tempfile.mkdtemp(prefix='gundam_walk_tests_')
+    print('running {} tests in {} shards, logs in {}'.format(len(tests), len(shards), work_dir))
+
+    start = time.time()
+    results = dict()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = dict((executor.submit(run_shard, index, root, shard, work_dir), index) for index, shard in enumerate(shards))
+        for future in concurrent.futures.as_completed(futures):
+            for name, result in future.result().items():
+                results[name] = dict(result, shard=futures[future])
+    seconds = time.time() - start
+
+    print('{:<28} {:>6} {:>10} {:>10}'.format('test', 'shard', 'status', 'time [s]'))
+    for test in tests:
+        result = results[test['test-name']]
+        print('{:<28} {:>6} {:>10} {:>10.1f}'.format(test['test-name'], result['shard'], result['status'], result['seconds']))
+    failed = [name for name, result in results.items() if result['status'] != 'passed']
+    print('{} of {} tests passed in {:.1f} s, the slowest took {:.1f} s'.format(
+        len(tests) - len(failed), len(tests), seconds, max(result['seconds'] for result in results.values())))
+    if args.report:
+        with open(args.report, 'w') as fout:
+            json.dump({'seconds': seconds, 'kinematic': args.kinematic, 'tests': results}, fout, indent=1)
+            fout.write('\n')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
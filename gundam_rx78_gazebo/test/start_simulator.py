@@ -31,7 +31,12 @@ import rospy
 import time
 import sys
 from std_srvs.srv import Empty
-from gazebo_msgs.srv import GetPhysicsProperties, GetPhysicsPropertiesResponse
+from controller_manager_msgs.srv import ListControllers
+from gazebo_msgs.srv import GetPhysicsProperties, GetPhysicsPropertiesResponse, GetWorldProperties
+
+# gazebo is started paused, so these waits use the wall clock instead of the simulation clock
+POLL_PERIOD = 0.1
+STARTUP_TIMEOUT = 60.0
 
 
 class StartGazeboSimulator:
@@ -42,22 +47,61 @@ class StartGazeboSimulator:
         rospy.loginfo(self.physics_properties)
         rospy.wait_for_service('/gazebo/get_physics_properties')
         self.get_physics_properties_service = rospy.ServiceProxy('/gazebo/get_physics_properties', GetPhysicsProperties)
+        rospy.wait_for_service('/gazebo/get_world_properties')
+        self.get_world_properties_service = rospy.ServiceProxy('/gazebo/get_world_properties', GetWorldProperties)
         rospy.wait_for_service('/gazebo/unpause_physics')
         self.start_simulation = rospy.ServiceProxy('/gazebo/unpause_physics', Empty)
+        # advertised by gazebo_ros_control once the model is spawned
+        self.list_controllers_service = rospy.ServiceProxy('/controller_manager/list_controllers', ListControllers)
+
+    def controller_state(self, controller):
+        # state of the controller, or None if the controller manager is not up or has not loaded it
+        try:
+            states = dict((c.name, c.state) for c in self.list_controllers_service().controller)
+        except rospy.ServiceException:
+            return None
+        return states.get(controller)
 
-    def call_start_simulation(self):
+    def wait_for_model(self, model, controller, timeout):
+        # the robot is spawned with its initial joint angles while paused, then the spawner of gundam_rx78_control
+        # loads the controllers, which are only switched to running by the first update after the physics starts
+        deadline = time.time() + timeout
+        while not rospy.is_shutdown() and time.time() < deadline:
+            if model in self.get_world_properties_service().model_names and (not controller or self.controller_state(controller) is not None):
+                return True
+            time.sleep(POLL_PERIOD)
+        rospy.logwarn("model {} and controller {} are not loaded after {} seconds".format(model, controller, timeout))
+        return False
+
+    def wait_for_controller(self, controller, timeout):
+        deadline = time.time() + timeout
+        while not rospy.is_shutdown() and time.time() < deadline:
+            if self.controller_state(controller) == 'running':
+                return True
+            time.sleep(POLL_PERIOD)
+        rospy.logwarn("controller {} is not running after {} seconds".format(controller, timeout))
+        return False
+
+    def call_start_simulation(self, timeout=STARTUP_TIMEOUT):
         rospy.logwarn("start gazebo simulation")
         self.start_simulation()
-        time.sleep(1.0)  # use wall clock just in case
+        deadline = time.time() + timeout
         self.physics_properties = self.get_physics_properties_service()
+        while not rospy.is_shutdown() and self.physics_properties.pause is True and time.time() < deadline:
+            time.sleep(POLL_PERIOD)
+            self.physics_properties = self.get_physics_properties_service()
         rospy.loginfo(self.physics_properties)
 
 
 if __name__ == '__main__':
     rospy.init_node('start_simulator', anonymous=True)
     rospy.logwarn("wait for gazebo startup")
-    time.sleep(5.0)  # wait for gazebo startup
     start_gazebo_simulator = StartGazeboSimulator()
+    model = rospy.get_param('~model', 'GGC_TestModel_rx78_20170112')
+    controller = rospy.get_param('~controller', 'fullbody_controller')
+    timeout = rospy.get_param('~timeout', STARTUP_TIMEOUT)
+    if model:
+        start_gazebo_simulator.wait_for_model(model, controller, timeout)
 
     # start simulator when pouse is true
     while not rospy.is_shutdown() and start_gazebo_simulator.physics_properties.pause is True:
@@ -66,3 +110,6 @@ if __name__ == '__main__':
         except Exception as e:
             print("Unexpected error:", e)
             pass
+
+    if controller:
+        start_gazebo_simulator.wait_for_controller(controller, timeout)